@@ -1,20 +1,102 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
 import essentia.standard as es
 import numpy as np
+import camelot
+from pcm_cache import PCMCache
+import timeline
+import waveform
+
+# Bump whenever a change to the analysis code changes its results, so existing
+# library entries count as stale and can be re-analysed (see reanalysis.py)
+ANALYZER_VERSION = 1
+
+class AlgorithmPool:
+    """
+    Thread-safe pool of pre-configured Essentia algorithm sets.
+
+    `checkout()` lends out an idle set (building a new one only when all are in
+    use) and resets every algorithm when the set comes back, so each analysis
+    starts from the same state as a freshly constructed instance. A set whose
+    reset fails is discarded. The pool pickles without its instances, so an
+    analyzer can be shipped to process-pool workers, which then build their own.
+    """
+
+    def __init__(self, factory: Callable[[], dict], max_idle: Optional[int] = None):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        self.idle: List[dict] = []
+        self.created = 0
+
+    @contextmanager
+    def checkout(self) -> Iterator[dict]:
+        with self.lock:
+            algorithms = self.idle.pop() if self.idle else None
+        if algorithms is None:
+            algorithms = self.factory()
+            with self.lock:
+                self.created += 1
+        try:
+            yield algorithms
+        finally:
+            try:
+                for algorithm in algorithms.values():
+                    algorithm.reset()
+            except Exception as e:
+                print(f"Discarding algorithm set that failed to reset: {e}")
+            else:
+                with self.lock:
+                    if self.max_idle is None or len(self.idle) < self.max_idle:
+                        self.idle.append(algorithms)
+
+    def __getstate__(self):
+        return {"factory": self.factory, "max_idle": self.max_idle}
+
+    def __setstate__(self, state):
+        self.__init__(state["factory"], state["max_idle"])
 
 class AudioAnalyzer:
-    def __init__(self):
-        # Static map for Standard to Camelot conversion
-        self.camelot_map = {
-            # Major Keys (B)
-            "B Major": "1B", "F# Major": "2B", "Gb Major": "2B", "Db Major": "3B", "C# Major": "3B",
-            "Ab Major": "4B", "G# Major": "4B", "Eb Major": "5B", "D# Major": "5B", "Bb Major": "6B", "A# Major": "6B",
-            "F Major": "7B", "C Major": "8B", "G Major": "9B", "D Major": "10B", "A Major": "11B", "E Major": "12B",
-            
-            # Minor Keys (A)
-            "Ab Minor": "1A", "G# Minor": "1A", "Eb Minor": "2A", "D# Minor": "2A", "Bb Minor": "3A", "A# Minor": "3A",
-            "F Minor": "4A", "C Minor": "5A", "G Minor": "6A", "D Minor": "7A", "A Minor": "8A", "E Minor": "9A",
-            "B Minor": "10A", "F# Minor": "11A", "Gb Minor": "11A", "Db Minor": "12A", "C# Minor": "12A"
+    # Frame size (and hop) used by the streaming silence pass
+    STREAM_FRAME_SIZE = 2048
+
+    # Preview tier: decode at a reduced rate and analyse a few short excerpts
+    PREVIEW_SAMPLE_RATE = 11025
+    PREVIEW_EXCERPTS = (0.25, 0.5, 0.75) # Excerpt centres, as a fraction of the track
+    PREVIEW_EXCERPT_SECONDS = 15.0
+
+    def __init__(self, reuse_algorithms: bool = True, sample_rate: int = 44100,
+                 silence_threshold: int = -60, rhythm_method: str = "multifeature",
+                 streaming_min_bytes: Optional[int] = None, pcm_cache_dir: Optional[str] = None,
+                 pcm_cache_max_bytes: int = 0):
+        self.sample_rate = sample_rate
+        self.silence_threshold = silence_threshold
+        self.rhythm_method = rhythm_method
+        # Files at least this large are analysed with the bounded-memory streaming
+        # network instead of being decoded whole. None disables it, 0 streams everything.
+        self.streaming_min_bytes = streaming_min_bytes
+        # Decoded full-rate PCM is kept here so re-analysis skips decoding (see PCMCache)
+        self.pcm_cache_dir = pcm_cache_dir
+        self.pcm_cache_max_bytes = pcm_cache_max_bytes
+        self.pcm_cache = (
+            PCMCache(pcm_cache_dir, pcm_cache_max_bytes) if pcm_cache_dir and pcm_cache_max_bytes > 0 else None
+        )
+        # When enabled, Essentia algorithms come from a pool and are reset between
+        # files instead of being constructed for every call (see AlgorithmPool).
+        self.reuse_algorithms = reuse_algorithms
+        self._pools = {
+            "full": AlgorithmPool(self._build_algorithms),
+            "preview": AlgorithmPool(self._build_preview_algorithms),
         }
+        # Per-thread, so concurrent analyses on a thread pool keep their own timings
+        self._local = threading.local()
+
+        self.camelot_map = camelot.STANDARD_TO_CAMELOT
 
     def _get_camelot_key(self, key: str, scale: str) -> str:
         """Helper to convert standard key to Camelot notation."""
@@ -22,54 +104,338 @@ class AudioAnalyzer:
         formatted_key = f"{key} {scale.capitalize()}"
         return self.camelot_map.get(formatted_key, "Unknown")
 
-    def analyze_file(self, file_path: str) -> dict:
+    def params(self) -> dict:
+        """Parameters that affect analysis output (used to key cached results)."""
+        return {
+            "sample_rate": self.sample_rate,
+            "silence_threshold": self.silence_threshold,
+            "rhythm_method": self.rhythm_method,
+            "streaming_min_bytes": self.streaming_min_bytes,
+        }
+
+    def version(self) -> str:
+        """ANALYZER_VERSION plus a digest of params(); recorded on every result."""
+        digest = hashlib.sha1(json.dumps(self.params(), sort_keys=True).encode()).hexdigest()[:8]
+        return f"{ANALYZER_VERSION}-{digest}"
+
+    def config(self) -> dict:
+        """Everything needed to rebuild this analyzer (e.g. in a pool worker): params() plus caching."""
+        return {
+            **self.params(),
+            "pcm_cache_dir": self.pcm_cache_dir,
+            "pcm_cache_max_bytes": self.pcm_cache_max_bytes,
+        }
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def last_timings(self) -> dict:
+        """Seconds spent per stage (decode, silence, rhythm, key) by this thread's last analyze_file call."""
+        return getattr(self._local, "timings", {})
+
+    @last_timings.setter
+    def last_timings(self, timings: dict):
+        self._local.timings = timings
+
+    def _build_algorithms(self) -> dict:
+        """Creates the Essentia algorithms used by a single analysis pass."""
+        return {
+            "silence": es.StartStopSilence(threshold=self.silence_threshold),
+            "rhythm": es.RhythmExtractor2013(method=self.rhythm_method),
+            "key": es.KeyExtractor(),
+        }
+
+    def _build_preview_algorithms(self) -> dict:
+        return {
+            "bpm": es.PercivalBpmEstimator(sampleRate=self.PREVIEW_SAMPLE_RATE),
+            "key": es.KeyExtractor(sampleRate=self.PREVIEW_SAMPLE_RATE),
+        }
+
+    @contextmanager
+    def _algorithms(self, kind: str) -> Iterator[dict]:
+        if not self.reuse_algorithms:
+            # Fresh instances for every file, the original behaviour
+            yield self._pools[kind].factory()
+            return
+        with self._pools[kind].checkout() as algorithms:
+            yield algorithms
+
+    @contextmanager
+    def _timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.last_timings[stage] = self.last_timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def _should_stream(self, file_path: str) -> bool:
+        if self.streaming_min_bytes is None:
+            return False
+        return os.path.getsize(file_path) >= self.streaming_min_bytes
+
+    def _format_result(self, bpm: float, bpm_confidence: float, key: str, scale: str,
+                       key_strength: float, duration: float, preview: bool = False) -> dict:
+        return {
+            "bpm": round(bpm, 1),
+            "bpm_confidence": float(bpm_confidence),
+            "key_standard": f"{key} {scale.capitalize()}",
+            "key_camelot": self._get_camelot_key(key, scale),
+            "key_confidence": float(key_strength),
+            "duration": duration,
+            "preview": preview,
+            "analyzer_version": self.version(),
+        }
+
+    def _write_peaks(self, peaks_path: Optional[str], audio: np.ndarray, sample_rate: int):
+        if peaks_path:
+            with self._timed("peaks"):
+                waveform.write(peaks_path, waveform.encode_audio(audio, sample_rate))
+
+    def _load(self, file_path: str) -> np.ndarray:
+        """Decodes to mono at self.sample_rate, or maps the PCM cached by an earlier decode."""
+        with self._timed("decode"):
+            audio = self.pcm_cache.get(file_path, self.sample_rate) if self.pcm_cache is not None else None
+            if audio is not None:
+                return audio
+            audio = es.MonoLoader(filename=file_path, sampleRate=self.sample_rate)()
+        if self.pcm_cache is not None:
+            with self._timed("pcm_cache"):
+                try:
+                    self.pcm_cache.put(file_path, self.sample_rate, audio)
+                except OSError as e:
+                    # A full or unwritable cache never fails the analysis
+                    print(f"Could not cache decoded audio for {file_path}: {e}")
+        return audio
+
+    def analyze_file(self, file_path: str, preview: bool = False, peaks_path: Optional[str] = None,
+                     timeline_path: Optional[str] = None) -> dict:
         """
         Analyzes an audio file for BPM, Key, and Silence.
         Returns a dictionary with analysis results.
+        With preview=True a fast, lower-accuracy pass is run instead (see _analyze_preview).
+        When `peaks_path` is given, waveform peaks of the whole (untrimmed) track are
+        written there from the same decode (see waveform.py). Likewise, `timeline_path`
+        receives the beat grid, tempo curve and per-segment keys of a full, non-streaming
+        pass (see timeline.py); preview and streaming analyses don't write one.
+        Per-stage timings are left in `self.last_timings`.
         """
+        self.last_timings = {}
         try:
+            if preview:
+                return self._analyze_preview(file_path, peaks_path)
+
+            if self._should_stream(file_path):
+                return self._analyze_streaming(file_path, peaks_path)
+
             # 1. Load Audio
             # Resample to 44.1kHz mono as per constitution/requirements
-            loader = es.MonoLoader(filename=file_path, sampleRate=44100)
-            audio = loader()
-
-            # 2. Silence Removal
-            # Initialize algorithms fresh for each file to avoid state caching issues
-            silence_remover = es.StartStopSilence(threshold=-60)
-            
-            # Get start and end times of non-silent audio
-            start_time, end_time = silence_remover(audio)
-            
-            # Convert to samples
-            start_sample = int(start_time * 44100)
-            end_sample = int(end_time * 44100)
-            
-            # Truncate audio if valid range found
-            if end_sample > start_sample:
-                audio = audio[start_sample:end_sample]
-
-            # 3. BPM Detection
-            # RhythmExtractor2013 returns: bpm, ticks, confidence, estimates, bpmIntervals
-            rhythm_extractor = es.RhythmExtractor2013(method="multifeature")
-            bpm, _, beats_confidence, _, _ = rhythm_extractor(audio)
-
-            # 4. Key Detection
-            # KeyExtractor returns: key, scale, strength
-            key_extractor = es.KeyExtractor()
-            key, scale, key_strength = key_extractor(audio)
+            audio = self._load(file_path)
+
+            self._write_peaks(peaks_path, audio, self.sample_rate)
+
+            with self._algorithms("full") as algorithms:
+                # 2. Silence Removal
+                with self._timed("silence"):
+                    silence_remover = algorithms["silence"]
+
+                    # Get start and end times of non-silent audio
+                    start_time, end_time = silence_remover(audio)
+
+                    # Convert to samples
+                    start_sample = int(start_time * self.sample_rate)
+                    end_sample = int(end_time * self.sample_rate)
+
+                    # Truncate audio if valid range found
+                    offset = 0
+                    if end_sample > start_sample:
+                        audio = audio[start_sample:end_sample]
+                        offset = start_sample
+
+                # 3. BPM Detection
+                # RhythmExtractor2013 returns: bpm, ticks, confidence, estimates, bpmIntervals
+                with self._timed("rhythm"):
+                    rhythm_extractor = algorithms["rhythm"]
+                    bpm, ticks, beats_confidence, _, _ = rhythm_extractor(audio)
+
+                # 4. Key Detection
+                # KeyExtractor returns: key, scale, strength
+                with self._timed("key"):
+                    key_extractor = algorithms["key"]
+                    key, scale, key_strength = key_extractor(audio)
+                    segments = (
+                        timeline.key_segments(audio, self.sample_rate, key_extractor)
+                        if timeline_path is not None else None
+                    )
+
+            duration = len(audio) / float(self.sample_rate)
+            if timeline_path is not None:
+                with self._timed("timeline"):
+                    # Tempo windows are counted from the track start, like the beats
+                    start = offset / float(self.sample_rate)
+                    tempo = timeline.tempo_curve(np.asarray(ticks) + start, start + duration)
+                    data = timeline.encode(ticks, tempo, segments, self.sample_rate, offset)
+                    waveform.write(timeline_path, data)
 
             # 5. Format Results
-            result = {
-                "bpm": round(bpm, 1),
-                "bpm_confidence": float(beats_confidence),
-                "key_standard": f"{key} {scale.capitalize()}",
-                "key_camelot": self._get_camelot_key(key, scale),
-                "key_confidence": float(key_strength),
-                "duration": len(audio) / 44100.0
-            }
-            
-            return result
+            return self._format_result(bpm, beats_confidence, key, scale, key_strength, duration)
 
         except Exception as e:
             # In a production service, we might want to log this properly
             raise RuntimeError(f"Analysis failed for {file_path}: {str(e)}")
+
+    def _excerpts(self, audio: np.ndarray, sample_rate: int) -> list:
+        """Cuts PREVIEW_EXCERPTS windows out of the signal (the whole signal if it is short)."""
+        length = int(self.PREVIEW_EXCERPT_SECONDS * sample_rate)
+        if len(audio) <= length * len(self.PREVIEW_EXCERPTS):
+            return [audio]
+
+        excerpts = []
+        for position in self.PREVIEW_EXCERPTS:
+            start = min(max(int(len(audio) * position) - length // 2, 0), len(audio) - length)
+            excerpts.append(audio[start:start + length])
+        return excerpts
+
+    def _analyze_preview(self, file_path: str, peaks_path: Optional[str] = None) -> dict:
+        """
+        Triage-quality analysis for first-pass sorting of large crates.
+        Decodes at PREVIEW_SAMPLE_RATE and only analyses a few short excerpts:
+        tempo is the median of per-excerpt PercivalBpmEstimator results (its
+        confidence is how closely the excerpts agree) and key comes from
+        KeyExtractor over the joined excerpts. Silence is not trimmed.
+        """
+        sample_rate = self.PREVIEW_SAMPLE_RATE
+        with self._timed("decode"):
+            audio = es.MonoLoader(filename=file_path, sampleRate=sample_rate)()
+            excerpts = self._excerpts(audio, sample_rate)
+
+        self._write_peaks(peaks_path, audio, sample_rate)
+
+        with self._algorithms("preview") as algorithms:
+            with self._timed("rhythm"):
+                bpm_estimator = algorithms["bpm"]
+                estimates = np.array([bpm_estimator(excerpt) for excerpt in excerpts], dtype=np.float32)
+                bpm = float(np.median(estimates))
+                spread = float(np.max(np.abs(estimates - bpm))) / bpm if bpm > 0 else 1.0
+                bpm_confidence = max(0.0, 1.0 - spread)
+
+            with self._timed("key"):
+                key, scale, key_strength = algorithms["key"](np.concatenate(excerpts))
+
+        return self._format_result(
+            bpm, bpm_confidence, key, scale, key_strength, len(audio) / float(sample_rate), preview=True
+        )
+
+    def _analyze_streaming(self, file_path: str, peaks_path: Optional[str] = None) -> dict:
+        """
+        Lower-memory variant of analyze_file built on Essentia's streaming mode.
+        Decoding, silence detection, key and waveform peaks work on small
+        buffers, but memory still grows with the track length:
+        RhythmExtractor2013 has no frame-wise streaming implementation and
+        accumulates the whole trimmed signal before estimating the tempo. What
+        is saved is the full decoded array the standard mode keeps alongside
+        the analysis buffers, at the cost of decoding the file twice; the
+        "streaming" benchmark scenario reports peak RSS of both modes.
+        Two passes over the file are made:
+
+        1. loader -> FrameCutter -> StartStopSilence finds the first/last
+           non-silent frame.
+        2. loader -> Trimmer -> RhythmExtractor2013 / KeyExtractor / Duration
+           analyses only the non-silent region.
+
+        Streaming networks are single-use, so they are built per file rather
+        than taken from the algorithm pool.
+
+        Waveform peaks are taken per frame in pass 1, so their finest level is
+        STREAM_FRAME_SIZE samples per peak.
+
+        Tolerance vs. the standard mode: silence is trimmed on STREAM_FRAME_SIZE
+        boundaries (~46 ms at 44.1 kHz), so duration may differ by up to one frame
+        at each end, BPM by up to 0.5 (one rounding step), and key only on tracks
+        whose two strongest key candidates are nearly tied.
+        """
+        import essentia
+        import essentia.streaming as ess
+
+        frame_size = self.STREAM_FRAME_SIZE
+
+        # Pass 1: silence bounds
+        pool = essentia.Pool()
+        loader = ess.MonoLoader(filename=file_path, sampleRate=self.sample_rate)
+        cutter = ess.FrameCutter(frameSize=frame_size, hopSize=frame_size, startFromZero=True)
+        silence = ess.StartStopSilence(threshold=self.silence_threshold)
+        loader.audio >> cutter.signal
+        cutter.frame >> silence.frame
+        silence.startFrame >> (pool, "silence.start")
+        silence.stopFrame >> (pool, "silence.stop")
+        if peaks_path:
+            # One min/max pair per frame: a few floats per second, not the signal itself
+            frame_min = ess.MinMax(type="min")
+            frame_max = ess.MinMax(type="max")
+            cutter.frame >> frame_min.array
+            cutter.frame >> frame_max.array
+            frame_min.real >> (pool, "peaks.min")
+            frame_max.real >> (pool, "peaks.max")
+            frame_min.int >> None
+            frame_max.int >> None
+        # Decoding is interleaved with analysis in streaming mode, so passes are timed whole
+        with self._timed("silence"):
+            essentia.run(loader)
+
+        if peaks_path:
+            with self._timed("peaks"):
+                mins, maxs = pool["peaks.min"], pool["peaks.max"]
+                waveform.write(peaks_path, waveform.encode(
+                    mins, maxs, frame_size, self.sample_rate, len(mins) * frame_size
+                ))
+
+        start_time = float(pool["silence.start"][-1]) * frame_size / self.sample_rate
+        end_time = (float(pool["silence.stop"][-1]) + 1) * frame_size / self.sample_rate
+
+        # Pass 2: rhythm, key and duration over the trimmed signal
+        pool = essentia.Pool()
+        loader = ess.MonoLoader(filename=file_path, sampleRate=self.sample_rate)
+        source = loader.audio
+        if end_time > start_time:
+            trimmer = ess.Trimmer(startTime=start_time, endTime=end_time, sampleRate=self.sample_rate)
+            loader.audio >> trimmer.signal
+            source = trimmer.signal
+
+        rhythm = ess.RhythmExtractor2013(method=self.rhythm_method)
+        key_extractor = ess.KeyExtractor(sampleRate=self.sample_rate)
+        duration = ess.Duration(sampleRate=self.sample_rate)
+        source >> rhythm.signal
+        source >> key_extractor.audio
+        source >> duration.signal
+
+        rhythm.bpm >> (pool, "rhythm.bpm")
+        rhythm.confidence >> (pool, "rhythm.confidence")
+        rhythm.ticks >> None
+        rhythm.estimates >> None
+        rhythm.bpmIntervals >> None
+        key_extractor.key >> (pool, "key.key")
+        key_extractor.scale >> (pool, "key.scale")
+        key_extractor.strength >> (pool, "key.strength")
+        duration.duration >> (pool, "duration")
+        with self._timed("analysis"):
+            essentia.run(loader)
+
+        def last(name):
+            # Pool stores each emitted token, so single-shot outputs come back as 1-item sequences
+            value = pool[name]
+            return value[-1] if isinstance(value, (list, tuple, np.ndarray)) else value
+
+        return self._format_result(
+            float(last("rhythm.bpm")),
+            last("rhythm.confidence"),
+            last("key.key"),
+            last("key.scale"),
+            last("key.strength"),
+            float(last("duration")),
+        )
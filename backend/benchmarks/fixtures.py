@@ -0,0 +1,104 @@
+"""
+Synthetic audio fixtures for the benchmark suite.
+
+Every fixture is a click track at a known BPM layered over a I-IV-V-I chord
+progression in a known key, with optional leading/trailing silence, so the
+analyzer output can be checked against ground truth as well as timed.
+"""
+import os
+import wave
+from typing import List, Sequence
+import numpy as np
+
+SAMPLE_RATE = 44100
+PITCH_CLASSES = ["C", "C#", "D", "Eb", "E", "F", "F#", "G", "Ab", "A", "Bb", "B"]
+TRIADS = {"major": (0, 4, 7), "minor": (0, 3, 7)}
+# Scale degrees of the I, IV and V chords; V stays major in minor keys (harmonic minor)
+PROGRESSION = ((0, None), (5, None), (7, "major"), (0, None))
+
+def click_track(bpm: float, seconds: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decaying 1.5 kHz clicks on every beat, accented on the downbeat."""
+    signal = np.zeros(int(seconds * sample_rate), dtype=np.float32)
+    click_length = int(0.03 * sample_rate)
+    t = np.arange(click_length) / sample_rate
+    click = (np.sin(2 * np.pi * 1500 * t) * np.exp(-t * 150)).astype(np.float32)
+
+    beat = 0
+    position = 0.0
+    while int(position) < len(signal):
+        start = int(position)
+        end = min(start + click_length, len(signal))
+        gain = 1.0 if beat % 4 == 0 else 0.6
+        signal[start:end] += gain * click[:end - start]
+        beat += 1
+        position += 60.0 / bpm * sample_rate
+    return signal
+
+def chord_progression(key: str, scale: str, seconds: float, bpm: float,
+                      sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Sustained I-IV-V-I triads (one bar each, looped) with a few harmonics."""
+    root = PITCH_CLASSES.index(key)
+    bar_samples = int(4 * 60.0 / bpm * sample_rate)
+    t = np.arange(bar_samples) / sample_rate
+    envelope = np.minimum(1.0, t * 20) * np.exp(-t * 0.8)
+
+    bars = []
+    for offset, quality in PROGRESSION:
+        bar = np.zeros(bar_samples, dtype=np.float64)
+        for interval in TRIADS[quality or scale]:
+            midi = 48 + (root + offset + interval) % 12
+            frequency = 440.0 * 2 ** ((midi - 69) / 12)
+            for harmonic, weight in ((1, 1.0), (2, 0.4), (3, 0.2)):
+                bar += weight * np.sin(2 * np.pi * frequency * harmonic * t)
+        bars.append(bar * envelope)
+
+    loop = np.concatenate(bars)
+    total = int(seconds * sample_rate)
+    repeats = int(np.ceil(total / len(loop)))
+    return (np.tile(loop, repeats)[:total] * 0.08).astype(np.float32)
+
+def write_wav(path: str, signal: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+def make_fixture(path: str, bpm: float, key: str, scale: str, seconds: float,
+                 lead_silence: float = 2.0, tail_silence: float = 2.0,
+                 sample_rate: int = SAMPLE_RATE) -> dict:
+    music = click_track(bpm, seconds, sample_rate) + chord_progression(key, scale, seconds, bpm, sample_rate)
+    signal = np.concatenate([
+        np.zeros(int(lead_silence * sample_rate), dtype=np.float32),
+        music,
+        np.zeros(int(tail_silence * sample_rate), dtype=np.float32),
+    ])
+    write_wav(path, signal, sample_rate)
+    return {
+        "path": path,
+        "bpm": bpm,
+        "key_standard": f"{key} {scale.capitalize()}",
+        "duration": seconds,
+        "total_duration": len(signal) / sample_rate,
+        "lead_silence": lead_silence,
+        "tail_silence": tail_silence,
+    }
+
+DEFAULT_CASES = (
+    (90.0, "D", "major"),
+    (124.0, "A", "minor"),
+    (128.0, "F", "minor"),
+    (140.0, "G", "major"),
+)
+
+def generate_fixtures(out_dir: str, durations: Sequence[float] = (30, 180, 600),
+                      cases: Sequence[tuple] = DEFAULT_CASES) -> List[dict]:
+    """Writes one fixture per (case, duration) into out_dir and returns their ground truth."""
+    os.makedirs(out_dir, exist_ok=True)
+    fixtures = []
+    for seconds in durations:
+        for bpm, key, scale in cases:
+            path = os.path.join(out_dir, f"{int(bpm)}bpm_{key}{scale}_{int(seconds)}s.wav")
+            fixtures.append(make_fixture(path, bpm, key, scale, seconds))
+    return fixtures
@@ -0,0 +1,452 @@
+"""
+Benchmark harness for the analysis pipeline.
+
+Run from the backend directory:
+
+    python -m benchmarks.run                                   # all scenarios
+    python -m benchmarks.run --scenarios library --library-sizes 10000,100000
+    python -m benchmarks.run --compare old.json new.json       # diff two runs
+    python -m benchmarks.run --scenarios io --io-files 8 --io-size-mb 512
+
+Scenarios:
+- single:  AudioAnalyzer.analyze_file per fixture, with per-stage timings
+           (decode, silence, rhythm, key) and accuracy against ground truth
+- batch:   BatchProcessor in process-pool mode over many fixture copies
+- streaming: standard vs. streaming analysis of each fixture, each run in a
+           fresh process so its peak RSS is measured on its own, plus the
+           result differences between the two modes
+- library: LibraryManager bulk insert, lookups and updates at 10k-100k entries
+- io:      load test of a live API server: GET /api/status latency while
+           large files are uploaded and then copied into the output dir
+           concurrently, against the same server idle (not run by default)
+
+Results (plus peak RSS and run metadata) are written as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import generate_fixtures
+
+def peak_rss_mb() -> Dict[str, float]:
+    """High-water resident set size of this process and of reaped child processes."""
+    # ru_maxrss is reported in KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def bench_single(fixtures: List[dict]) -> dict:
+    from analyzer import AudioAnalyzer
+
+    analyzer = AudioAnalyzer()
+    rows = []
+    total = 0.0
+    for fixture in fixtures:
+        start = time.perf_counter()
+        result = analyzer.analyze_file(fixture["path"])
+        wall = time.perf_counter() - start
+        total += wall
+        rows.append({
+            "file": os.path.basename(fixture["path"]),
+            "audio_seconds": fixture["total_duration"],
+            "wall_seconds": wall,
+            "realtime_factor": fixture["total_duration"] / wall if wall else 0.0,
+            "stages": dict(analyzer.last_timings),
+            "expected_bpm": fixture["bpm"],
+            "bpm": result["bpm"],
+            "bpm_error": abs(result["bpm"] - fixture["bpm"]),
+            "expected_key": fixture["key_standard"],
+            "key": result["key_standard"],
+            "key_match": result["key_standard"] == fixture["key_standard"],
+        })
+
+    stage_totals: Dict[str, float] = {}
+    for row in rows:
+        for stage, seconds in row["stages"].items():
+            stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+    return {
+        "files": rows,
+        "files_per_second": len(rows) / total if total else 0.0,
+        "stage_seconds_total": stage_totals,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def analyze_in_child(path: str, stream: bool) -> dict:
+    """Runs in a spawned process: analyse one file and report its own peak RSS."""
+    from analyzer import AudioAnalyzer
+
+    analyzer = AudioAnalyzer(streaming_min_bytes=0 if stream else None)
+    start = time.perf_counter()
+    result = analyzer.analyze_file(path)
+    return {
+        "wall_seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb()["self"],
+        "result": result,
+    }
+
+def bench_streaming(fixtures: List[dict]) -> dict:
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    import essentia  # noqa: F401 - skip the scenario early without Essentia
+
+    # spawn, not fork: a forked child would start with this process' high-water RSS
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for fixture in fixtures:
+        row = {"file": os.path.basename(fixture["path"]), "audio_seconds": fixture["total_duration"]}
+        for mode, stream in (("standard", False), ("streaming", True)):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                run = pool.submit(analyze_in_child, fixture["path"], stream).result()
+            row[mode] = {"wall_seconds": run["wall_seconds"], "peak_rss_mb": run["peak_rss_mb"]}
+            row[mode + "_result"] = run["result"]
+        standard, streaming = row.pop("standard_result"), row.pop("streaming_result")
+        row["bpm_difference"] = abs(standard["bpm"] - streaming["bpm"])
+        row["duration_difference"] = abs(standard["duration"] - streaming["duration"])
+        row["key_match"] = standard["key_standard"] == streaming["key_standard"]
+        rows.append(row)
+    return {"files": rows}
+
+def bench_batch(fixtures: List[dict], copies: int, workers: int) -> dict:
+    from processor import BatchProcessor
+
+    upload_dir = tempfile.mkdtemp(prefix="bench_batch_")
+    try:
+        filenames = []
+        for copy in range(copies):
+            for fixture in fixtures:
+                name = f"{copy:03d}_{os.path.basename(fixture['path'])}"
+                os.symlink(os.path.abspath(fixture["path"]), os.path.join(upload_dir, name))
+                filenames.append(name)
+
+        processor = BatchProcessor(upload_dir, mode="process", workers=workers)
+        started: Dict[str, float] = {}
+        latencies: List[float] = []
+        failures = 0
+
+        async def run() -> float:
+            nonlocal failures
+            events = processor.subscribe(max_events=len(filenames) * 4 + 16)
+            start = time.perf_counter()
+            await processor.add_to_queue(filenames)
+            while True:
+                event = await events.get()
+                if event["event"] == "started":
+                    started[event["filename"]] = time.perf_counter()
+                elif event["event"] == "completed":
+                    latencies.append(time.perf_counter() - started.pop(event["filename"], start))
+                elif event["event"] == "failed":
+                    failures += 1
+                elif event["event"] == "idle":
+                    return time.perf_counter() - start
+
+        wall = asyncio.run(run())
+        processor.shutdown()
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    return {
+        "files": len(filenames),
+        "failed": failures,
+        "workers": processor.workers,
+        "wall_seconds": wall,
+        "files_per_second": len(filenames) / wall if wall else 0.0,
+        "job_seconds_p50": percentile(latencies, 0.5),
+        "job_seconds_p95": percentile(latencies, 0.95),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_library(sizes: List[int], backends: List[str], samples: int = 1000, updates: int = 20) -> dict:
+    from library import LibraryManager
+    from models import AnalysisResult
+
+    rng = random.Random(42)
+    results = {}
+    for backend in backends:
+        for size in sizes:
+            data_dir = tempfile.mkdtemp(prefix="bench_library_")
+            try:
+                library = LibraryManager(data_dir, backend=backend)
+                entries = [
+                    library.new_entry(
+                        f"track_{i:06d}.mp3",
+                        status="completed",
+                        analysis=AnalysisResult(
+                            bpm=round(rng.uniform(70, 175), 1),
+                            bpm_confidence=rng.random(),
+                            key_standard="A Minor",
+                            key_camelot=f"{rng.randint(1, 12)}{rng.choice('AB')}",
+                            key_confidence=rng.random(),
+                            duration=rng.uniform(60, 600),
+                        ),
+                    )
+                    for i in range(size)
+                ]
+
+                timings = {}
+                start = time.perf_counter()
+                library.save_entries(entries)
+                timings["bulk_insert_seconds"] = time.perf_counter() - start
+
+                picks = [entries[rng.randrange(size)] for _ in range(min(samples, size))]
+                start = time.perf_counter()
+                for entry in picks:
+                    library.get_entry(entry.id)
+                timings["get_entry_us"] = (time.perf_counter() - start) / len(picks) * 1e6
+
+                start = time.perf_counter()
+                for entry in picks:
+                    library.get_entry_by_filename(entry.filename)
+                timings["get_entry_by_filename_us"] = (time.perf_counter() - start) / len(picks) * 1e6
+
+                start = time.perf_counter()
+                for entry in picks[:updates]:
+                    library.update_analysis(entry.id, entry.analysis)
+                timings["update_analysis_ms"] = (time.perf_counter() - start) / len(picks[:updates]) * 1e3
+
+                start = time.perf_counter()
+                library.get_all()
+                timings["get_all_seconds"] = time.perf_counter() - start
+
+                timings["storage"] = library.storage_stats()
+                library.close()
+                results[f"{backend}_{size}"] = timings
+            finally:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+def silent_wav(path: str, size_mb: int):
+    """A mono 16-bit WAV of silence, roughly `size_mb` large, written without building it in memory."""
+    chunk = b"\x00" * (1024 * 1024)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(44100)
+        for _ in range(size_mb):
+            f.writeframes(chunk)
+
+def latency_summary(latencies: List[float]) -> dict:
+    return {
+        "requests": len(latencies),
+        "status_ms_p50": percentile(latencies, 0.5) * 1e3,
+        "status_ms_p95": percentile(latencies, 0.95) * 1e3,
+        "status_ms_max": max(latencies) * 1e3 if latencies else 0.0,
+    }
+
+def bench_io(files: int = 4, size_mb: int = 256, poll_interval: float = 0.02, idle_seconds: float = 1.0) -> dict:
+    """
+    Starts the API on a local port and polls GET /api/status from its own
+    thread throughout three phases: idle, `files` concurrent uploads of
+    `size_mb` WAVs (one /api/upload/batch request each) and concurrent
+    /api/process calls with tags, which copy every upload into the output
+    dir. Flat status latency across the phases means no file work blocks
+    the event loop. The server gets a temporary data dir (inputs, outputs
+    and library), so nothing is left in the real one.
+    """
+    import httpx
+    import uvicorn
+    import main
+    from library import LibraryManager
+
+    root = tempfile.mkdtemp(prefix="bench_io_")
+    input_dir, output_dir = os.path.join(root, "input"), os.path.join(root, "output")
+    os.makedirs(input_dir)
+    os.makedirs(output_dir)
+    source = os.path.join(root, "source.wav")
+    silent_wav(source, size_mb)
+    # The handlers read these module globals, so swapping them points the API at `root`
+    saved = {name: getattr(main, name) for name in ("DATA_DIR", "INPUT_DIR", "OUTPUT_DIR", "library")}
+    main.DATA_DIR, main.INPUT_DIR, main.OUTPUT_DIR = root, input_dir, output_dir
+    main.library = LibraryManager(root)
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    server_thread = threading.Thread(target=server.run, daemon=True)
+    server_thread.start()
+    latencies: Dict[str, List[float]] = {"idle": [], "upload": [], "process": []}
+    phase = ["idle"]
+    stop = threading.Event()
+    failures = 0
+    try:
+        while not server.started:
+            time.sleep(0.01)
+        base_url = "http://127.0.0.1:%d" % server.servers[0].sockets[0].getsockname()[1]
+
+        def poll():
+            with httpx.Client(base_url=base_url, timeout=60) as client:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    client.get("/api/status").raise_for_status()
+                    latencies[phase[0]].append(time.perf_counter() - start)
+                    time.sleep(poll_interval)
+
+        poller = threading.Thread(target=poll)
+        poller.start()
+        time.sleep(idle_seconds)
+
+        async def upload(client: "httpx.AsyncClient", index: int):
+            with open(source, "rb") as f:
+                response = await client.post(
+                    "/api/upload/batch", params={"analyze": "false"},
+                    files={"files": (f"bench_{index:03d}.wav", f, "audio/wav")},
+                )
+            response.raise_for_status()
+            return response.json()["entries"]
+
+        async def process(client: "httpx.AsyncClient", entry: dict):
+            return await client.post("/api/process", json={
+                "filename": entry["filename"], "pattern": "{Camelot} - {OriginalName}",
+                "bpm": 120.0, "key": "A Minor", "camelot": "8A", "tags": True,
+            })
+
+        async def run() -> Dict[str, float]:
+            nonlocal failures
+            wall = {}
+            async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+                phase[0] = "upload"
+                start = time.perf_counter()
+                batches = await asyncio.gather(*(upload(client, i) for i in range(files)))
+                wall["upload_seconds"] = time.perf_counter() - start
+                entries = [entry for batch in batches for entry in batch]
+
+                phase[0] = "process"
+                start = time.perf_counter()
+                responses = await asyncio.gather(*(process(client, entry) for entry in entries))
+                wall["process_seconds"] = time.perf_counter() - start
+                failures = sum(1 for response in responses if response.status_code != 200)
+            return wall
+
+        wall = asyncio.run(run())
+        stop.set()
+        poller.join()
+    finally:
+        stop.set()
+        server.should_exit = True
+        server_thread.join()
+        main.library.close()
+        for name, value in saved.items():
+            setattr(main, name, value)
+        shutil.rmtree(root, ignore_errors=True)
+
+    total_mb = files * size_mb
+    return {
+        "files": files,
+        "file_mb": size_mb,
+        "failed": failures,
+        "upload_mb_per_second": total_mb / wall["upload_seconds"] if wall["upload_seconds"] else 0.0,
+        "process_mb_per_second": total_mb / wall["process_seconds"] if wall["process_seconds"] else 0.0,
+        **{name: latency_summary(values) for name, values in latencies.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def run_metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.time(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def flatten(data, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a results document, keyed by dotted path."""
+    values = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            values.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        values[prefix[:-1]] = float(data)
+    return values
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = flatten(json.load(f)["scenarios"])
+    with open(new_path) as f:
+        new = flatten(json.load(f)["scenarios"])
+    for key in sorted(old.keys() & new.keys()):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"{key:70s} {old[key]:14.4f} -> {new[key]:14.4f} ({change:+.1f}%)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="single,batch,library")
+    parser.add_argument("--durations", default="30,180,600", help="Fixture lengths in seconds")
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "audio_bench_fixtures"))
+    parser.add_argument("--batch-copies", type=int, default=4, help="Copies of each fixture in the batch run")
+    parser.add_argument("--workers", type=int, default=None, help="Batch pool size (defaults to CPU count)")
+    parser.add_argument("--library-sizes", default="10000,100000")
+    parser.add_argument("--library-backends", default="sqlite,json")
+    parser.add_argument("--io-files", type=int, default=4, help="Concurrent uploads in the io load test")
+    parser.add_argument("--io-size-mb", type=int, default=256, help="Size of each io load test upload")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    report = {"meta": run_metadata(), "scenarios": {}}
+
+    fixtures = []
+    if {"single", "batch", "streaming"} & set(scenarios):
+        durations = [float(value) for value in args.durations.split(",")]
+        fixtures = generate_fixtures(args.fixtures_dir, durations)
+
+    for name in scenarios:
+        print(f"Running {name} benchmark...")
+        try:
+            if name == "single":
+                report["scenarios"][name] = bench_single(fixtures)
+            elif name == "streaming":
+                report["scenarios"][name] = bench_streaming(fixtures)
+            elif name == "batch":
+                report["scenarios"][name] = bench_batch(fixtures, args.batch_copies, args.workers)
+            elif name == "library":
+                sizes = [int(value) for value in args.library_sizes.split(",")]
+                report["scenarios"][name] = bench_library(sizes, args.library_backends.split(","))
+            elif name == "io":
+                report["scenarios"][name] = bench_io(args.io_files, args.io_size_mb)
+            else:
+                raise ValueError(f"Unknown scenario: {name}")
+        except ImportError as e:
+            # Essentia is only available inside the backend image
+            report["scenarios"][name] = {"skipped": str(e)}
+            print(f"Skipped {name}: {e}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
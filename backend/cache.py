@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+class AnalysisCache:
+    """
+    Persistent analysis cache keyed by audio content hash + analyzer parameters.
+    Entries are kept in LRU order and evicted once `max_entries` is exceeded.
+
+    With flush_interval=0 every change is written immediately. Otherwise changes
+    only mark the cache dirty and a timer thread writes it at most once per
+    interval, so callers on the event loop never wait for the file; close()
+    writes whatever is still pending.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000, flush_interval: float = 0.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self._write_lock = threading.Lock()  # Serialises flushes; held while writing the file
+        self.dirty = False
+        self._last_flush_at = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self.load()
+
+    @staticmethod
+    def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """SHA-256 of the raw file bytes, read in chunks."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(content_hash: str, params: dict) -> str:
+        params_hash = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+        return f"{content_hash}:{params_hash}"
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    # Stored oldest -> newest, so insertion order restores LRU order
+                    self.entries = OrderedDict(json.load(f))
+            except Exception as e:
+                print(f"Error loading analysis cache: {e}")
+                self.entries = OrderedDict()
+
+    def save(self):
+        """Marks the cache dirty and writes it now, or schedules the write when batching."""
+        with self.lock:
+            self.dirty = True
+            if self.flush_interval <= 0:
+                due = True
+            else:
+                due = False
+                if self._timer is None:
+                    delay = max(0.0, self.flush_interval - (time.monotonic() - self._last_flush_at))
+                    self._timer = threading.Timer(delay, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self.lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self.dirty:
+                    return
+                # Snapshot under the lock, write outside it so get()/put() don't wait for the disk
+                items = list(self.entries.items())
+                self.dirty = False
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(items, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"Error saving analysis cache: {e}")
+                with self.lock:
+                    self.dirty = True
+            self._last_flush_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def put(self, key: str, result: dict):
+        with self.lock:
+            self.entries[key] = dict(result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        self.save()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        self.save()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,46 @@
+import re
+from typing import List, Optional, Tuple
+
+_CAMELOT = re.compile(r"^(1[0-2]|[1-9])([AB])$")
+
+# Static map for Standard to Camelot conversion
+STANDARD_TO_CAMELOT = {
+    # Major Keys (B)
+    "B Major": "1B", "F# Major": "2B", "Gb Major": "2B", "Db Major": "3B", "C# Major": "3B",
+    "Ab Major": "4B", "G# Major": "4B", "Eb Major": "5B", "D# Major": "5B", "Bb Major": "6B", "A# Major": "6B",
+    "F Major": "7B", "C Major": "8B", "G Major": "9B", "D Major": "10B", "A Major": "11B", "E Major": "12B",
+
+    # Minor Keys (A)
+    "Ab Minor": "1A", "G# Minor": "1A", "Eb Minor": "2A", "D# Minor": "2A", "Bb Minor": "3A", "A# Minor": "3A",
+    "F Minor": "4A", "C Minor": "5A", "G Minor": "6A", "D Minor": "7A", "A Minor": "8A", "E Minor": "9A",
+    "B Minor": "10A", "F# Minor": "11A", "Gb Minor": "11A", "Db Minor": "12A", "C# Minor": "12A"
+}
+
+def parse(code: str) -> Optional[Tuple[int, str]]:
+    """Splits a Camelot code such as "8A" into (8, "A"); None if it isn't one."""
+    match = _CAMELOT.match(code.strip().upper()) if code else None
+    return (int(match.group(1)), match.group(2)) if match else None
+
+def compatible_keys(code: str) -> List[str]:
+    """
+    Keys that mix harmonically with `code`: the key itself, one step either
+    way around the wheel, and its relative major/minor (e.g. 8A -> 8A, 7A, 9A, 8B).
+    """
+    parsed = parse(code)
+    if parsed is None:
+        raise ValueError(f"Not a Camelot key: {code}")
+    number, letter = parsed
+    other = "B" if letter == "A" else "A"
+    return [
+        f"{number}{letter}",
+        f"{(number - 2) % 12 + 1}{letter}",
+        f"{number % 12 + 1}{letter}",
+        f"{number}{other}",
+    ]
+
+def short_key(key_standard: str) -> Optional[str]:
+    """Short key notation used in tags and DJ software: "A Minor" -> "Am", "F# Major" -> "F#"."""
+    parts = (key_standard or "").split()
+    if len(parts) != 2 or parts[1].lower() not in ("major", "minor"):
+        return None
+    return parts[0] + ("m" if parts[1].lower() == "minor" else "")
@@ -0,0 +1,123 @@
+"""
+Columnar, NumPy-backed copy of every entry's analysis result.
+
+The library keeps one row per analysed entry (bpm, confidences, Camelot key,
+duration) so the library-wide stats run as array operations instead of
+looping over LibraryEntry objects. Rows are appended into preallocated arrays
+that double when full; a delete moves the last row into the hole, so row
+order is arbitrary.
+"""
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+import camelot
+from models import AnalysisResult
+
+# Camelot codes in column order, i.e. 1A..12A then 1B..12B
+CAMELOT_CODES = np.array([f"{n}{letter}" for letter in "AB" for n in range(1, 13)])
+
+def code_index(code: str) -> int:
+    """Position of a Camelot code in CAMELOT_CODES, -1 when it isn't one ("Unknown")."""
+    parsed = camelot.parse(code)
+    if parsed is None:
+        return -1
+    number, letter = parsed
+    return (12 if letter == "B" else 0) + number - 1
+
+class AnalysisColumns:
+    def __init__(self, capacity: int = 1024):
+        self.lock = threading.Lock()
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self.bpm = np.zeros(capacity, dtype=np.float64)
+        self.bpm_confidence = np.zeros(capacity, dtype=np.float32)
+        self.key_confidence = np.zeros(capacity, dtype=np.float32)
+        self.duration = np.zeros(capacity, dtype=np.float32)
+        self.key = np.zeros(capacity, dtype=np.int8)
+        self.preview = np.zeros(capacity, dtype=bool)
+
+    _COLUMNS = ("bpm", "bpm_confidence", "key_confidence", "duration", "key", "preview")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _grow(self):
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(max(1, len(column) * 2), dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def update(self, id: str, analysis: Optional[AnalysisResult]):
+        """Adds or overwrites an entry's row; removes it when there is no analysis."""
+        with self.lock:
+            if analysis is None:
+                self._remove(id)
+                return
+            row = self._rows.get(id)
+            if row is None:
+                row = len(self.ids)
+                if row == len(self.bpm):
+                    self._grow()
+                self.ids.append(id)
+                self._rows[id] = row
+            self.bpm[row] = analysis.bpm
+            self.bpm_confidence[row] = analysis.bpm_confidence
+            self.key_confidence[row] = analysis.key_confidence
+            self.duration[row] = analysis.duration
+            self.key[row] = code_index(analysis.key_camelot)
+            self.preview[row] = analysis.preview
+
+    def remove(self, id: str):
+        with self.lock:
+            self._remove(id)
+
+    def _remove(self, id: str):
+        row = self._rows.pop(id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        if row != last:
+            for name in self._COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+            self.ids[row] = self.ids[last]
+            self._rows[self.ids[row]] = row
+        self.ids.pop()
+
+    def clear(self):
+        with self.lock:
+            self.ids = []
+            self._rows = {}
+
+    def _view(self, name: str) -> np.ndarray:
+        return getattr(self, name)[:len(self.ids)]
+
+    def stats(self, bpm_bin: float = 5.0) -> dict:
+        """Library-wide summary: counts, BPM distribution, key histogram and mean confidences."""
+        with self.lock:
+            count = len(self.ids)
+            if count == 0:
+                return {"analysed": 0, "previews": 0, "total_duration": 0.0, "bpm": None,
+                        "bpm_histogram": {}, "keys": {}, "mean_bpm_confidence": None,
+                        "mean_key_confidence": None}
+            bpm = self._view("bpm")
+            bins = (np.floor(bpm / bpm_bin) * bpm_bin).astype(np.int64)
+            bin_values, bin_counts = np.unique(bins, return_counts=True)
+            index = self._view("key")
+            key_counts = np.bincount(index[index >= 0], minlength=len(CAMELOT_CODES))
+            return {
+                "analysed": count,
+                "previews": int(self._view("preview").sum()),
+                "total_duration": float(self._view("duration").astype(np.float64).sum()),
+                "bpm": {
+                    "min": float(bpm.min()),
+                    "max": float(bpm.max()),
+                    "mean": float(bpm.mean()),
+                    "median": float(np.median(bpm)),
+                },
+                "bpm_histogram": {str(value): int(n) for value, n in zip(bin_values.tolist(), bin_counts.tolist())},
+                "keys": {code: int(n) for code, n in zip(CAMELOT_CODES.tolist(), key_counts.tolist()) if n},
+                "mean_bpm_confidence": float(self._view("bpm_confidence").mean()),
+                "mean_key_confidence": float(self._view("key_confidence").mean()),
+            }
@@ -0,0 +1,141 @@
+"""
+Streaming exports of the library's analysis results.
+
+Entries are read page by page through the library query API and each format
+is produced by a generator that yields output as it goes, so memory use
+depends on the page size rather than the library size.
+"""
+import csv
+import io
+import os
+from typing import Callable, Iterable, Iterator, List, Optional
+from urllib.parse import quote
+from xml.sax.saxutils import quoteattr
+import camelot
+from library import LibraryManager
+from models import LibraryEntry, LibraryQuery
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "xml": ("application/xml; charset=utf-8", "xml"),
+}
+COLUMNS = (
+    "id", "filename", "status", "bpm", "bpm_confidence", "key_standard", "key_camelot",
+    "key_confidence", "duration", "preview", "input_path", "output_path", "content_hash", "created_at",
+)
+ANALYSIS_COLUMNS = ("bpm", "bpm_confidence", "key_standard", "key_camelot", "key_confidence", "duration", "preview")
+PAGE_SIZE = 1000
+
+def iter_pages(library: LibraryManager, query: LibraryQuery,
+               page_size: int = PAGE_SIZE) -> Iterator[List[LibraryEntry]]:
+    """Walks every page matching `query` (its limit and cursor are ignored)."""
+    query = query.copy(update={"limit": page_size, "cursor": None})
+    while True:
+        page = library.query(query)
+        if page.entries:
+            yield page.entries
+        if page.next_cursor is None:
+            return
+        query = query.copy(update={"cursor": page.next_cursor})
+
+def row(entry: LibraryEntry) -> dict:
+    values = {name: getattr(entry, name, None) for name in COLUMNS}
+    analysis = entry.analysis
+    for name in ANALYSIS_COLUMNS:
+        values[name] = getattr(analysis, name) if analysis else None
+    return values
+
+def csv_chunks(pages: Iterable[List[LibraryEntry]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for entries in pages:
+        for entry in entries:
+            values = row(entry)
+            writer.writerow("" if values[name] is None else values[name] for name in COLUMNS)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+class _ChunkSink:
+    """Write-only file object that hands out what was written since the last take()."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+def parquet_chunks(pages: Iterable[List[LibraryEntry]]) -> Iterator[bytes]:
+    """One Parquet row group per page. Requires pyarrow (raises ImportError without it)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.string()), ("filename", pa.string()), ("status", pa.string()),
+        ("bpm", pa.float64()), ("bpm_confidence", pa.float64()), ("key_standard", pa.string()),
+        ("key_camelot", pa.string()), ("key_confidence", pa.float64()), ("duration", pa.float64()),
+        ("preview", pa.bool_()), ("input_path", pa.string()), ("output_path", pa.string()),
+        ("content_hash", pa.string()), ("created_at", pa.float64()),
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for entries in pages:
+            rows = [row(entry) for entry in entries]
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+def file_location(path: str) -> str:
+    return "file://localhost" + quote(os.path.abspath(path).replace(os.sep, "/"))
+
+def rekordbox_xml_chunks(pages: Iterable[List[LibraryEntry]], total: int,
+                         locate: Callable[[LibraryEntry], Optional[str]]) -> Iterator[str]:
+    """
+    A Rekordbox-style DJ_PLAYLISTS collection (importable by Rekordbox and
+    most tools that read its XML). `total` fills in COLLECTION Entries up
+    front; `locate` maps an entry to its file path on disk, or None.
+    """
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n<DJ_PLAYLISTS Version="1.0.0">\n'
+           '  <PRODUCT Name="Audio Analysis" Version="1.0" Company=""/>\n'
+           f'  <COLLECTION Entries="{total}">\n')
+    track_id = 0
+    for entries in pages:
+        lines = []
+        for entry in entries:
+            track_id += 1
+            attributes = {"TrackID": str(track_id), "Name": os.path.splitext(entry.filename)[0]}
+            if entry.file_size is not None:
+                attributes["Size"] = str(entry.file_size)
+            analysis = entry.analysis
+            if analysis:
+                attributes["TotalTime"] = str(int(round(analysis.duration)))
+                attributes["AverageBpm"] = f"{analysis.bpm:.2f}"
+                attributes["Tonality"] = camelot.short_key(analysis.key_standard) or ""
+            path = locate(entry)
+            if path:
+                attributes["Location"] = file_location(path)
+            lines.append("    <TRACK " + " ".join(f"{k}={quoteattr(v)}" for k, v in attributes.items()) + "/>\n")
+        yield "".join(lines)
+    yield "  </COLLECTION>\n  <PLAYLISTS>\n    <NODE Type=\"0\" Name=\"ROOT\" Count=\"0\"/>\n  </PLAYLISTS>\n</DJ_PLAYLISTS>\n"
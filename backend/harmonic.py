@@ -0,0 +1,111 @@
+import bisect
+import heapq
+import threading
+from typing import Dict, List, Optional, Tuple
+import camelot
+
+# Tempo relations checked for mixing: straight, half-time and double-time
+TEMPO_RATIOS = (("same", 1.0), ("half", 0.5), ("double", 2.0))
+# Sorts after every entry id, so (bpm, _MAX_ID) bounds all entries at that bpm
+_MAX_ID = "\U0010ffff"
+
+class HarmonicIndex:
+    """
+    In-memory index for "what can I mix into this?" queries.
+
+    Keeps, per Camelot key, a sorted list of (bpm, id). A query looks up the
+    key's harmonic neighbours (see camelot.compatible_keys) and bisects each
+    list for the BPM window around the target tempo (and its half/double),
+    walking outwards from the target so at most `limit` items are read per
+    window. Cost depends on the limit, not the library size.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._by_key: Dict[str, List[Tuple[float, str]]] = {}
+        self._entries: Dict[str, Tuple[str, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, id: str, key: Optional[str], bpm: Optional[float]):
+        """Adds, moves or (when key/bpm are missing) removes an entry."""
+        with self.lock:
+            self._remove(id)
+            if key is None or bpm is None or camelot.parse(key) is None:
+                return
+            bisect.insort(self._by_key.setdefault(key, []), (bpm, id))
+            self._entries[id] = (key, bpm)
+
+    def remove(self, id: str):
+        with self.lock:
+            self._remove(id)
+
+    def _remove(self, id: str):
+        indexed = self._entries.pop(id, None)
+        if indexed is None:
+            return
+        key, bpm = indexed
+        items = self._by_key[key]
+        position = bisect.bisect_left(items, (bpm, id))
+        if position < len(items) and items[position] == (bpm, id):
+            del items[position]
+
+    def clear(self):
+        with self.lock:
+            self._by_key = {}
+            self._entries = {}
+
+    @staticmethod
+    def _nearest(items: List[Tuple[float, str]], target: float, tolerance: float, count: int):
+        """Up to `count` items within the tolerance window, walking outwards from `target`."""
+        low = bisect.bisect_left(items, (target * (1 - tolerance / 100),))
+        high = bisect.bisect_right(items, (target * (1 + tolerance / 100), _MAX_ID))
+        right = bisect.bisect_left(items, (target,), low, high)
+        left = right - 1
+        while count > 0 and (left >= low or right < high):
+            if right >= high or (left >= low and target - items[left][0] <= items[right][0] - target):
+                yield items[left]
+                left -= 1
+            else:
+                yield items[right]
+                right += 1
+            count -= 1
+
+    def compatible(self, key: str, bpm: float, tolerance: float = 6.0, half_double: bool = True,
+                   limit: int = 50, exclude: Optional[str] = None) -> List[dict]:
+        """
+        Entries in a compatible key whose BPM is within `tolerance` percent of
+        `bpm` (or of half/double it when `half_double`), closest tempo first.
+        Each match is {"id", "key", "bpm", "relation", "tempo", "bpm_delta_percent"};
+        relation is "same", "adjacent" or "relative" and tempo "same", "half" or "double".
+        """
+        neighbours = camelot.compatible_keys(key)
+        relations = dict(zip(neighbours, ("same", "adjacent", "adjacent", "relative")))
+        ratios = TEMPO_RATIOS if half_double else TEMPO_RATIOS[:1]
+        matches = {}
+        with self.lock:
+            for candidate_key in neighbours:
+                items = self._by_key.get(candidate_key)
+                if not items:
+                    continue
+                for tempo, ratio in ratios:
+                    target = bpm * ratio
+                    for candidate_bpm, id in self._nearest(items, target, tolerance, limit + 1):
+                        if id == exclude:
+                            continue
+                        delta = abs(candidate_bpm - target) / target * 100
+                        if id not in matches or delta < matches[id]["bpm_delta_percent"]:
+                            matches[id] = {
+                                "id": id,
+                                "key": candidate_key,
+                                "bpm": candidate_bpm,
+                                "relation": relations[candidate_key],
+                                "tempo": tempo,
+                                "bpm_delta_percent": delta,
+                            }
+        rank = {"same": 0, "relative": 1, "adjacent": 2}
+        return heapq.nsmallest(
+            limit, matches.values(),
+            key=lambda match: (match["bpm_delta_percent"], rank[match["relation"]], match["id"]),
+        )
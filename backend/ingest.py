@@ -0,0 +1,97 @@
+import os
+from typing import Iterable, Iterator, List, Optional, Tuple
+from cache import AnalysisCache
+from library import LibraryManager
+from models import IngestResult, LibraryEntry
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".aiff", ".aif", ".m4a", ".aac", ".ogg", ".opus", ".wma")
+
+def resolve_directory(directory: str, data_dir: str) -> str:
+    """Resolves `directory` against the data dir and refuses anything outside it."""
+    root = os.path.realpath(data_dir)
+    path = os.path.realpath(os.path.join(root, directory))
+    if path != root and not path.startswith(root + os.sep):
+        raise ValueError(f"Directory must be inside the data directory: {directory}")
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Directory not found: {directory}")
+    return path
+
+def scan_audio_files(directory: str, recursive: bool = True,
+                     extensions: Iterable[str] = AUDIO_EXTENSIONS) -> Iterator[os.DirEntry]:
+    """Yields audio files under `directory`, filtered by extension (case-insensitive)."""
+    extensions = tuple(ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in extensions)
+    stack = [directory]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for item in it:
+                    if item.name.startswith("."):
+                        continue
+                    if item.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(item.path)
+                    elif item.is_file() and item.name.lower().endswith(extensions):
+                        yield item
+        except OSError as e:
+            print(f"Skipping unreadable directory during ingest: {e}")
+
+def ingest_directory(library: LibraryManager, directory: str, input_dir: str, recursive: bool = True,
+                     extensions: Optional[List[str]] = None,
+                     detect_changes: str = "stat", enqueue: bool = True) -> Tuple[IngestResult, List[str]]:
+    """
+    Registers every audio file under `directory` in the library with one batched
+    write. Entry filenames are paths relative to `input_dir` (like uploads), so
+    the processor can resolve them directly.
+
+    A file whose entry already has an analysis is skipped when its size and mtime
+    are unchanged; with detect_changes="hash" a changed stat is confirmed by
+    comparing content hashes before the file is re-analysed.
+    New and changed entries are marked "pending" when the caller is about to
+    `enqueue` them for analysis, else "uploaded" like an upload that isn't analysed.
+    Returns the counts and the filenames that need analysis.
+    """
+    if detect_changes not in ("stat", "hash"):
+        raise ValueError(f"Unknown change detection mode: {detect_changes}")
+
+    result = IngestResult(scanned=0, registered=0, updated=0, skipped=0)
+    to_save: List[LibraryEntry] = []
+    to_analyze: List[str] = []
+    status = "pending" if enqueue else "uploaded"
+
+    # Entries are read, changed and saved back, so no other library write may interleave
+    with library.lock:
+        for item in scan_audio_files(directory, recursive, extensions or AUDIO_EXTENSIONS):
+            result.scanned += 1
+            stat = item.stat()
+            filename = os.path.relpath(item.path, input_dir)
+            entry = library.get_entry_by_filename(filename)
+            content_hash = None
+
+            if entry is not None and entry.analysis is not None:
+                if entry.file_size == stat.st_size and entry.file_mtime == stat.st_mtime:
+                    result.skipped += 1
+                    continue
+                if detect_changes == "hash" and entry.content_hash:
+                    content_hash = AnalysisCache.hash_file(item.path)
+                    if content_hash == entry.content_hash:
+                        # Touched but identical: refresh the fingerprint only
+                        entry.file_size, entry.file_mtime = stat.st_size, stat.st_mtime
+                        to_save.append(entry)
+                        result.skipped += 1
+                        continue
+
+            if detect_changes == "hash" and content_hash is None:
+                content_hash = AnalysisCache.hash_file(item.path)
+            if entry is None:
+                entry = library.new_entry(filename, status=status)
+                result.registered += 1
+            else:
+                entry.input_path = filename
+                entry.status = status
+                result.updated += 1
+            entry.file_size, entry.file_mtime, entry.content_hash = stat.st_size, stat.st_mtime, content_hash
+            to_save.append(entry)
+            to_analyze.append(filename)
+
+        library.save_entries(to_save)
+    return result, to_analyze
@@ -0,0 +1,336 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from models import Job
+
+# Priority classes; higher values are claimed first
+PRIORITIES = {"batch": 0, "interactive": 10}
+
+class JobQueue:
+    """
+    Durable analysis job queue backed by SQLite.
+
+    Jobs move pending -> running -> done, or back to pending with an exponential
+    backoff when they fail, until `max_attempts` is reached and they end up
+    failed. Pending or running jobs can be cancelled. A filename that is already
+    pending or running is not queued twice, except that a full analysis is not
+    covered by a preview: it upgrades a pending preview job in place, or is
+    queued after a running one. Jobs left running by a crash are
+    returned to pending when the queue opens, so processing picks up where it
+    left off. Use path=":memory:" for a non-persistent queue.
+
+    Pending jobs are claimed by priority class, then by queue position (FIFO
+    unless moved). With `max_running_per_client`, a client that already has
+    that many jobs running is skipped until one of them finishes.
+
+    With `retention_seconds`, done, failed and cancelled jobs older than that
+    are deleted by prune(), which runs when the queue opens (the processor
+    also calls it whenever it goes idle).
+
+    Writes are short and some run on the event loop (enqueue, claim, complete),
+    so like library.db the queue uses WAL with synchronous=NORMAL: commits
+    don't wait for an fsync. A power loss can drop the last few transitions,
+    which only means a job is analysed again or re-queued by hand; the
+    database itself stays consistent, and a process crash loses nothing.
+    """
+
+    STATES = ("pending", "running", "done", "failed", "cancelled")
+    FINISHED_STATES = ("done", "failed", "cancelled")
+
+    def __init__(self, path: str = ":memory:", max_attempts: int = 3, backoff_seconds: float = 2.0,
+                 max_running_per_client: Optional[int] = None, retention_seconds: Optional[float] = None):
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.max_running_per_client = max_running_per_client or None
+        self.retention_seconds = retention_seconds or None
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT NOT NULL,
+                    preview INTEGER NOT NULL DEFAULT 0,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    position REAL,
+                    client TEXT
+                )
+                """
+            )
+            self._add_scheduling_columns()
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_filename ON jobs(filename, state)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(state, priority DESC, position)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_position ON jobs(position)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_client ON jobs(state, client)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(state, updated_at)")
+            recovered = self.conn.execute(
+                "UPDATE jobs SET state = 'pending', updated_at = ? WHERE state = 'running'", (time.time(),)
+            ).rowcount
+        if recovered:
+            print(f"Recovered {recovered} interrupted analysis jobs")
+        self.prune()
+
+    def _add_scheduling_columns(self):
+        # Queues created before priorities existed: add the columns, keep FIFO order
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in (("priority", "INTEGER NOT NULL DEFAULT 0"), ("position", "REAL"), ("client", "TEXT")):
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+        self.conn.execute("UPDATE jobs SET position = id WHERE position IS NULL")
+
+    @staticmethod
+    def _row_to_job(row) -> Job:
+        values = dict(row)
+        values.pop("position")
+        names = {value: name for name, value in PRIORITIES.items()}
+        values["priority"] = names.get(row["priority"], str(row["priority"]))
+        return Job(**{**values, "preview": bool(row["preview"])})
+
+    @staticmethod
+    def priority_value(priority: str) -> int:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        return PRIORITIES[priority]
+
+    def _get(self, job_id: int):
+        return self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self.lock:
+            row = self._get(job_id)
+        return self._row_to_job(row) if row else None
+
+    def enqueue(self, filenames: List[str], preview: bool = False, priority: str = "batch",
+                client: Optional[str] = None) -> List[Job]:
+        """
+        Queues each filename at the back of its priority class unless it is
+        already pending or running (see the class docstring for previews).
+        Returns the newly queued jobs; upgraded ones are not included.
+        """
+        level = self.priority_value(priority)
+        now = time.time()
+        added = []
+        with self.lock, self.conn:
+            position = self.conn.execute("SELECT MAX(position) AS last FROM jobs").fetchone()["last"] or 0
+            for filename in dict.fromkeys(filenames):
+                queued = self.conn.execute(
+                    "SELECT id, preview, state FROM jobs WHERE filename = ? AND state IN ('pending', 'running')",
+                    (filename,),
+                ).fetchall()
+                if queued and (preview or any(not row["preview"] for row in queued)):
+                    continue
+                waiting = [row for row in queued if row["state"] == "pending"]
+                if waiting:
+                    # The preview hasn't started, so it becomes the full analysis (keeping its place)
+                    self.conn.execute(
+                        "UPDATE jobs SET preview = 0, priority = MAX(priority, ?), updated_at = ? WHERE id = ?",
+                        (level, now, waiting[0]["id"]),
+                    )
+                    continue
+                position += 1
+                cursor = self.conn.execute(
+                    """
+                    INSERT INTO jobs (filename, preview, state, created_at, updated_at, priority, position, client)
+                    VALUES (?, ?, 'pending', ?, ?, ?, ?, ?)
+                    """,
+                    (filename, int(preview), now, now, level, position, client),
+                )
+                added.append(cursor.lastrowid)
+            rows = [self.conn.execute("SELECT * FROM jobs WHERE id = ?", (id,)).fetchone() for id in added]
+        return [self._row_to_job(row) for row in rows]
+
+    def _claimable(self) -> Tuple[str, list]:
+        # WHERE clause for pending jobs whose client is below its running limit
+        if self.max_running_per_client is None:
+            return "state = 'pending'", []
+        saturated = [row["client"] for row in self.conn.execute(
+            """
+            SELECT client FROM jobs WHERE state = 'running' AND client IS NOT NULL
+            GROUP BY client HAVING COUNT(*) >= ?
+            """,
+            (self.max_running_per_client,),
+        )]
+        if not saturated:
+            return "state = 'pending'", []
+        placeholders = ", ".join("?" * len(saturated))
+        return f"state = 'pending' AND (client IS NULL OR client NOT IN ({placeholders}))", saturated
+
+    def claim(self) -> Optional[Job]:
+        """Marks the next due pending job (highest priority, then queue position) as running and returns it."""
+        now = time.time()
+        with self.lock, self.conn:
+            where, params = self._claimable()
+            row = self.conn.execute(
+                f"""
+                SELECT id FROM jobs
+                WHERE {where} AND next_attempt_at <= ?
+                ORDER BY priority DESC, position LIMIT 1
+                """,
+                (*params, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (now, row["id"]),
+            )
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+        return self._row_to_job(row)
+
+    def complete(self, job_id: int):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = 'done', error = NULL, updated_at = ? WHERE id = ? AND state = 'running'",
+                (time.time(), job_id),
+            )
+
+    def fail(self, job_id: int, error: str) -> Job:
+        """Schedules a retry with backoff, or marks the job failed once attempts run out."""
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT attempts, state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            # A job cancelled while it was running stays cancelled
+            if row["state"] == "running" and row["attempts"] >= self.max_attempts:
+                self.conn.execute(
+                    "UPDATE jobs SET state = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                    (error, now, job_id),
+                )
+            elif row["state"] == "running":
+                delay = self.backoff_seconds * 2 ** (row["attempts"] - 1)
+                self.conn.execute(
+                    """
+                    UPDATE jobs SET state = 'pending', error = ?, next_attempt_at = ?, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (error, now + delay, now, job_id),
+                )
+            row = self._get(job_id)
+        return self._row_to_job(row)
+
+    def cancel(self, job_id: int) -> Optional[Job]:
+        """
+        Cancels a pending or running job and returns it (None if unknown). Done
+        and failed jobs are returned unchanged. The caller stops a running job.
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = 'cancelled', updated_at = ? WHERE id = ? AND state IN ('pending', 'running')",
+                (time.time(), job_id),
+            )
+            row = self._get(job_id)
+        return self._row_to_job(row) if row else None
+
+    def move(self, job_id: int, to: Optional[str] = None, before: Optional[int] = None,
+             priority: Optional[str] = None) -> Job:
+        """
+        Reorders a pending job: `to` "front" or "back" of its priority class, or
+        `before` another pending job (taking that job's priority), and/or moves it
+        to another `priority` class (at the back unless `to` says otherwise). Raises KeyError for unknown jobs and
+        ValueError for jobs that aren't pending or bad arguments.
+        """
+        if to not in (None, "front", "back"):
+            raise ValueError(f"Unknown position: {to}")
+        with self.lock, self.conn:
+            row = self._get(job_id)
+            if row is None:
+                raise KeyError(job_id)
+            if row["state"] != "pending":
+                raise ValueError("Only pending jobs can be moved")
+            level = self.priority_value(priority) if priority is not None else row["priority"]
+            position = row["position"]
+            if before is not None:
+                target = self._get(before)
+                if target is None or target["state"] != "pending" or before == job_id:
+                    raise ValueError("Can only move before another pending job")
+                level = target["priority"]
+                previous = self.conn.execute(
+                    """
+                    SELECT MAX(position) AS position FROM jobs
+                    WHERE state = 'pending' AND priority = ? AND position < ? AND id != ?
+                    """,
+                    (level, target["position"], job_id),
+                ).fetchone()["position"]
+                position = (previous + target["position"]) / 2 if previous is not None else target["position"] - 1
+            elif to == "front":
+                first = self.conn.execute(
+                    "SELECT MIN(position) AS position FROM jobs WHERE state = 'pending' AND priority = ?", (level,)
+                ).fetchone()["position"]
+                if first is not None:
+                    # Otherwise the class is empty and the job keeps its place
+                    position = min(first, position) - 1
+            elif to == "back" or level != row["priority"]:
+                # A job changing class joins the back of its new class unless told otherwise
+                position = self.conn.execute("SELECT MAX(position) AS position FROM jobs").fetchone()["position"] + 1
+            self.conn.execute(
+                "UPDATE jobs SET priority = ?, position = ?, updated_at = ? WHERE id = ?",
+                (level, position, time.time(), job_id),
+            )
+            row = self._get(job_id)
+        return self._row_to_job(row)
+
+    def next_retry_delay(self) -> Optional[float]:
+        """Seconds until the next claimable pending job becomes due, or None if there is none."""
+        with self.lock:
+            where, params = self._claimable()
+            row = self.conn.execute(
+                f"SELECT MIN(next_attempt_at) AS due FROM jobs WHERE {where}", params
+            ).fetchone()
+        if row["due"] is None:
+            return None
+        return max(0.0, row["due"] - time.time())
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        counts = {state: 0 for state in self.STATES}
+        counts.update({row["state"]: row["n"] for row in rows})
+        return counts
+
+    def pending_count(self) -> int:
+        """Pending jobs only; cheap enough for every event, unlike counts() which scans all states."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE state = 'pending'").fetchone()["n"]
+
+    def prune(self) -> int:
+        """Deletes finished jobs older than `retention_seconds`; returns how many went."""
+        if self.retention_seconds is None:
+            return 0
+        placeholders = ", ".join("?" * len(self.FINISHED_STATES))
+        with self.lock, self.conn:
+            return self.conn.execute(
+                f"DELETE FROM jobs WHERE state IN ({placeholders}) AND updated_at < ?",
+                (*self.FINISHED_STATES, time.time() - self.retention_seconds),
+            ).rowcount
+
+    def list(self, state: Optional[str] = None, limit: int = 100) -> List[Job]:
+        """Newest first; pending jobs are listed in the order they will be claimed."""
+        with self.lock:
+            if state == "pending":
+                rows = self.conn.execute(
+                    "SELECT * FROM jobs WHERE state = 'pending' ORDER BY priority DESC, position LIMIT ?", (limit,)
+                ).fetchall()
+            elif state:
+                rows = self.conn.execute(
+                    "SELECT * FROM jobs WHERE state = ? ORDER BY id DESC LIMIT ?", (state, limit)
+                ).fetchall()
+            else:
+                rows = self.conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,109 +1,207 @@
-import json
 import os
+import threading
 import time
 import uuid
-from typing import List, Optional
-from models import LibraryEntry, AnalysisResult
+from typing import Dict, List, Optional
+from columns import AnalysisColumns
+from harmonic import HarmonicIndex
+from models import LibraryEntry, LibraryPage, LibraryQuery, AnalysisResult
+from storage import LibraryStorage, JsonStorage, SqliteStorage
 
 class LibraryManager:
-    def __init__(self, data_dir: str):
+    """
+    Library entries on top of a storage backend, plus the in-memory indexes
+    kept in step with it. Handlers update entries from several I/O threads at
+    once, so every read-modify-write below runs under `lock`; callers doing
+    their own get -> change -> save_entries take it too.
+    """
+
+    BACKENDS = ("sqlite", "json")
+
+    def __init__(self, data_dir: str, backend: str = "sqlite",
+                 flush_interval: float = 0.0, flush_batch: int = 100):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown library backend: {backend}")
         self.data_dir = data_dir
-        self.db_path = os.path.join(data_dir, "library.json")
-        self.entries: List[LibraryEntry] = []
-        self.load()
-
-    def load(self):
-        if os.path.exists(self.db_path):
-            try:
-                with open(self.db_path, "r") as f:
-                    data = json.load(f)
-                    self.entries = [LibraryEntry(**item) for item in data]
-            except Exception as e:
-                print(f"Error loading library: {e}")
-                self.entries = []
+        self.lock = threading.RLock()
+        self.json_path = os.path.join(data_dir, "library.json")
+        self.storage: LibraryStorage
+        if backend == "sqlite":
+            # library.json is only read once, as a migration source
+            self.storage = SqliteStorage(os.path.join(data_dir, "library.db"), legacy_json_path=self.json_path)
         else:
-            self.entries = []
+            # flush_interval > 0 enables write-behind: saves are coalesced
+            self.storage = JsonStorage(self.json_path, flush_interval=flush_interval, flush_batch=flush_batch)
+
+        # Key/BPM index for compatible-track queries, kept in step with every write below
+        self.harmonic = HarmonicIndex()
+        # Columnar copy of every analysis result for vectorised bulk operations
+        self.columns = AnalysisColumns()
+        for entry in self.storage.all():
+            self._index(entry)
 
-    def save(self):
-        try:
-            with open(self.db_path, "w") as f:
-                json.dump([entry.dict() for entry in self.entries], f, indent=2)
-        except Exception as e:
-            print(f"Error saving library: {e}")
+    def _index(self, entry: LibraryEntry):
+        analysis = entry.analysis
+        self.harmonic.update(entry.id, analysis.key_camelot if analysis else None, analysis.bpm if analysis else None)
+        self.columns.update(entry.id, analysis)
 
-    def add_entry(self, filename: str) -> LibraryEntry:
-        entry = LibraryEntry(
+    def _put(self, entries: List[LibraryEntry]):
+        self.storage.put_many(entries)
+        for entry in entries:
+            self._index(entry)
+
+    def _delete(self, ids: List[str]):
+        self.storage.delete_many(ids)
+        for id in ids:
+            self.harmonic.remove(id)
+            self.columns.remove(id)
+
+    def new_entry(self, filename: str, **fields) -> LibraryEntry:
+        """Builds an entry without persisting it (see save_entries)."""
+        values = dict(
             id=str(uuid.uuid4()),
             filename=filename,
             input_path=filename, # Relative to input dir
             created_at=time.time(),
             status="uploaded"
         )
-        self.entries.append(entry)
-        self.save()
-        return entry
+        values.update(fields)
+        return LibraryEntry(**values)
+
+    def add_entry(self, filename: str, **fields) -> LibraryEntry:
+        with self.lock:
+            entry = self.new_entry(filename, **fields)
+            self._put([entry])
+            return entry
+
+    def save_entries(self, entries: List[LibraryEntry]):
+        """Persists new or modified entries in a single batched write."""
+        with self.lock:
+            if entries:
+                self._put(entries)
 
     def get_entry(self, id: str) -> Optional[LibraryEntry]:
-        for entry in self.entries:
-            if entry.id == id:
-                return entry
-        return None
-    
+        return self.storage.get(id)
+
     def get_entry_by_filename(self, filename: str) -> Optional[LibraryEntry]:
-        for entry in self.entries:
-            if entry.filename == filename:
-                return entry
-        return None
+        return self.storage.get_by_filename(filename)
 
     def update_analysis(self, id: str, result: AnalysisResult):
-        entry = self.get_entry(id)
-        if entry:
-            entry.analysis = result
-            entry.status = "completed"
-            self.save()
+        with self.lock:
+            entry = self.get_entry(id)
+            # A preview never downgrades a full analysis; a full pass always upgrades a preview
+            if entry and entry.analysis and not entry.analysis.preview and result.preview:
+                return
+            if entry:
+                entry.analysis = result
+                entry.status = "completed"
+                self._put([entry])
+
+    def set_status(self, id: str, status: str):
+        with self.lock:
+            entry = self.get_entry(id)
+            if entry:
+                entry.status = status
+                self.storage.put(entry)
 
     def set_output(self, id: str, output_filename: str):
-        entry = self.get_entry(id)
-        if entry:
-            entry.output_path = output_filename
-            self.save()
+        with self.lock:
+            entry = self.get_entry(id)
+            if entry:
+                entry.output_path = output_filename
+                self.storage.put(entry)
+
+    def set_outputs(self, outputs: Dict[str, str]):
+        """set_output for many entries ({id: output filename}) in one batched write."""
+        with self.lock:
+            entries = [entry for entry in (self.get_entry(id) for id in outputs) if entry is not None]
+            for entry in entries:
+                entry.output_path = outputs[entry.id]
+            self.save_entries(entries)
 
     def delete_input(self, id: str):
-        entry = self.get_entry(id)
-        if entry:
-            entry.input_path = None
-            self.check_cleanup(entry)
-            self.save()
+        with self.lock:
+            entry = self.get_entry(id)
+            if entry:
+                entry.input_path = None
+                self.check_cleanup(entry)
 
     def delete_output(self, id: str):
-        entry = self.get_entry(id)
-        if entry:
-            entry.output_path = None
-            self.check_cleanup(entry)
-            self.save()
+        with self.lock:
+            entry = self.get_entry(id)
+            if entry:
+                entry.output_path = None
+                self.check_cleanup(entry)
 
     def check_cleanup(self, entry: LibraryEntry):
         # If both input and output are gone, remove the entry?
         # Or keep metadata? User requirement: "once input and output files are both deleted, the corresponding metadata should be deleted"
         if entry.input_path is None and entry.output_path is None:
-            self.entries.remove(entry)
+            self._delete([entry.id])
+        else:
+            self.storage.put(entry)
 
     def get_all(self) -> List[LibraryEntry]:
-        return self.entries
-    
+        return self.storage.all()
+
+    def query(self, query: LibraryQuery) -> LibraryPage:
+        """Filtered, sorted, cursor-paginated view of the library (raises ValueError on bad input)."""
+        entries, next_cursor, total = self.storage.query(query)
+        return LibraryPage(entries=entries, next_cursor=next_cursor, total=total)
+
+    def compatible(self, key: str, bpm: float, tolerance: float = 6.0, half_double: bool = True,
+                   limit: int = 50, exclude: Optional[str] = None) -> List[dict]:
+        """Harmonically compatible tracks (see HarmonicIndex.compatible), each with its "entry" attached."""
+        matches = self.harmonic.compatible(key, bpm, tolerance, half_double, limit, exclude)
+        for match in matches:
+            match["entry"] = self.get_entry(match["id"])
+        return [match for match in matches if match["entry"] is not None]
+
+    def stats(self) -> dict:
+        """Library-wide analysis summary (see AnalysisColumns.stats)."""
+        return self.columns.stats()
+
+    def etag(self) -> str:
+        """Changes whenever any entry is written or deleted."""
+        return f"{self.storage.generation}-{self.storage.version}"
+
     def clear_inputs(self):
         """
         Called when the input directory is wiped.
         1. Removes entries that have NO output_path (transient inputs).
         2. For entries with output_path, sets input_path to None (input is gone).
         """
-        new_entries = []
-        for entry in self.entries:
-            if entry.output_path:
-                # Keep this entry, but mark input as gone
-                entry.input_path = None
-                new_entries.append(entry)
-            # Else: entry has no output, so it was just a transient input. Drop it.
-        
-        self.entries = new_entries
-        self.save()
+        with self.lock:
+            kept, dropped = [], []
+            for entry in self.storage.all():
+                if entry.input_path and entry.input_path.startswith(os.pardir):
+                    # Ingested from elsewhere under the data dir; not affected by an input wipe
+                    continue
+                if entry.output_path:
+                    # Keep this entry, but mark input as gone
+                    entry.input_path = None
+                    kept.append(entry)
+                else:
+                    # Entry has no output, so it was just a transient input. Drop it.
+                    dropped.append(entry.id)
+
+            if dropped:
+                self._delete(dropped)
+            if kept:
+                self.storage.put_many(kept)
+
+    def clear(self):
+        with self.lock:
+            self.storage.clear()
+            self.harmonic.clear()
+            self.columns.clear()
+
+    def flush(self):
+        self.storage.flush()
+
+    def storage_stats(self) -> dict:
+        return self.storage.stats()
+
+    def close(self):
+        # Flushes any buffered writes before releasing the backend
+        self.storage.close()
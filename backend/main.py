@@ -1,12 +1,36 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
 from fastapi.staticfiles import StaticFiles
+import asyncio
+import json
+import re
 import shutil
 import os
-from typing import List
-from models import AnalyzeRequest, AnalysisResult, QueueRequest, QueueStatus, RenameRequest, LibraryEntry
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from models import (
+    AnalyzeRequest, AnalysisResult, QueueRequest, QueueStatus, RenameRequest, LibraryEntry, Job,
+    IngestRequest, IngestResult, ProfilingSettings, LibraryPage, LibraryQuery, CompatibleTrack,
+    BatchUploadResult, UploadRejection, ProcessBatchRequest, JobUpdate,
+)
 from processor import BatchProcessor
+from reanalysis import Reanalyzer
+from jobs import JobQueue
+from ingest import AUDIO_EXTENSIONS, ingest_directory, resolve_directory
+from analyzer import AudioAnalyzer
 from library import LibraryManager
+from cache import AnalysisCache
+import camelot
+from metrics import HTTP_REQUEST_SECONDS, JOBS_STATE, RequestProfiler, registry
+import timeline
+import waveform
+import export
+import outputs
+from uploads import CHUNK_SIZE, InvalidAudioError, extract_archive, is_archive, save_upload
 
 app = FastAPI()
 
@@ -23,31 +47,314 @@ app.add_middleware(
 DATA_DIR = "/data" if os.path.exists("/data") else "music_in"
 INPUT_DIR = os.path.join(DATA_DIR, "input")
 OUTPUT_DIR = os.path.join(DATA_DIR, "output")
+PEAKS_DIR = os.path.join(DATA_DIR, "peaks") # Waveform peaks, named by audio content hash
+TIMELINE_DIR = os.path.join(DATA_DIR, "timeline") # Beat grids, tempo curves and key segments, likewise
 
 os.makedirs(INPUT_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(PEAKS_DIR, exist_ok=True)
+os.makedirs(TIMELINE_DIR, exist_ok=True)
+
+# Analysis engine: "process" (multi-core pool) or "serial" (single worker thread)
+ANALYSIS_MODE = os.environ.get("ANALYSIS_MODE", "process")
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "0")) or None # Defaults to CPU count
+ANALYSIS_CACHE_SIZE = int(os.environ.get("ANALYSIS_CACHE_SIZE", "5000")) # 0 disables the cache
+ANALYSIS_CACHE_FLUSH_INTERVAL = float(os.environ.get("ANALYSIS_CACHE_FLUSH_INTERVAL", "5")) # Seconds; 0 writes every change
+ANALYSIS_STREAMING_MIN_MB = os.environ.get("ANALYSIS_STREAMING_MIN_MB") # Unset disables streaming analysis
+ANALYSIS_TIMELINE = os.environ.get("ANALYSIS_TIMELINE", "0") == "1" # Beat grid, tempo curve and key segments
+REANALYSIS_CPU_BUDGET = float(os.environ.get("REANALYSIS_CPU_BUDGET", "1")) # Cores used on average by re-analysis
+REANALYSIS_CHUNK_SIZE = int(os.environ.get("REANALYSIS_CHUNK_SIZE", "100")) # Entries per checkpoint
+PCM_CACHE_MB = float(os.environ.get("PCM_CACHE_MB", "0")) # Decoded audio kept for re-analysis; 0 disables
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.environ.get("JOB_RETRY_BACKOFF", "2")) # Seconds, doubled per attempt
+JOB_MAX_PER_CLIENT = int(os.environ.get("JOB_MAX_PER_CLIENT", "0")) # Running jobs per client; 0 is unlimited
+JOB_RETENTION_HOURS = float(os.environ.get("JOB_RETENTION_HOURS", "168")) # Finished jobs kept; 0 keeps them all
+LIBRARY_BACKEND = os.environ.get("LIBRARY_BACKEND", "sqlite") # "sqlite" or legacy "json"
+LIBRARY_FLUSH_INTERVAL = float(os.environ.get("LIBRARY_FLUSH_INTERVAL", "0")) # json backend write-behind, seconds
+LIBRARY_FLUSH_BATCH = int(os.environ.get("LIBRARY_FLUSH_BATCH", "100"))
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1" # Can also be toggled at runtime
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "4")) # Files written at once by /api/upload/batch
+IO_WORKERS = int(os.environ.get("IO_WORKERS", "8")) # Threads for blocking file and library work of async handlers
 
 # Initialize Services
-library = LibraryManager(DATA_DIR)
-processor = BatchProcessor(INPUT_DIR) # Processor works on input dir
+# Async handlers hand blocking file and library work to this pool (see run_io), keeping
+# it apart from the default executor that serial-mode analysis and hashing use
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+library = LibraryManager(
+    DATA_DIR,
+    backend=LIBRARY_BACKEND,
+    flush_interval=LIBRARY_FLUSH_INTERVAL,
+    flush_batch=LIBRARY_FLUSH_BATCH,
+)
+analysis_cache = (
+    AnalysisCache(os.path.join(DATA_DIR, "analysis_cache.json"), max_entries=ANALYSIS_CACHE_SIZE,
+                  flush_interval=ANALYSIS_CACHE_FLUSH_INTERVAL)
+    if ANALYSIS_CACHE_SIZE > 0 else None
+)
+analyzer = AudioAnalyzer(
+    streaming_min_bytes=int(float(ANALYSIS_STREAMING_MIN_MB) * 1024 * 1024) if ANALYSIS_STREAMING_MIN_MB else None,
+    pcm_cache_dir=os.path.join(DATA_DIR, "pcm_cache"),
+    pcm_cache_max_bytes=int(PCM_CACHE_MB * 1024 * 1024),
+)
+jobs = JobQueue(
+    os.path.join(DATA_DIR, "jobs.db"), max_attempts=JOB_MAX_ATTEMPTS, backoff_seconds=JOB_RETRY_BACKOFF,
+    max_running_per_client=JOB_MAX_PER_CLIENT, retention_seconds=JOB_RETENTION_HOURS * 3600,
+)
+processor = BatchProcessor(
+    INPUT_DIR, mode=ANALYSIS_MODE, workers=ANALYSIS_WORKERS, cache=analysis_cache, analyzer=analyzer, jobs=jobs,
+    peaks_dir=PEAKS_DIR, timeline_dir=TIMELINE_DIR if ANALYSIS_TIMELINE else None,
+) # Processor works on input dir
+
+# Latest library write queued by sync_library per filename, until it finishes
+library_syncs: Dict[str, asyncio.Future] = {}
+
+def sync_library(event: dict):
+    # Keep the library in step with the processor as results arrive. Listeners
+    # run on the event loop, so the library write goes to the I/O pool.
+    if event["event"] not in ("completed", "failed", "cancelled"):
+        return
+    filename = event["filename"]
+    future = asyncio.get_running_loop().run_in_executor(io_executor, apply_job_event, event)
+    library_syncs[filename] = future
+
+    def done(_):
+        if library_syncs.get(filename) is future:
+            del library_syncs[filename]
+
+    future.add_done_callback(done)
+
+def apply_job_event(event: dict):
+    try:
+        with library.lock:
+            entry = library.get_entry_by_filename(event["filename"])
+            if not entry:
+                return
+            if event["event"] == "completed":
+                library.update_analysis(entry.id, AnalysisResult(**event["result"]))
+            elif event["event"] == "cancelled":
+                if entry.status in ("pending", "processing"):
+                    library.set_status(entry.id, "completed" if entry.analysis else "uploaded")
+            else:
+                library.set_status(entry.id, "error")
+    except Exception as e:
+        print(f"Library update failed for {event['event']} {event['filename']}: {e}")
+
+processor.add_listener(sync_library)
+
+reanalyzer = Reanalyzer(
+    library, processor, INPUT_DIR, OUTPUT_DIR, os.path.join(DATA_DIR, "reanalysis.json"),
+    cpu_budget=REANALYSIS_CPU_BUDGET, chunk_size=REANALYSIS_CHUNK_SIZE, executor=io_executor,
+)
+
+profiler = RequestProfiler()
+profiler.enabled = PROFILING_ENABLED
+
+class ProfiledRoute(APIRoute):
+    # Sync endpoints run on FastAPI's threadpool, so their profiles are taken in the worker thread
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if not asyncio.iscoroutinefunction(endpoint):
+            endpoint = profiler.wrap_sync(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+app.router.route_class = ProfiledRoute
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Profiling is opt-in per request (X-Profile: 1 or ?profile=1) while the hook is enabled
+    wants_profile = request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+    profile = profiler.start() if wants_profile else None
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        if profile is not None:
+            profiler.stop(profile, request.method, request.url.path, elapsed)
+        # Label by route template so ids in paths don't explode the label set
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            elapsed, method=request.method, route=getattr(route, "path", "unmatched"), status=status
+        )
 
 # Mount directories
 app.mount("/files/input", StaticFiles(directory=INPUT_DIR), name="input_files")
 app.mount("/files/output", StaticFiles(directory=OUTPUT_DIR), name="output_files")
 
+@app.on_event("startup")
+async def resume_jobs():
+    # Pick up jobs that were pending or interrupted when the server last stopped
+    await processor.resume()
+    await reanalyzer.resume()
+
+@app.on_event("shutdown")
+def shutdown_services():
+    processor.shutdown()
+    io_executor.shutdown(wait=True) # Let in-progress file and library writes finish
+    library.close()
+    if analysis_cache is not None:
+        analysis_cache.close()
+
 @app.get("/")
 def read_root():
     return {"message": "Audio Analysis Backend is running"}
 
+async def run_io(func: Callable, *args):
+    """Runs blocking file or library work on the I/O pool so the event loop keeps serving requests."""
+    return await asyncio.get_running_loop().run_in_executor(io_executor, func, *args)
+
+def not_modified(request: Request, response: Response, etag: str) -> bool:
+    """Sets the ETag and reports whether the client's If-None-Match already matches it."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache" # Always revalidate, but reuse on 304
+    return request.headers.get("if-none-match") == etag
+
 @app.get("/api/library", response_model=List[LibraryEntry])
-def get_library():
+def get_library(request: Request, response: Response):
+    etag = f'"{library.etag()}"'
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers={"ETag": etag})
     return library.get_all()
 
-@app.post("/api/upload", response_model=LibraryEntry)
-async def upload_file(file: UploadFile = File(...)):
-    # Enforce single file workflow: Clear input directory
+@app.get("/api/library/stats")
+def library_stats(request: Request, response: Response):
+    """BPM distribution, key histogram and confidence averages, computed over the columnar results."""
+    etag = f'"stats-{library.etag()}"'
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return library.stats()
+
+def build_library_query(status: Optional[str], bpm_min: Optional[float], bpm_max: Optional[float],
+                        key: Optional[str], compatible_with: Optional[str], sort: str, order: str,
+                        limit: int = 100, cursor: Optional[str] = None) -> LibraryQuery:
+    """Turns the shared library filter parameters into a LibraryQuery (raises ValueError on bad keys)."""
+    keys = None
+    if key:
+        keys = [k.strip().upper() for k in key.split(",") if k.strip()]
+    if compatible_with:
+        neighbours = camelot.compatible_keys(compatible_with)
+        keys = [k for k in keys if k in neighbours] if keys is not None else neighbours
+    return LibraryQuery(
+        status=status, bpm_min=bpm_min, bpm_max=bpm_max, keys=keys,
+        sort=sort, order=order, limit=limit, cursor=cursor,
+    )
+
+@app.get("/api/library/page", response_model=LibraryPage)
+def query_library(
+    request: Request,
+    response: Response,
+    status: Optional[str] = None,
+    bpm_min: Optional[float] = None,
+    bpm_max: Optional[float] = None,
+    key: Optional[str] = None,
+    compatible_with: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "asc",
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    """
+    Cursor-paginated library listing with server-side filters. `key` takes a
+    comma-separated list of Camelot keys; `compatible_with` matches the given
+    key plus its harmonic neighbours (±1 and relative major/minor). Pass the
+    returned next_cursor to fetch the following page.
+    """
+    try:
+        query = build_library_query(status, bpm_min, bpm_max, key, compatible_with, sort, order, limit, cursor)
+        etag = f'"{library.etag()}"'
+        if not_modified(request, response, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return library.query(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def locate_entry(entry: LibraryEntry) -> Optional[str]:
+    # The processed file when there is one, else the source
+    if entry.output_path:
+        return os.path.join(OUTPUT_DIR, entry.output_path)
+    if entry.input_path:
+        return os.path.join(INPUT_DIR, entry.input_path)
+    return None
+
+@app.get("/api/library/export")
+def export_library(
+    format: str = "csv",
+    status: Optional[str] = None,
+    bpm_min: Optional[float] = None,
+    bpm_max: Optional[float] = None,
+    key: Optional[str] = None,
+    compatible_with: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "asc",
+):
+    """
+    Streams the (filtered) library as CSV, Parquet or Rekordbox-style XML.
+    Takes the same filters as /api/library/page and is generated page by page,
+    so memory stays flat however large the library is.
+    """
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown export format: {format}")
+    try:
+        query = build_library_query(status, bpm_min, bpm_max, key, compatible_with, sort, order)
+        total = library.query(query.copy(update={"limit": 1})).total
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    pages = export.iter_pages(library, query)
+    if format == "csv":
+        chunks = export.csv_chunks(pages)
+    elif format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+        chunks = export.parquet_chunks(pages)
+    else:
+        chunks = export.rekordbox_xml_chunks(pages, total, locate_entry)
+
+    media_type, extension = export.FORMATS[format]
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="library.{extension}"'},
+    )
+
+@app.get("/api/compatible", response_model=List[CompatibleTrack])
+def find_compatible(key: str, bpm: float = Query(..., gt=0), tolerance: float = Query(6.0, ge=0, le=50),
+                    half_double: bool = True, limit: int = Query(50, ge=1, le=500)):
+    """
+    Tracks that mix into a `key`/`bpm`: same or adjacent Camelot key, or the
+    relative major/minor, within `tolerance` percent of the tempo (also at
+    half and double time unless half_double=false). Closest tempo first.
+    """
+    try:
+        return library.compatible(key.strip().upper(), bpm, tolerance, half_double, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/library/{id}/compatible", response_model=List[CompatibleTrack])
+def find_compatible_with_entry(id: str, tolerance: float = Query(6.0, ge=0, le=50),
+                               half_double: bool = True, limit: int = Query(50, ge=1, le=500)):
+    entry = library.get_entry(id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    if not entry.analysis or camelot.parse(entry.analysis.key_camelot) is None:
+        raise HTTPException(status_code=409, detail="Entry has no analysed key yet")
+    return library.compatible(
+        entry.analysis.key_camelot, entry.analysis.bpm, tolerance, half_double, limit, exclude=id
+    )
+
+def clear_input_dir(keep: Optional[str] = None):
+    """
+    Enforces the single-file workflow: wipes the input directory and its library
+    entries. The file named `keep` (a just-saved upload) stays on disk.
+    """
     if os.path.exists(INPUT_DIR):
         for filename in os.listdir(INPUT_DIR):
+            if filename == keep:
+                continue
             file_path = os.path.join(INPUT_DIR, filename)
             try:
                 if os.path.isfile(file_path) or os.path.islink(file_path):
@@ -56,38 +363,156 @@ async def upload_file(file: UploadFile = File(...)):
                     shutil.rmtree(file_path)
             except Exception as e:
                 print(f"Failed to delete {file_path}. Reason: {e}")
-    
+
     # Clear library metadata for inputs
     library.clear_inputs()
 
-    file_path = os.path.join(INPUT_DIR, file.filename)
-    print(f"DEBUG: Saving uploaded file to {file_path}")
+def upload_name(filename: Optional[str]) -> str:
+    # Never trust a client path: keep only the final component
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    if name in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    return name
+
+def client_id(request: Request) -> Optional[str]:
+    """Identifies who queued work, for per-client job limits: X-Client-Id, else the peer address."""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else None)
+
+async def store_upload(chunks: AsyncIterator[bytes], filename: str, analyze: bool, preview: bool,
+                       client: Optional[str] = None, replace: bool = False) -> LibraryEntry:
+    """
+    Streams an upload into INPUT_DIR, registers it and optionally queues it for
+    analysis. With `replace` the other inputs are cleared, but only once the
+    upload was saved, so a rejected file leaves the input directory alone.
+    """
+    file_path = os.path.join(INPUT_DIR, filename)
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        file_size = os.path.getsize(file_path)
-        print(f"DEBUG: Saved file size: {file_size} bytes")
-
-        # Create library entry
-        entry = library.add_entry(file.filename)
-        return entry
+        writer = await save_upload(chunks, file_path, io_executor)
+    except InvalidAudioError as e:
+        raise HTTPException(status_code=415, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    def register() -> LibraryEntry:
+        if replace:
+            clear_input_dir(keep=filename)
+        stat = os.stat(file_path)
+        entry = library.add_entry(
+            filename, file_size=stat.st_size, file_mtime=stat.st_mtime, content_hash=writer.content_hash
+        )
+        # Analysis can reuse the hash computed while the upload streamed in
+        processor.register_hash(file_path, writer.content_hash)
+        return entry
+
+    entry = await run_io(register)
+    if analyze:
+        await processor.add_to_queue([filename], preview=preview, client=client)
+    return entry
+
+async def read_upload_file(file: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+@app.post("/api/upload", response_model=LibraryEntry)
+async def upload_file(request: Request, file: UploadFile = File(...), analyze: bool = False, preview: bool = False):
+    filename = upload_name(file.filename)
+    return await store_upload(read_upload_file(file), filename, analyze, preview, client_id(request), replace=True)
+
+@app.put("/api/upload/{filename}", response_model=LibraryEntry)
+async def stream_upload(filename: str, request: Request, analyze: bool = False, preview: bool = False):
+    """
+    Raw-body upload: the file is streamed straight from the request into the
+    input directory (no multipart spooling), hashed on the way, and rejected
+    with 415 as soon as its header shows it isn't audio.
+    """
+    filename = upload_name(filename)
+    return await store_upload(request.stream(), filename, analyze, preview, client_id(request), replace=True)
+
+@app.post("/api/upload/batch", response_model=BatchUploadResult)
+async def upload_batch(request: Request, files: List[UploadFile] = File(...), analyze: bool = True,
+                       preview: bool = False, replace: bool = False):
+    """
+    Stores many files, or zip/tar archives of them, from one multipart request.
+    Files are written concurrently, registered with one batched library write
+    and (by default) queued for analysis. Unlike /api/upload the input directory
+    is kept; `replace=true` restores the single-file behaviour of wiping it first.
+    Files that aren't audio are reported in `rejected` instead of failing the batch.
+    """
+    if replace:
+        await run_io(clear_input_dir)
+
+    result = BatchUploadResult()
+    claimed = set()
+    claim_lock = threading.Lock()
+
+    def claim(name: str) -> bool:
+        # Archives are extracted on executor threads, so names are claimed under a lock
+        with claim_lock:
+            if name in claimed:
+                return False
+            claimed.add(name)
+            return True
+
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+    async def save(file: UploadFile):
+        try:
+            name = upload_name(file.filename)
+        except HTTPException as e:
+            return [], [(file.filename or "", e.detail)]
+        async with semaphore:
+            if is_archive(name):
+                return await run_io(extract_archive, file.file, name, INPUT_DIR, AUDIO_EXTENSIONS, claim)
+            if not claim(name):
+                return [], [(name, "Duplicate filename in upload")]
+            try:
+                writer = await save_upload(read_upload_file(file), os.path.join(INPUT_DIR, name), io_executor)
+            except InvalidAudioError as e:
+                return [], [(name, str(e))]
+            return [(name, writer)], []
+
+    saved = []
+    for file_saved, file_rejected in await asyncio.gather(*(save(file) for file in files)):
+        saved.extend(file_saved)
+        result.rejected.extend(UploadRejection(filename=name, reason=reason) for name, reason in file_rejected)
+
+    def register():
+        status = "pending" if analyze else "uploaded"
+        with library.lock:
+            for name, writer in saved:
+                file_path = os.path.join(INPUT_DIR, name)
+                stat = os.stat(file_path)
+                entry = library.get_entry_by_filename(name)
+                if entry is None:
+                    entry = library.new_entry(name)
+                else:
+                    # Same name uploaded again: the file on disk changed, so drop the old result
+                    entry.input_path, entry.analysis = name, None
+                entry.status = status
+                entry.file_size, entry.file_mtime, entry.content_hash = stat.st_size, stat.st_mtime, writer.content_hash
+                processor.register_hash(file_path, writer.content_hash)
+                result.entries.append(entry)
+            library.save_entries(result.entries)
+
+    await run_io(register)
+
+    if analyze and saved:
+        added = await processor.add_to_queue([name for name, _ in saved], preview=preview, client=client_id(request))
+        result.queued = len(added)
+    return result
+
 @app.post("/api/analyze", response_model=AnalysisResult)
 async def analyze_audio(request: AnalyzeRequest):
     # request.filename is the filename in INPUT_DIR
     try:
-        # Find entry to update
-        entry = library.get_entry_by_filename(request.filename)
-        
-        result = await processor.process_file(request.filename)
-        
-        # Update library if entry exists
-        if entry:
-            library.update_analysis(entry.id, AnalysisResult(**result))
-            
+        # The library entry is updated by sync_library when the completed event fires
+        result = await processor.process_file(request.filename, preview=request.preview)
+        if request.filename in library_syncs:
+            # Answer once the entry holds the result, so a follow-up /api/process sees it
+            await library_syncs[request.filename]
         return result
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
@@ -95,65 +520,288 @@ async def analyze_audio(request: AnalyzeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/queue")
-async def add_to_queue(request: QueueRequest):
+async def add_to_queue(request: QueueRequest, http_request: Request):
     # We assume filenames are already in the library from upload
-    await processor.add_to_queue(request.filenames)
-    return {"message": f"Added {len(request.filenames)} files to queue"}
+    try:
+        added = await processor.add_to_queue(
+            request.filenames, preview=request.preview, priority=request.priority, client=client_id(http_request)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"Added {len(added)} files to queue"}
+
+@app.post("/api/ingest", response_model=IngestResult)
+async def ingest(request: IngestRequest, http_request: Request):
+    """
+    Bulk-registers a server-side directory (anywhere under the data dir) and
+    optionally queues everything new or changed for analysis. Unlike /api/upload
+    this never clears the input directory.
+    """
+    try:
+        directory = resolve_directory(request.directory, DATA_DIR)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        # Walking and stat-ing thousands of files is blocking work
+        result, to_analyze = await run_io(
+            ingest_directory, library, directory, INPUT_DIR,
+            request.recursive, request.extensions, request.detect_changes, request.enqueue,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if request.enqueue and to_analyze:
+        added = await processor.add_to_queue(to_analyze, preview=request.preview, client=client_id(http_request))
+        result.queued = len(added)
+    return result
+
+@app.get("/api/jobs", response_model=List[Job])
+def list_jobs(state: Optional[str] = None, limit: int = 100):
+    # state=pending lists the queue in the order it will run
+    return jobs.list(state=state, limit=limit)
+
+@app.get("/api/jobs/{job_id}", response_model=Job)
+def get_job(job_id: int):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.patch("/api/jobs/{job_id}", response_model=Job)
+def update_job(job_id: int, update: JobUpdate):
+    """Reorders a pending job or moves it to another priority class."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.state != "pending":
+        raise HTTPException(status_code=409, detail=f"Job is {job.state}, only pending jobs can be moved")
+    try:
+        return jobs.move(job_id, to=update.move, before=update.before, priority=update.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/api/jobs/{job_id}", response_model=Job)
+def cancel_job(job_id: int):
+    """Cancels a pending or running job; a running analysis finishes in the background and is discarded."""
+    job = processor.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.state != "cancelled":
+        raise HTTPException(status_code=409, detail=f"Job is already {job.state}")
+    return job
+
+@app.get("/api/reanalysis")
+def get_reanalysis():
+    return reanalyzer.status()
+
+@app.post("/api/reanalysis")
+async def start_reanalysis(restart: bool = False):
+    """Re-analyses library entries from an older analyzer version, resuming a paused run unless `restart`."""
+    try:
+        reanalyzer.start(restart)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return reanalyzer.status()
+
+@app.post("/api/reanalysis/pause")
+async def pause_reanalysis():
+    try:
+        await reanalyzer.pause()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return reanalyzer.status()
 
 @app.get("/api/status", response_model=QueueStatus)
 async def get_status():
-    status = processor.get_status()
-    
-    # Sync processor results to library
-    # This is a bit inefficient polling-based sync, but works for now
-    for filename, result in status.results.items():
-        entry = library.get_entry_by_filename(filename)
-        if entry and entry.status != "completed":
-             library.update_analysis(entry.id, result)
-             
-    return status
+    # Cheap summary only; per-file results are pushed over /api/events
+    return processor.get_status()
+
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """
+    Server-Sent Events stream of job progress. Emits a `status` snapshot on
+    connect, then `queued`, `started`, `completed` (with the result), `retrying`,
+    `failed`, `cancelled` and `idle` events as they happen.
+    """
+    queue = processor.subscribe()
+
+    async def event_stream():
+        try:
+            yield f"event: status\ndata: {json.dumps(processor.get_status())}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            processor.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/peaks/{peaks_id}")
+def get_peaks(peaks_id: str, request: Request):
+    """
+    Waveform peaks for an analysed track (binary, see waveform.py); the id is the
+    `waveform` field of its analysis. Peaks are content-addressed, so responses
+    never change and may be cached indefinitely.
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", peaks_id):
+        raise HTTPException(status_code=404, detail="Peaks not found")
+    path = waveform.peaks_path(PEAKS_DIR, peaks_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Peaks not found")
+
+    headers = {"ETag": f'"{peaks_id}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+@app.get("/api/timeline/{timeline_id}")
+def get_timeline(timeline_id: str, request: Request, format: str = "binary"):
+    """
+    Beat grid, tempo curve and key segments of an analysed track; the id is the
+    `timeline` field of its analysis. Served as the compact binary file (see
+    timeline.py) or, with format=json, decoded. Content-addressed like peaks.
+    """
+    if format not in ("binary", "json"):
+        raise HTTPException(status_code=400, detail="format must be binary or json")
+    if not re.fullmatch(r"[0-9a-f]{64}", timeline_id):
+        raise HTTPException(status_code=404, detail="Timeline not found")
+    path = timeline.timeline_path(TIMELINE_DIR, timeline_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Timeline not found")
+
+    etag = f'"{timeline_id}"' if format == "binary" else f'"{timeline_id}-json"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if format == "binary":
+        return FileResponse(path, media_type="application/octet-stream", headers=headers)
+    with open(path, "rb") as f:
+        data = timeline.decode(f.read())
+    data["beats"] = [round(float(t), 4) for t in data["beats"]]
+    data["tempo"] = [float(bpm) for bpm in data["tempo"]]
+    return JSONResponse(data, headers=headers)
+
+@app.get("/api/cache")
+def get_cache_stats():
+    pcm = analyzer.pcm_cache.stats() if analyzer.pcm_cache is not None else None
+    if analysis_cache is None:
+        return {"enabled": False, "pcm": pcm}
+    return {"enabled": True, **analysis_cache.stats(), "pcm": pcm}
+
+@app.get("/api/storage")
+def get_storage_stats():
+    return library.storage_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of analysis, job, storage and request metrics."""
+    for state, count in jobs.counts().items():
+        JOBS_STATE.set(count, state=state)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/profiling")
+def get_profiling():
+    return {"enabled": profiler.enabled, "reports": profiler.recent()}
+
+@app.post("/api/profiling")
+def set_profiling(settings: ProfilingSettings):
+    profiler.enabled = settings.enabled
+    return {"enabled": profiler.enabled}
+
+def produce_output(source_path: str, filename: str, pattern: str, bpm: float, key: str, camelot_key: str,
+                   tags: bool) -> dict:
+    new_filename = outputs.output_name(filename, pattern, bpm, key, camelot_key)
+    return outputs.produce(source_path, OUTPUT_DIR, new_filename, (bpm, key, camelot_key) if tags else None)
 
 @app.post("/api/process")
 async def process_output(request: RenameRequest):
-    # This replaces the old rename endpoint.
-    # It copies input -> output with new name.
-    
-    entry = library.get_entry_by_filename(request.filename)
-    if not entry or not entry.input_path:
-        raise HTTPException(status_code=404, detail="Input file not found in library")
-
-    source_path = os.path.join(INPUT_DIR, entry.input_path)
-    if not os.path.exists(source_path):
-        raise HTTPException(status_code=404, detail="Source file missing on disk")
-
-    # Generate new filename
-    name, ext = os.path.splitext(request.filename)
-    new_name = request.pattern.format(
-        OriginalName=name,
-        Key=request.key,
-        BPM=request.bpm,
-        Camelot=request.camelot
-    )
-    # Sanitize
-    new_name = "".join(c for c in new_name if c.isalnum() or c in (' ', '-', '_', '.'))
-    new_filename = f"{new_name}{ext}"
-    dest_path = os.path.join(OUTPUT_DIR, new_filename)
-
-    # Handle duplicates
-    counter = 1
-    base_new_filename = new_filename
-    while os.path.exists(dest_path):
-        name_part, ext_part = os.path.splitext(base_new_filename)
-        new_filename = f"{name_part}_{counter}{ext_part}"
-        dest_path = os.path.join(OUTPUT_DIR, new_filename)
-        counter += 1
+    """
+    Puts the input in the output directory under the rename pattern, hardlinked
+    (or reflinked/copied when `tags` also writes the analysis into the file).
+    """
+    def run() -> dict:
+        entry = library.get_entry_by_filename(request.filename)
+        if not entry or not entry.input_path:
+            raise HTTPException(status_code=404, detail="Input file not found in library")
 
-    try:
-        shutil.copy2(source_path, dest_path)
-        library.set_output(entry.id, new_filename)
-        return {"id": entry.id, "output_filename": new_filename}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        source_path = os.path.join(INPUT_DIR, entry.input_path)
+        if not os.path.exists(source_path):
+            raise HTTPException(status_code=404, detail="Source file missing on disk")
+
+        try:
+            result = produce_output(
+                source_path, request.filename, request.pattern, request.bpm, request.key, request.camelot,
+                request.tags,
+            )
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Tagging requires mutagen")
+        except ValueError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        library.set_output(entry.id, result["output_filename"])
+        return {"id": entry.id, **result}
+
+    return await run_io(run)
+
+@app.post("/api/process/batch")
+async def process_batch(request: ProcessBatchRequest):
+    """
+    Applies the rename pattern (and tags, with `tags`) to many library entries
+    using each one's stored analysis. Entries that can't be processed are
+    listed in `skipped` with the reason; outputs are saved in one library write.
+    """
+    if request.tags:
+        try:
+            import mutagen  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Tagging requires mutagen")
+
+    def run():
+        processed, skipped, outputs = [], [], {}
+        for id in request.ids:
+            entry = library.get_entry(id)
+            if entry is None:
+                skipped.append({"id": id, "reason": "Not in library"})
+                continue
+            if not entry.analysis or not entry.input_path:
+                skipped.append({"id": id, "reason": "No analysis" if entry.input_path else "Input file removed"})
+                continue
+            source_path = os.path.join(INPUT_DIR, entry.input_path)
+            if not os.path.exists(source_path):
+                skipped.append({"id": id, "reason": "Source file missing on disk"})
+                continue
+            analysis = entry.analysis
+            try:
+                result = produce_output(
+                    source_path, os.path.basename(entry.filename), request.pattern, analysis.bpm,
+                    analysis.key_standard, analysis.key_camelot, request.tags,
+                )
+            except Exception as e:
+                skipped.append({"id": id, "reason": str(e)})
+                continue
+            # Applied to fresh copies: other writes may have changed the entries meanwhile
+            outputs[id] = result["output_filename"]
+            processed.append({"id": id, **result})
+        library.set_outputs(outputs)
+        return {"processed": processed, "skipped": skipped}
+
+    return await run_io(run)
+
+def inside_input_dir(path: str) -> bool:
+    input_dir = os.path.realpath(INPUT_DIR)
+    return os.path.commonpath([input_dir, os.path.realpath(path)]) == input_dir
 
 @app.delete("/api/library/{id}/input")
 def delete_input(id: str):
@@ -163,7 +811,9 @@ def delete_input(id: str):
     
     if entry.input_path:
         path = os.path.join(INPUT_DIR, entry.input_path)
-        if os.path.exists(path):
+        # Ingested entries point at the user's own files elsewhere in the data dir
+        # (e.g. "../crates/x.mp3"); those are only dropped from the library, never deleted
+        if inside_input_dir(path) and os.path.exists(path):
             os.remove(path)
         library.delete_input(id)
     return {"status": "deleted"}
@@ -208,9 +858,24 @@ def clear_library():
             except Exception as e:
                 print(f"Failed to delete {file_path}. Reason: {e}")
 
-    # 3. Clear library metadata
-    library.entries = []
-    library.save()
+    # 3. Drop waveform peaks and timelines; they are regenerated when a file is analysed again
+    for filename in os.listdir(PEAKS_DIR):
+        try:
+            os.unlink(os.path.join(PEAKS_DIR, filename))
+        except Exception as e:
+            print(f"Failed to delete peaks {filename}. Reason: {e}")
+    for filename in os.listdir(TIMELINE_DIR):
+        try:
+            os.unlink(os.path.join(TIMELINE_DIR, filename))
+        except Exception as e:
+            print(f"Failed to delete timeline {filename}. Reason: {e}")
+
+    # 4. Drop decoded audio of the removed inputs
+    if analyzer.pcm_cache is not None:
+        analyzer.pcm_cache.clear()
+
+    # 5. Clear library metadata
+    library.clear()
     
     return {"status": "cleared"}
 
@@ -0,0 +1,243 @@
+import bisect
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; spans fast library writes up to full-length analyses
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [non-cumulative bucket counts..., +Inf count], sum
+        self.counts: Dict[Tuple[str, ...], List[int]] = {}
+        self.sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self.sums[key] = self.sums.get(key, 0.0) + value
+
+    def count(self, **labels) -> int:
+        with self.lock:
+            return sum(self.counts.get(self._key(labels), ()))
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            items = sorted((key, list(counts), self.sums[key]) for key, counts in self.counts.items())
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+registry = MetricsRegistry()
+
+ANALYSIS_STAGE_SECONDS = registry.histogram(
+    "analysis_stage_seconds", "Time spent in each analysis stage (decode, silence, rhythm, key)", ["stage"]
+)
+ANALYSIS_TOTAL = registry.counter("analysis_total", "Analyses run, by outcome", ["outcome"])
+JOB_QUEUE_WAIT_SECONDS = registry.histogram(
+    "job_queue_wait_seconds", "Time a batch job waited between becoming due and being claimed"
+)
+JOB_RUN_SECONDS = registry.histogram("job_run_seconds", "Wall time of a batch job attempt, cache lookups included")
+JOBS_TOTAL = registry.counter("jobs_total", "Finished batch job attempts, by outcome", ["outcome"])
+JOBS_STATE = registry.gauge("jobs", "Batch jobs currently in each state", ["state"])
+LIBRARY_SAVE_SECONDS = registry.histogram(
+    "library_save_seconds", "Latency of library writes reaching storage", ["backend"]
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_seconds", "API request latency", ["method", "route", "status"]
+)
+
+def observe_stages(timings: Dict[str, float]):
+    for stage, seconds in timings.items():
+        ANALYSIS_STAGE_SECONDS.observe(seconds, stage=stage)
+
+class _RequestProfile(cProfile.Profile):
+    # Event-loop profile of one request, plus the profiles of the worker threads it ran on
+    def __init__(self):
+        super().__init__()
+        self.workers: List[cProfile.Profile] = []
+
+# The profile of the request being handled; context variables follow it into threadpool workers
+_current_profile: ContextVar[Optional[_RequestProfile]] = ContextVar("current_profile", default=None)
+
+class RequestProfiler:
+    """
+    Optional per-request cProfile hook, switched on at runtime.
+
+    While enabled, requests that ask for it (see main.py) run under cProfile and
+    the top of the report is kept in a small ring buffer. Async endpoints are
+    profiled on the event loop thread, so work from concurrent requests can show
+    up in a report. Sync endpoints run on FastAPI's threadpool; wrapping them
+    with wrap_sync() profiles them in that worker thread and merges the result
+    into the request's report. Work handed to other executors or worker
+    processes never shows up.
+    """
+
+    def __init__(self, keep: int = 20, top: int = 30):
+        self.enabled = False
+        self.top = top
+        self.reports: deque = deque(maxlen=keep)
+        self.lock = threading.Lock()
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if not self.enabled:
+            return None
+        profile = _RequestProfile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            return None
+        _current_profile.set(profile)
+        return profile
+
+    def wrap_sync(self, func: Callable) -> Callable:
+        """Wraps a sync endpoint so a profiled request also profiles the thread running it."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            worker = cProfile.Profile()
+            try:
+                worker.enable()
+            except ValueError:
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                worker.disable()
+                profile.workers.append(worker)
+        return wrapper
+
+    def stop(self, profile: cProfile.Profile, method: str, path: str, elapsed: float):
+        profile.disable()
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        for worker in getattr(profile, "workers", []):
+            stats.add(worker)
+        stats.sort_stats("cumulative").print_stats(self.top)
+        with self.lock:
+            self.reports.append({
+                "timestamp": time.time(),
+                "method": method,
+                "path": path,
+                "seconds": elapsed,
+                "report": out.getvalue(),
+            })
+
+    def recent(self) -> List[dict]:
+        with self.lock:
+            return list(self.reports)
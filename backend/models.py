@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Optional, List
 
 class AnalysisResult(BaseModel):
     bpm: float
@@ -8,20 +8,46 @@ class AnalysisResult(BaseModel):
     key_camelot: str
     key_confidence: float
     duration: float
+    preview: bool = False # True for fast excerpt-based results awaiting a full pass
+    waveform: Optional[str] = None # Content hash naming the peaks file served at /api/peaks/{waveform}
+    timeline: Optional[str] = None # Content hash naming the beat grid / tempo / key timeline at /api/timeline/{timeline}
+    analyzer_version: Optional[str] = None # AudioAnalyzer.version() that produced it; None predates versioning
 
 class AnalyzeRequest(BaseModel):
     filename: str
+    preview: bool = False
 
 class QueueRequest(BaseModel):
     filenames: List[str]
+    preview: bool = False
+    priority: str = "batch" # "batch" or "interactive" (claimed first)
 
 class QueueStatus(BaseModel):
     queue_length: int
     is_processing: bool
     current_file: Optional[str] = None
+    in_flight: List[str] = []
     processed_count: int
+    failed_count: int = 0
     total_count: int
-    results: Dict[str, AnalysisResult] = {}
+
+class Job(BaseModel):
+    id: int
+    filename: str
+    preview: bool = False
+    state: str  # pending, running, done, failed, cancelled
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+    priority: str = "batch"
+    client: Optional[str] = None # Who queued it, for per-client running limits
+
+class JobUpdate(BaseModel):
+    priority: Optional[str] = None # Move to another priority class
+    move: Optional[str] = None # "front" or "back" of its priority class
+    before: Optional[int] = None # Or directly ahead of this pending job
 
 class RenameRequest(BaseModel):
     filename: str
@@ -29,6 +55,12 @@ class RenameRequest(BaseModel):
     bpm: float
     key: str
     camelot: str
+    tags: bool = False # Also write BPM/key/Camelot into the output file's tags
+
+class ProcessBatchRequest(BaseModel):
+    ids: List[str]
+    pattern: str
+    tags: bool = False
 
 class LibraryEntry(BaseModel):
     id: str
@@ -38,5 +70,55 @@ class LibraryEntry(BaseModel):
     analysis: Optional[AnalysisResult] = None
     created_at: float
     status: str  # uploaded, pending, processing, completed, error
+    # Source file fingerprint, used to skip unchanged files on re-ingest
+    file_size: Optional[int] = None
+    file_mtime: Optional[float] = None
+    content_hash: Optional[str] = None
+
+class IngestRequest(BaseModel):
+    directory: str  # Absolute, or relative to the data dir; must live under it
+    recursive: bool = True
+    extensions: Optional[List[str]] = None  # Defaults to common audio extensions
+    detect_changes: str = "stat"  # "stat" (size + mtime) or "hash" (content hash when stat differs)
+    enqueue: bool = True
+    preview: bool = False
+
+class IngestResult(BaseModel):
+    scanned: int
+    registered: int
+    updated: int
+    skipped: int
+    queued: int = 0
+
+class UploadRejection(BaseModel):
+    filename: str
+    reason: str
+
+class BatchUploadResult(BaseModel):
+    entries: List[LibraryEntry] = []
+    rejected: List[UploadRejection] = []
+    queued: int = 0
+
+class ProfilingSettings(BaseModel):
+    enabled: bool
+
+class LibraryQuery(BaseModel):
+    status: Optional[str] = None
+    bpm_min: Optional[float] = None
+    bpm_max: Optional[float] = None
+    keys: Optional[List[str]] = None  # Camelot codes, any of which matches
+    sort: str = "created_at"  # "created_at", "filename" or "bpm" (bpm only returns analysed entries)
+    order: str = "asc"  # "asc" or "desc"
+    limit: int = 100
+    cursor: Optional[str] = None  # next_cursor of the previous page
 
+class LibraryPage(BaseModel):
+    entries: List[LibraryEntry]
+    next_cursor: Optional[str] = None  # None on the last page
+    total: int  # Entries matching the filters, across all pages
 
+class CompatibleTrack(BaseModel):
+    entry: LibraryEntry
+    relation: str  # "same", "adjacent" (±1 on the wheel) or "relative" (major/minor swap)
+    tempo: str  # "same", "half" or "double" time relative to the requested BPM
+    bpm_delta_percent: float
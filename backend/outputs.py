@@ -0,0 +1,145 @@
+"""
+Producing processed outputs: the input file under a new name in the output
+directory, optionally with the analysis written into its tags.
+
+Outputs are placed without copying data where the filesystem allows it. A
+hardlink is used when the file won't be modified. When tags will be written,
+a reflink (copy-on-write clone) is used, so the input is never touched. A
+plain copy is the fallback for both.
+"""
+import os
+import shutil
+from typing import Optional, Tuple
+import camelot
+
+# Linux FICLONE ioctl (btrfs, XFS, overlayfs on either, ...)
+FICLONE = 0x40049409
+
+def output_name(filename: str, pattern: str, bpm: float, key: str, camelot_key: str) -> str:
+    """Applies a rename pattern such as "{Camelot} - {BPM} - {OriginalName}", keeping the extension."""
+    name, ext = os.path.splitext(filename)
+    new_name = pattern.format(OriginalName=name, Key=key, BPM=bpm, Camelot=camelot_key)
+    # Sanitize
+    new_name = "".join(c for c in new_name if c.isalnum() or c in (' ', '-', '_', '.'))
+    return f"{new_name}{ext}"
+
+def unique_path(directory: str, filename: str) -> Tuple[str, str]:
+    """(filename, path) in `directory`, suffixed _1, _2, ... if the name is taken."""
+    base, ext = os.path.splitext(filename)
+    path = os.path.join(directory, filename)
+    counter = 1
+    while os.path.exists(path):
+        filename = f"{base}_{counter}{ext}"
+        path = os.path.join(directory, filename)
+        counter += 1
+    return filename, path
+
+def reflink(source: str, dest: str) -> bool:
+    """Clones `source` to a new file `dest` sharing its data blocks; False if unsupported here."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(source, "rb") as src, open(dest, "xb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            cloned = False
+        else:
+            cloned = True
+    if not cloned:
+        os.unlink(dest)
+        return False
+    shutil.copystat(source, dest)
+    return True
+
+def place(source: str, dest: str, modify: bool = False) -> str:
+    """
+    Creates `dest` with the contents of `source` as cheaply as possible and
+    returns how: "hardlink", "reflink" or "copy". With `modify`, dest is about
+    to be changed, so it must not share an inode with the source. Never
+    replaces an existing file: raises FileExistsError instead.
+    """
+    if not modify:
+        try:
+            os.link(source, dest)
+            return "hardlink"
+        except FileExistsError:
+            raise
+        except OSError:
+            pass
+    if reflink(source, dest):
+        return "reflink"
+    # Claim the name first, since copy2 would silently overwrite a file created meanwhile
+    open(dest, "xb").close()
+    try:
+        shutil.copy2(source, dest)
+    except BaseException:
+        os.unlink(dest)
+        raise
+    return "copy"
+
+def write_tags(path: str, bpm: float, key: str, camelot_key: str):
+    """
+    Writes BPM, musical key and Camelot key into the file's own tags: ID3
+    TBPM/TKEY/TXXX:CAMELOT (MP3, WAV, AIFF), Vorbis comments BPM/INITIALKEY/
+    CAMELOT (FLAC, Ogg) or MP4 tmpo plus iTunes freeform atoms. Saves in
+    place. Raises ImportError without mutagen and ValueError for formats it
+    can't tag.
+    """
+    import mutagen
+    from mutagen.flac import FLAC
+    from mutagen.id3 import ID3, TBPM, TKEY, TXXX
+    from mutagen.mp4 import MP4, MP4FreeForm
+    from mutagen.ogg import OggFileType
+
+    try:
+        audio = mutagen.File(path)
+    except mutagen.MutagenError as e:
+        raise ValueError(f"Can't read tags of {os.path.basename(path)}: {e}")
+    if audio is None:
+        raise ValueError(f"Can't read tags of {os.path.basename(path)}")
+    if audio.tags is None:
+        audio.add_tags()
+    bpm_text = str(int(round(bpm)))  # Integer BPM is what most players read
+    short_key = camelot.short_key(key) or key
+    tags = audio.tags
+
+    if isinstance(tags, ID3):
+        tags.setall("TBPM", [TBPM(encoding=3, text=[bpm_text])])
+        tags.setall("TKEY", [TKEY(encoding=3, text=[short_key])])
+        tags.setall("TXXX:CAMELOT", [TXXX(encoding=3, desc="CAMELOT", text=[camelot_key])])
+    elif isinstance(audio, MP4):
+        tags["tmpo"] = [int(round(bpm))]
+        tags["----:com.apple.iTunes:initialkey"] = [MP4FreeForm(short_key.encode("utf-8"))]
+        tags["----:com.apple.iTunes:CAMELOT"] = [MP4FreeForm(camelot_key.encode("utf-8"))]
+    elif isinstance(audio, (FLAC, OggFileType)):
+        tags["BPM"] = bpm_text
+        tags["INITIALKEY"] = short_key
+        tags["CAMELOT"] = camelot_key
+    else:
+        raise ValueError(f"Tagging isn't supported for {os.path.basename(path)}")
+    audio.save()
+
+def produce(source: str, output_dir: str, filename: str, tags: Optional[Tuple[float, str, str]] = None) -> dict:
+    """
+    Places `source` in `output_dir` as `filename` (made unique) and, when
+    `tags` (bpm, key, camelot) is given, tags the new file. A failed tag write
+    removes the output again. Returns {"output_filename", "method", "tagged"}.
+    """
+    requested = filename
+    while True:
+        filename, dest = unique_path(output_dir, requested)
+        try:
+            method = place(source, dest, modify=tags is not None)
+            break
+        except FileExistsError:
+            # A concurrent request took the name after unique_path checked it; try the next one
+            continue
+    if tags is not None:
+        try:
+            write_tags(dest, *tags)
+        except BaseException:
+            os.unlink(dest)
+            raise
+    return {"output_filename": filename, "method": method, "tagged": tags is not None}
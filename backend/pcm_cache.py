@@ -0,0 +1,112 @@
+import hashlib
+import os
+import tempfile
+from typing import List, Optional, Tuple
+import numpy as np
+
+class PCMCache:
+    """
+    On-disk cache of decoded mono PCM, stored as raw float32 files.
+
+    A hit is memory-mapped copy-on-write, so the analyzer gets a numpy view
+    backed by the page cache instead of decoding the file again; pages are only
+    copied if something writes to the array. Entries are named after the
+    source path, its size and mtime, and the sample rate. A changed source
+    therefore never matches an old entry, and storing the new decode removes
+    entries for older versions of the same file. The directory is kept under
+    `max_bytes` by evicting the least recently used files (hits refresh mtime).
+    Safe to share between processes: files are written to a temp name and
+    renamed into place.
+    """
+
+    SUFFIX = ".f32"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _source_id(source: str) -> str:
+        return hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:16]
+
+    def path_for(self, source: str, sample_rate: int) -> str:
+        stat = os.stat(source)
+        name = f"{self._source_id(source)}-{stat.st_size}-{stat.st_mtime_ns}-{sample_rate}{self.SUFFIX}"
+        return os.path.join(self.directory, name)
+
+    def get(self, source: str, sample_rate: int) -> Optional[np.ndarray]:
+        """The cached signal of `source` as a memory-mapped float32 array, or None."""
+        path = self.path_for(source, sample_rate)
+        try:
+            if os.path.getsize(path) == 0:
+                return np.zeros(0, dtype=np.float32)
+            audio = np.memmap(path, dtype=np.float32, mode="c")
+            os.utime(path)  # LRU
+        except (FileNotFoundError, ValueError):
+            return None
+        # Plain ndarray view over the mapping, for libraries that want exactly ndarray
+        return np.asarray(audio)
+
+    def put(self, source: str, sample_rate: int, audio: np.ndarray):
+        path = self.path_for(source, sample_rate)
+        data = np.ascontiguousarray(audio, dtype=np.float32)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                data.tofile(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._drop_stale(source, path)
+        self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if item.name.endswith(self.SUFFIX):
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:
+                        continue  # Evicted by another process meanwhile
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+        return entries
+
+    def _drop_stale(self, source: str, current: str):
+        # Older decodes of the same source (it has since changed)
+        prefix = self._source_id(source) + "-"
+        sample_rate = current.rsplit("-", 1)[1]
+        for _, _, path in self._entries():
+            name = os.path.basename(path)
+            if name.startswith(prefix) and name.endswith("-" + sample_rate) and path != current:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.unlink(path)  # Mappings already open stay valid
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
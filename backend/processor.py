@@ -1,75 +1,372 @@
 import asyncio
-from typing import List, Optional
-from analyzer import AudioAnalyzer
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from analyzer import ANALYZER_VERSION, AudioAnalyzer
+from cache import AnalysisCache
+from jobs import JobQueue
+from metrics import ANALYSIS_TOTAL, JOB_QUEUE_WAIT_SECONDS, JOB_RUN_SECONDS, JOBS_TOTAL, observe_stages
+from models import Job
 import os
+import time
+import timeline
+import waveform
+
+# Analyzer owned by a pool worker process. Built once by the pool initializer so
+# each worker constructs its Essentia algorithms a single time and reuses them.
+_worker_analyzer: Optional[AudioAnalyzer] = None
+
+def _init_worker(config: Optional[dict] = None):
+    global _worker_analyzer
+    _worker_analyzer = AudioAnalyzer(reuse_algorithms=True, **(config or {}))
+
+def _analyze_with_timings(analyzer: AudioAnalyzer, file_path: str, preview: bool = False,
+                          peaks_path: Optional[str] = None, timeline_path: Optional[str] = None) -> Tuple[dict, dict]:
+    # Timings travel back with the result so the parent process can record them
+    result = analyzer.analyze_file(file_path, preview, peaks_path, timeline_path)
+    return result, dict(analyzer.last_timings)
+
+def _analyze_in_worker(file_path: str, preview: bool = False, peaks_path: Optional[str] = None,
+                       timeline_path: Optional[str] = None) -> Tuple[dict, dict]:
+    if _worker_analyzer is None:
+        _init_worker()
+    return _analyze_with_timings(_worker_analyzer, file_path, preview, peaks_path, timeline_path)
 
 class BatchProcessor:
-    def __init__(self, upload_dir: str):
+    MODES = ("process", "serial")
+
+    def __init__(self, upload_dir: str, mode: str = "process", workers: Optional[int] = None,
+                 cache: Optional[AnalysisCache] = None, analyzer: Optional[AudioAnalyzer] = None,
+                 jobs: Optional[JobQueue] = None, peaks_dir: Optional[str] = None,
+                 timeline_dir: Optional[str] = None):
+        """
+        mode="process" runs analyses on a process pool (sized to the CPU count by
+        default) and keeps up to `workers` batch files in flight.
+        mode="serial" keeps the original behaviour: one file at a time on the
+        default thread executor, serialised by `self.lock`.
+        When a `cache` is given, files whose content was already analysed with the
+        same analyzer parameters are answered from it without touching Essentia.
+        Pool workers build their own analyzer from `analyzer.config()`.
+        Batch work is tracked in `jobs`; pass a file-backed JobQueue to survive restarts.
+        With a `peaks_dir`, waveform peaks are written there during analysis, named
+        by content hash, and the hash is returned as the result's "waveform".
+        A `timeline_dir` does the same for full analyses' beat grid, tempo curve and
+        key segments (see timeline.py), returned as the result's "timeline".
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown processing mode: {mode}")
         self.upload_dir = upload_dir
-        self.analyzer = AudioAnalyzer()
+        self.mode = mode
+        self.workers = 1 if mode == "serial" else max(1, workers or os.cpu_count() or 1)
+        self.analyzer = analyzer or AudioAnalyzer()
+        self.cache = cache
+        self.peaks_dir = peaks_dir
+        self.timeline_dir = timeline_dir
+        # Content hashes already known (e.g. computed while uploading), keyed by
+        # path and only trusted while the file's size and mtime are unchanged
+        self._known_hashes: Dict[str, Tuple[int, int, str]] = {}
+        self.executor: Optional[Executor] = None
         self.lock = asyncio.Lock()
-        self.queue: List[str] = []
+        self.jobs = jobs or JobQueue()
+        self._wakeup: Optional[asyncio.Event] = None # Created by the running queue loop
+        self.in_flight: Set[str] = set()
+        # Batch tasks by job id, and the ones being cancelled through cancel()
+        self._running: Dict[int, asyncio.Task] = {}
+        self._cancelling: Set[int] = set()
+        # Interactive analyses in progress; each holds back one batch slot
+        self.interactive = 0
         self.current_file: Optional[str] = None
         self.is_processing = False
-        self.results: dict = {}
         self.processed_count = 0
+        self.failed_count = 0
         self.total_count = 0
+        # Push-based progress: SSE clients hold a subscriber queue, in-process
+        # consumers (e.g. library sync) register a listener callback.
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.listeners: List[Callable[[dict], None]] = []
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so importing the app never forks worker processes
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.analyzer.config(),),
+            )
+        return self.executor
+
+    def subscribe(self, max_events: int = 1000) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max_events)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        self.listeners.append(listener)
+
+    def _publish(self, event: str, filename: Optional[str] = None, **data):
+        """Fans a job event (queued, started, completed, failed, idle) out to all consumers."""
+        message = {
+            "event": event,
+            "filename": filename,
+            **data,
+            "processed_count": self.processed_count,
+            "total_count": self.total_count,
+            "queue_length": self.jobs.pending_count(),
+        }
+        for listener in self.listeners:
+            try:
+                listener(message)
+            except Exception as e:
+                print(f"Event listener failed for {event} {filename}: {e}")
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow client: drop the event rather than stall processing
+                pass
+
+    async def _analyze(self, file_path: str, preview: bool = False, peaks_path: Optional[str] = None,
+                       timeline_path: Optional[str] = None) -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            if self.mode == "serial":
+                async with self.lock:
+                    # Run the synchronous Essentia code in a thread pool to avoid blocking the event loop
+                    result, timings = await loop.run_in_executor(
+                        None, _analyze_with_timings, self.analyzer, file_path, preview, peaks_path, timeline_path
+                    )
+            else:
+                result, timings = await loop.run_in_executor(
+                    self._get_executor(), _analyze_in_worker, file_path, preview, peaks_path, timeline_path
+                )
+        except Exception:
+            ANALYSIS_TOTAL.inc(outcome="error")
+            raise
+        ANALYSIS_TOTAL.inc(outcome="ok")
+        observe_stages(timings)
+        return result
+
+    def register_hash(self, file_path: str, content_hash: str):
+        """Records a hash computed elsewhere so analysis doesn't read the file just to hash it."""
+        stat = os.stat(file_path)
+        self._known_hashes[file_path] = (stat.st_size, stat.st_mtime_ns, content_hash)
+
+    async def _content_hash(self, file_path: str) -> str:
+        known = self._known_hashes.get(file_path)
+        if known is not None:
+            stat = os.stat(file_path)
+            if known[:2] == (stat.st_size, stat.st_mtime_ns):
+                return known[2]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, AnalysisCache.hash_file, file_path)
+
+    async def _analyze_cached(self, file_path: str, preview: bool = False) -> dict:
+        if self.cache is None and self.peaks_dir is None and self.timeline_dir is None:
+            return await self._analyze(file_path, preview)
+
+        content_hash = await self._content_hash(file_path)
+        peaks_path = waveform.peaks_path(self.peaks_dir, content_hash) if self.peaks_dir else None
+        has_peaks = peaks_path is not None and os.path.exists(peaks_path)
+        # Timelines only come from full analyses
+        timeline_path = (
+            timeline.timeline_path(self.timeline_dir, content_hash) if self.timeline_dir and not preview else None
+        )
 
-    async def process_file(self, filename: str) -> dict:
+        key = None
+        if self.cache is not None:
+            key_params = {**self.analyzer.params(), "preview": preview, "version": ANALYZER_VERSION}
+            if timeline_path is not None:
+                key_params["timeline"] = True
+            key = AnalysisCache.make_key(content_hash, key_params)
+            cached = self.cache.get(key)
+            # A cached result is only reused while its waveform and timeline are still on disk
+            if (cached is not None and (peaks_path is None or has_peaks)
+                    and (cached.get("timeline") is None or os.path.exists(timeline_path))):
+                ANALYSIS_TOTAL.inc(outcome="cached")
+                return cached
+
+        # Never let a preview's lower-rate peaks replace existing ones
+        result = await self._analyze(
+            file_path, preview, None if preview and has_peaks else peaks_path, timeline_path
+        )
+        if peaks_path is not None:
+            result = {**result, "waveform": content_hash}
+        # Streaming analyses don't write one
+        if timeline_path is not None and os.path.exists(timeline_path):
+            result = {**result, "timeline": content_hash}
+        if key is not None:
+            self.cache.put(key, result)
+        return result
+
+    async def analyze_path(self, file_path: str) -> dict:
+        """Full analysis of any file, through the cache but outside the job queue (see reanalysis.py)."""
+        return await self._analyze_cached(file_path)
+
+    @property
+    def busy(self) -> bool:
+        """True while batch jobs or interactive analyses are running."""
+        return bool(self.in_flight) or self.interactive > 0
+
+    async def process_file(self, filename: str, preview: bool = False) -> dict:
         """
         Process a single file immediately (Individual Analysis).
-        Uses the lock to ensure it doesn't conflict with batch processing.
+        In process mode this is submitted straight to the pool, so it runs on the
+        next free worker ahead of any batch jobs still pending in `self.jobs`:
+        while it is in progress the batch loop leaves its slot unfilled, so it
+        waits for at most one running job to finish (analyses aren't preempted).
         """
-        async with self.lock:
-            file_path = os.path.join(self.upload_dir, filename)
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"File not found: {filename}")
-            
-            # Run the synchronous Essentia code in a thread pool to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, self.analyzer.analyze_file, file_path)
-            self.results[filename] = result
-            return result
-
-    async def add_to_queue(self, filenames: List[str]):
-        """Add files to the batch queue."""
-        self.queue.extend(filenames)
-        self.total_count += len(filenames)
+        file_path = os.path.join(self.upload_dir, filename)
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {filename}")
+
+        self._publish("started", filename)
+        self.interactive += 1
+        try:
+            result = await self._analyze_cached(file_path, preview)
+        except Exception as e:
+            self._publish("failed", filename, error=str(e))
+            raise
+        finally:
+            self.interactive -= 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+        self._publish("completed", filename, result=result)
+        return result
+
+    async def add_to_queue(self, filenames: List[str], preview: bool = False, priority: str = "batch",
+                           client: Optional[str] = None) -> List[Job]:
+        """Add files to the batch queue. Files already pending or running are skipped (see JobQueue.enqueue)."""
+        added = self.jobs.enqueue(filenames, preview, priority, client)
+        self.total_count += len(added)
+        for job in added:
+            self._publish("queued", job.filename)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        self._ensure_processing()
+        return added
+
+    def cancel(self, job_id: int) -> Optional[Job]:
+        """
+        Cancels a queued or running job (None if unknown). A running analysis
+        can't be interrupted mid-file; its result is discarded instead.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.state not in ("pending", "running"):
+            return job
+        job = self.jobs.cancel(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            # _process_one reports the cancellation once the task unwinds
+            if task.cancel():
+                self._cancelling.add(job_id)
+        else:
+            self.total_count = max(0, self.total_count - 1)
+            JOBS_TOTAL.inc(outcome="cancelled")
+            self._publish("cancelled", job.filename, job_id=job_id)
+        return job
+
+    async def resume(self):
+        """Restarts processing of jobs persisted by a previous run."""
+        pending = self.jobs.pending_count()
+        if pending:
+            print(f"Resuming {pending} queued analysis jobs")
+            self.total_count += pending
+            self._ensure_processing()
+
+    def _ensure_processing(self):
         if not self.is_processing:
+            self.is_processing = True
             asyncio.create_task(self._process_queue())
 
     def get_status(self) -> dict:
         return {
-            "queue_length": len(self.queue),
+            "queue_length": self.jobs.pending_count(),
             "is_processing": self.is_processing,
             "current_file": self.current_file,
+            "in_flight": sorted(self.in_flight),
             "processed_count": self.processed_count,
-            "total_count": self.total_count,
-            "results": self.results
+            "failed_count": self.failed_count,
+            "total_count": self.total_count
         }
 
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.jobs.close()
+
+    async def _process_one(self, job: Job):
+        filename = job.filename
+        self.in_flight.add(filename)
+        self._running[job.id] = asyncio.current_task()
+        self.current_file = filename
+        # job.updated_at is the claim time; retries count from when their backoff expired
+        JOB_QUEUE_WAIT_SECONDS.observe(max(0.0, job.updated_at - max(job.created_at, job.next_attempt_at)))
+        self._publish("started", filename, job_id=job.id, attempt=job.attempts)
+        start = time.perf_counter()
+        try:
+            file_path = os.path.join(self.upload_dir, filename)
+            result = await self._analyze_cached(file_path, job.preview)
+            JOB_RUN_SECONDS.observe(time.perf_counter() - start)
+            JOBS_TOTAL.inc(outcome="done")
+            self.jobs.complete(job.id)
+            self.processed_count += 1
+            self._publish("completed", filename, job_id=job.id, result=result)
+            print(f"Processed {filename}")
+        except asyncio.CancelledError:
+            if job.id not in self._cancelling:
+                raise  # Shutdown, not a cancelled job
+            self._cancelling.discard(job.id)
+            self.total_count = max(0, self.total_count - 1)
+            JOBS_TOTAL.inc(outcome="cancelled")
+            self._publish("cancelled", filename, job_id=job.id)
+        except Exception as e:
+            JOB_RUN_SECONDS.observe(time.perf_counter() - start)
+            job = self.jobs.fail(job.id, str(e))
+            JOBS_TOTAL.inc(outcome="failed" if job.state == "failed" else "retrying")
+            if job.state == "failed":
+                self.failed_count += 1
+                self._publish("failed", filename, job_id=job.id, error=str(e))
+                print(f"Error processing {filename}: {e}")
+            else:
+                self._publish("retrying", filename, job_id=job.id, error=str(e),
+                              attempt=job.attempts, next_attempt_at=job.next_attempt_at)
+                print(f"Error processing {filename} (attempt {job.attempts}), will retry: {e}")
+        finally:
+            self._running.pop(job.id, None)
+            self.in_flight.discard(filename)
+            if self.current_file == filename:
+                self.current_file = next(iter(self.in_flight), None)
+
     async def _process_queue(self):
-        """Internal loop to process the queue serially."""
+        """Internal loop that keeps up to `self.workers` claimed jobs in flight."""
         self.is_processing = True
-        
-        while self.queue:
-            async with self.lock:
-                if not self.queue:
+        self._wakeup = asyncio.Event()
+        running: Set[asyncio.Task] = set()
+
+        while True:
+            self._wakeup.clear()
+            # Slots taken by interactive analyses aren't refilled with batch work
+            while len(running) + self.interactive < self.workers:
+                job = self.jobs.claim()
+                if job is None:
                     break
-                
-                filename = self.queue.pop(0)
-                self.current_file = filename
-                
-                try:
-                    file_path = os.path.join(self.upload_dir, filename)
-                    loop = asyncio.get_event_loop()
-                    result = await loop.run_in_executor(None, self.analyzer.analyze_file, file_path)
-                    self.results[filename] = result
-                    self.processed_count += 1
-                    print(f"Processed {filename}")
-                except Exception as e:
-                    print(f"Error processing {filename}: {e}")
-                finally:
-                    self.current_file = None
-        
+                running.add(asyncio.create_task(self._process_one(job)))
+
+            retry_delay = self.jobs.next_retry_delay()
+            if not running and retry_delay is None:
+                break
+
+            # Wake up when a job finishes (completion events fire in finish order,
+            # not queue order), new work is queued, or a retry backoff expires
+            wake = asyncio.ensure_future(self._wakeup.wait())
+            timeout = retry_delay if len(running) + self.interactive < self.workers else None
+            done, _ = await asyncio.wait(running | {wake}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            wake.cancel()
+            running -= done
+
         self.is_processing = False
+        self.jobs.prune()
+        self._publish("idle")
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import math
+import os
+import time
+from concurrent.futures import Executor
+from typing import List, Optional
+from library import LibraryManager
+from models import AnalysisResult, LibraryEntry, LibraryQuery
+from processor import BatchProcessor
+
+class Reanalyzer:
+    """
+    Background job that brings the whole library up to the current analyzer
+    version. Entries are walked page by page in creation order; an entry is
+    re-analysed when its result was produced by another analyzer version
+    (AudioAnalyzer.version()), from its input file or, once that was cleared,
+    its processed output.
+
+    Progress is checkpointed to `state_path` after every page, so a paused
+    or interrupted run resumes where it stopped. Entries already brought up
+    to date are skipped again on the way, which makes resuming mid-page safe.
+
+    `cpu_budget` is the number of cores the job may use on average. It runs
+    ceil(cpu_budget) analyses at once and sleeps after each one so every slot
+    stays busy for at most cpu_budget / slots of the time. It also waits
+    while the processor is running user-submitted work.
+
+    Library reads and writes run on `executor` (the loop's default one if
+    None), which main sets to the I/O pool its handlers use.
+    """
+
+    IDLE_POLL_SECONDS = 1.0
+
+    def __init__(self, library: LibraryManager, processor: BatchProcessor, input_dir: str, output_dir: str,
+                 state_path: str, cpu_budget: float = 1.0, chunk_size: int = 100,
+                 executor: Optional[Executor] = None):
+        if cpu_budget <= 0:
+            raise ValueError("cpu_budget must be positive")
+        self.library = library
+        self.processor = processor
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.state_path = state_path
+        self.cpu_budget = cpu_budget
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.slots = max(1, math.ceil(cpu_budget))
+        self.task: Optional[asyncio.Task] = None
+        self._pause: Optional[asyncio.Event] = None # Created by start(), inside the event loop
+        self.state = self._new_state("idle")
+        self.load()
+
+    def _new_state(self, state: str) -> dict:
+        return {
+            "state": state,
+            "analyzer_version": self.processor.analyzer.version(),
+            "cursor": None,
+            "checked": 0,
+            "reanalysed": 0,
+            "skipped": 0,
+            "failed": 0,
+            "started_at": None,
+            "updated_at": None,
+        }
+
+    def load(self):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r") as f:
+                    self.state.update(json.load(f))
+            except Exception as e:
+                print(f"Error loading re-analysis checkpoint: {e}")
+
+    def save(self):
+        self.state["updated_at"] = time.time()
+        try:
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            print(f"Error saving re-analysis checkpoint: {e}")
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def status(self) -> dict:
+        status = {key: value for key, value in self.state.items() if key != "cursor"}
+        status["cpu_budget"] = self.cpu_budget
+        return status
+
+    def start(self, restart: bool = False):
+        """
+        Starts a run, or resumes a paused or interrupted one. A finished run, a
+        run for an older analyzer version and `restart` begin from the first entry.
+        """
+        if self.running:
+            raise RuntimeError("Re-analysis is already running")
+        version = self.processor.analyzer.version()
+        if restart or self.state["state"] in ("idle", "done") or self.state["analyzer_version"] != version:
+            self.state = self._new_state("running")
+            self.state["started_at"] = time.time()
+        self.state["state"] = "running"
+        self.save()
+        self._pause = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    async def resume(self):
+        """Continues a run that was still going when the server last stopped."""
+        if self.state["state"] == "running" and not self.running:
+            print("Resuming library re-analysis")
+            self.start()
+
+    async def pause(self):
+        """Stops after the analyses in progress; start() continues from the checkpoint."""
+        if not self.running:
+            raise RuntimeError("Re-analysis is not running")
+        self._pause.set()
+        await self.task
+
+    @property
+    def pausing(self) -> bool:
+        return self._pause is not None and self._pause.is_set()
+
+    async def _sleep(self, seconds: float):
+        # Cut short by pause()
+        try:
+            await asyncio.wait_for(self._pause.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def is_stale(self, entry: LibraryEntry) -> bool:
+        if entry.analysis is None or entry.status in ("pending", "processing"):
+            return False  # Never analysed, or about to be anyway
+        return entry.analysis.analyzer_version != self.state["analyzer_version"]
+
+    def source(self, entry: LibraryEntry) -> Optional[str]:
+        """The input file when it's still there, else the processed output."""
+        for directory, name in ((self.input_dir, entry.input_path), (self.output_dir, entry.output_path)):
+            if name:
+                path = os.path.join(directory, name)
+                if os.path.isfile(path):
+                    return path
+        return None
+
+    def throttle_delay(self, elapsed: float) -> float:
+        """Sleep after an analysis of `elapsed` seconds that keeps one slot within its CPU share."""
+        share = self.cpu_budget / self.slots
+        return elapsed * (1.0 - share) / share
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while not self.pausing:
+                query = LibraryQuery(sort="created_at", limit=self.chunk_size, cursor=self.state["cursor"])
+                # Library reads and writes are blocking, so they stay off the event loop
+                page = await loop.run_in_executor(self.executor, self.library.query, query)
+                await self._run_page(page.entries)
+                if self.pausing:
+                    break
+                # Only a completed page moves the checkpoint
+                self.state["cursor"] = page.next_cursor
+                if page.next_cursor is None:
+                    self.state["state"] = "done"
+                    print(f"Library re-analysis done: {self.state['reanalysed']} entries updated")
+                    break
+                self.save()
+        except Exception as e:
+            # Left "running" with the last checkpoint, so a restart picks it up again
+            print(f"Library re-analysis stopped: {e}")
+        finally:
+            if self.pausing:
+                self.state["state"] = "paused"
+            self.save()
+
+    async def _run_page(self, entries: List[LibraryEntry]):
+        remaining = list(entries)
+
+        async def worker():
+            while remaining and not self.pausing:
+                entry = remaining.pop(0)
+                self.state["checked"] += 1
+                if self.is_stale(entry):
+                    await self._reanalyse(entry)
+
+        await asyncio.gather(*(worker() for _ in range(self.slots)))
+
+    async def _reanalyse(self, entry: LibraryEntry):
+        while self.processor.busy and not self.pausing:
+            await self._sleep(self.IDLE_POLL_SECONDS)
+        if self.pausing:
+            return
+        path = self.source(entry)
+        if path is None:
+            self.state["skipped"] += 1
+            return
+        start = time.perf_counter()
+        try:
+            result = await self.processor.analyze_path(path)
+        except Exception as e:
+            print(f"Re-analysis failed for {entry.filename}: {e}")
+            self.state["failed"] += 1
+            return
+        finally:
+            elapsed = time.perf_counter() - start
+        await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.library.update_analysis, entry.id, AnalysisResult(**result)
+        )
+        self.state["reanalysed"] += 1
+        await self._sleep(self.throttle_delay(elapsed))
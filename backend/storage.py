@@ -0,0 +1,523 @@
+import base64
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from metrics import LIBRARY_SAVE_SECONDS
+from models import LibraryEntry, LibraryQuery
+
+SORT_FIELDS = ("created_at", "filename", "bpm")
+
+def encode_cursor(value, seq: int) -> str:
+    """Opaque keyset cursor: the sort value and insertion sequence of the last entry on a page."""
+    return base64.urlsafe_b64encode(json.dumps([value, seq]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[object, int]:
+    try:
+        value, seq = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(seq)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def validate_query(query: LibraryQuery):
+    if query.sort not in SORT_FIELDS:
+        raise ValueError(f"Unknown sort field: {query.sort}")
+    if query.order not in ("asc", "desc"):
+        raise ValueError(f"Unknown sort order: {query.order}")
+    if query.limit < 1:
+        raise ValueError("limit must be positive")
+
+class LibraryStorage:
+    """Persistence backend used by LibraryManager."""
+
+    name = "base"
+
+    def __init__(self):
+        # Bumped on every change; with `generation` it identifies a library state (ETags)
+        self.version = 0
+        self.generation = uuid.uuid4().hex[:8]
+        self.flush_count = 0
+        self.flush_seconds_total = 0.0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def _record_flush(self, elapsed: float):
+        LIBRARY_SAVE_SECONDS.observe(elapsed, backend=self.name)
+        self.flush_count += 1
+        self.flush_seconds_total += elapsed
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+
+    def _changed(self):
+        self.version += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "flush_count": self.flush_count,
+            "flush_seconds_total": self.flush_seconds_total,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
+
+    def flush(self):
+        """Persists any buffered changes."""
+        pass
+
+    def all(self) -> List[LibraryEntry]:
+        raise NotImplementedError
+
+    def get(self, id: str) -> Optional[LibraryEntry]:
+        raise NotImplementedError
+
+    def get_by_filename(self, filename: str) -> Optional[LibraryEntry]:
+        raise NotImplementedError
+
+    def query(self, query: LibraryQuery) -> Tuple[List[LibraryEntry], Optional[str], int]:
+        """Returns one page of matching entries, the cursor of the next page and the match count."""
+        raise NotImplementedError
+
+    def put(self, entry: LibraryEntry):
+        """Insert or update a single entry."""
+        self.put_many([entry])
+
+    def put_many(self, entries: Iterable[LibraryEntry]):
+        raise NotImplementedError
+
+    def delete(self, id: str):
+        self.delete_many([id])
+
+    def delete_many(self, ids: Iterable[str]):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+
+class JsonStorage(LibraryStorage):
+    """
+    Legacy backend: the whole library lives in memory and is written to
+    library.json as a single document. Lookups go through an in-memory id map.
+
+    With flush_interval=0 every change is written immediately. Otherwise changes
+    only mark the library dirty and are written at most once per interval, or as
+    soon as `flush_batch` changes are pending. Writes go to a temp file that is
+    renamed over library.json, so a crash mid-write never truncates it.
+
+    Queries use in-memory secondary indexes: entry ids per Camelot key and
+    sorted (value, seq, id) lists for bpm, created_at and filename, searched
+    with bisect. A page walks the index of its sort field from the cursor on,
+    so nothing is re-sorted per page. Filename lookups go through a map too.
+    """
+
+    name = "json"
+
+    def __init__(self, path: str, flush_interval: float = 0.0, flush_batch: int = 100):
+        super().__init__()
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch = max(1, flush_batch)
+        self.lock = threading.RLock()
+        self.entries: List[LibraryEntry] = []
+        self._by_id: Dict[str, LibraryEntry] = {}
+        self._seq: Dict[str, int] = {}  # Insertion order, the tiebreaker for sorting and cursors
+        self._next_seq = 0
+        self._by_key: Dict[str, Set[str]] = {}
+        self._by_bpm: List[Tuple[float, int, str]] = []
+        self._by_created: List[Tuple[float, int, str]] = []
+        self._by_name: List[Tuple[str, int, str]] = []
+        self._by_filename: Dict[str, List[Tuple[int, str]]] = {}  # (seq, id) per filename, oldest first
+        self._indexed: Dict[str, Tuple[Optional[float], Optional[str], float, str]] = {}
+        self.pending_changes = 0
+        self._last_flush_at = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                    self.entries = [LibraryEntry(**item) for item in data]
+            except Exception as e:
+                print(f"Error loading library: {e}")
+                self.entries = []
+        else:
+            self.entries = []
+        self._by_id = {entry.id: entry for entry in self.entries}
+        self._seq, self._next_seq, self._indexed = {}, 0, {}
+        self._by_key, self._by_bpm, self._by_created, self._by_name, self._by_filename = {}, [], [], [], {}
+        for entry in self.entries:
+            self._index(entry)
+
+    def _index(self, entry: LibraryEntry):
+        self._unindex(entry.id)
+        if entry.id not in self._seq:
+            self._seq[entry.id] = self._next_seq
+            self._next_seq += 1
+        bpm = entry.analysis.bpm if entry.analysis else None
+        key = entry.analysis.key_camelot if entry.analysis else None
+        if bpm is not None:
+            bisect.insort(self._by_bpm, (bpm, self._seq[entry.id], entry.id))
+        if key is not None:
+            self._by_key.setdefault(key, set()).add(entry.id)
+        seq = self._seq[entry.id]
+        bisect.insort(self._by_created, (entry.created_at, seq, entry.id))
+        bisect.insort(self._by_name, (entry.filename, seq, entry.id))
+        bisect.insort(self._by_filename.setdefault(entry.filename, []), (seq, entry.id))
+        self._indexed[entry.id] = (bpm, key, entry.created_at, entry.filename)
+
+    @staticmethod
+    def _remove(index: list, item: tuple):
+        position = bisect.bisect_left(index, item)
+        if position < len(index) and index[position] == item:
+            del index[position]
+
+    def _unindex(self, id: str):
+        if id not in self._indexed:
+            return
+        bpm, key, created_at, filename = self._indexed.pop(id)
+        seq = self._seq[id]
+        if bpm is not None:
+            self._remove(self._by_bpm, (bpm, seq, id))
+        if key is not None:
+            self._by_key.get(key, set()).discard(id)
+        self._remove(self._by_created, (created_at, seq, id))
+        self._remove(self._by_name, (filename, seq, id))
+        same_name = self._by_filename.get(filename, [])
+        self._remove(same_name, (seq, id))
+        if not same_name:
+            self._by_filename.pop(filename, None)
+
+    def save(self):
+        """Marks the library dirty and flushes it if a write is due."""
+        with self.lock:
+            self.pending_changes += 1
+            since_flush = time.monotonic() - self._last_flush_at
+            if (self.flush_interval <= 0
+                    or self.pending_changes >= self.flush_batch
+                    or since_flush >= self.flush_interval):
+                self.flush()
+            elif self._timer is None:
+                # Make sure buffered changes still land once the interval elapses
+                self._timer = threading.Timer(self.flush_interval - since_flush, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.pending_changes:
+                return
+
+            start = time.perf_counter()
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump([entry.dict() for entry in self.entries], f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"Error saving library: {e}")
+                return
+            self.pending_changes = 0
+            self._last_flush_at = time.monotonic()
+            self._record_flush(time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "pending_changes": self.pending_changes,
+            "flush_interval": self.flush_interval,
+            "flush_batch": self.flush_batch,
+        }
+
+    def all(self) -> List[LibraryEntry]:
+        with self.lock:
+            return list(self.entries)
+
+    def get(self, id: str) -> Optional[LibraryEntry]:
+        return self._by_id.get(id)
+
+    def get_by_filename(self, filename: str) -> Optional[LibraryEntry]:
+        # Oldest entry wins, matching the original list-scan behaviour
+        with self.lock:
+            same_name = self._by_filename.get(filename)
+            return self._by_id[same_name[0][1]] if same_name else None
+
+    def query(self, query: LibraryQuery) -> Tuple[List[LibraryEntry], Optional[str], int]:
+        validate_query(query)
+        with self.lock:
+            ids: Optional[Set[str]] = None
+            index = {"created_at": self._by_created, "filename": self._by_name, "bpm": self._by_bpm}[query.sort]
+            low, high = 0, len(index)
+            if query.bpm_min is not None or query.bpm_max is not None or query.sort == "bpm":
+                bpm_low = bisect.bisect_left(self._by_bpm, (query.bpm_min,)) if query.bpm_min is not None else 0
+                bpm_high = (bisect.bisect_right(self._by_bpm, (query.bpm_max, float("inf")))
+                            if query.bpm_max is not None else len(self._by_bpm))
+                if query.sort == "bpm":
+                    low, high = bpm_low, bpm_high  # The range is the filter
+                else:
+                    ids = {id for _, _, id in self._by_bpm[bpm_low:bpm_high]}
+            if query.keys is not None:
+                by_key = set().union(*(self._by_key.get(key, set()) for key in query.keys))
+                ids = by_key if ids is None else ids & by_key
+
+            def matches(id: str) -> bool:
+                return (ids is None or id in ids) and (not query.status or self._by_id[id].status == query.status)
+
+            if ids is None and not query.status:
+                total = high - low
+            elif ids is not None and query.sort != "bpm":
+                total = sum(1 for id in ids if matches(id))
+            else:
+                total = sum(1 for _, _, id in index[low:high] if matches(id))
+
+            descending = query.order == "desc"
+            if query.cursor:
+                value, seq = decode_cursor(query.cursor)
+                try:
+                    # Seqs are unique, so (value, seq + 1) is the first position past the cursor
+                    if descending:
+                        high = bisect.bisect_left(index, (value, seq), low, high)
+                    else:
+                        low = bisect.bisect_left(index, (value, seq + 1), low, high)
+                except TypeError:
+                    raise ValueError("Cursor does not match the sort field")
+
+            positions = range(high - 1, low - 1, -1) if descending else range(low, high)
+            page: List[Tuple[object, int, str]] = []
+            for position in positions:
+                item = index[position]
+                if matches(item[2]):
+                    page.append(item)
+                    if len(page) > query.limit:
+                        break
+            next_cursor = encode_cursor(*page[query.limit - 1][:2]) if len(page) > query.limit else None
+        return [self._by_id[id] for _, _, id in page[:query.limit]], next_cursor, total
+
+    def put_many(self, entries: Iterable[LibraryEntry]):
+        with self.lock:
+            for entry in entries:
+                existing = self._by_id.get(entry.id)
+                if existing is None:
+                    self.entries.append(entry)
+                elif existing is not entry:
+                    self.entries[self.entries.index(existing)] = entry
+                self._by_id[entry.id] = entry
+                self._index(entry)
+            self._changed()
+            self.save()
+
+    def delete_many(self, ids: Iterable[str]):
+        ids = set(ids)
+        with self.lock:
+            self.entries = [entry for entry in self.entries if entry.id not in ids]
+            for id in ids:
+                self._by_id.pop(id, None)
+                self._unindex(id)
+                self._seq.pop(id, None)
+            self._changed()
+            self.save()
+
+    def clear(self):
+        with self.lock:
+            self.entries = []
+            self._by_id = {}
+            self._seq, self._indexed = {}, {}
+            self._by_key, self._by_bpm, self._by_created, self._by_name, self._by_filename = {}, [], [], [], {}
+            self._changed()
+            self.save()
+
+
+class SqliteStorage(LibraryStorage):
+    """
+    SQLite backend. Each entry is one row (indexed by id and filename) holding the
+    serialised LibraryEntry, so updates touch a single row in their own transaction.
+    The analysis bpm and Camelot key are copied into indexed columns for queries.
+    An existing library.json is imported once on first start.
+    Every committed transaction counts as one flush in `stats()`.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, legacy_json_path: Optional[str] = None):
+        super().__init__()
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL UNIQUE,
+                    filename TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    bpm REAL,
+                    key_camelot TEXT,
+                    data TEXT NOT NULL
+                )
+                """
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_filename ON entries(filename)")
+            self._add_query_columns()
+        if legacy_json_path:
+            self._migrate_json(legacy_json_path)
+
+    def _add_query_columns(self):
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(entries)")}
+        if "bpm" not in columns:
+            # Libraries created before queries existed: add and backfill the columns
+            self.conn.execute("ALTER TABLE entries ADD COLUMN bpm REAL")
+            self.conn.execute("ALTER TABLE entries ADD COLUMN key_camelot TEXT")
+            self.conn.execute(
+                """
+                UPDATE entries SET
+                    bpm = json_extract(data, '$.analysis.bpm'),
+                    key_camelot = json_extract(data, '$.analysis.key_camelot')
+                """
+            )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_bpm ON entries(bpm)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_key ON entries(key_camelot, bpm)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_status ON entries(status)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_created ON entries(created_at)")
+
+    def _migrate_json(self, json_path: str):
+        if not os.path.exists(json_path):
+            return
+        with self.lock:
+            has_rows = self.conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone()
+        if has_rows:
+            return
+        try:
+            with open(json_path, "r") as f:
+                entries = [LibraryEntry(**item) for item in json.load(f)]
+            self.put_many(entries)
+            # Keep the original file around, but never import it again
+            os.replace(json_path, f"{json_path}.migrated")
+            print(f"Migrated {len(entries)} library entries from {json_path}")
+        except Exception as e:
+            print(f"Error migrating library: {e}")
+
+    @staticmethod
+    def _row_to_entry(row) -> LibraryEntry:
+        return LibraryEntry(**json.loads(row[0]))
+
+    def all(self) -> List[LibraryEntry]:
+        with self.lock:
+            rows = self.conn.execute("SELECT data FROM entries ORDER BY seq").fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def get(self, id: str) -> Optional[LibraryEntry]:
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM entries WHERE id = ?", (id,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def get_by_filename(self, filename: str) -> Optional[LibraryEntry]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM entries WHERE filename = ? ORDER BY seq LIMIT 1", (filename,)
+            ).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def query(self, query: LibraryQuery) -> Tuple[List[LibraryEntry], Optional[str], int]:
+        validate_query(query)
+        where, params = [], []
+        if query.status:
+            where.append("status = ?")
+            params.append(query.status)
+        if query.bpm_min is not None:
+            where.append("bpm >= ?")
+            params.append(query.bpm_min)
+        if query.bpm_max is not None:
+            where.append("bpm <= ?")
+            params.append(query.bpm_max)
+        if query.keys is not None:
+            where.append(f"key_camelot IN ({', '.join('?' * len(query.keys))})")
+            params.extend(query.keys)
+        if query.sort == "bpm":
+            where.append("bpm IS NOT NULL")
+
+        column = query.sort # Validated against SORT_FIELDS
+        direction = "DESC" if query.order == "desc" else "ASC"
+        page_where, page_params = list(where), list(params)
+        if query.cursor:
+            value, seq = decode_cursor(query.cursor)
+            page_where.append(f"({column}, seq) {'<' if direction == 'DESC' else '>'} (?, ?)")
+            page_params.extend([value, seq])
+
+        def clause(conditions):
+            return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM entries {clause(where)}", params).fetchone()[0]
+            rows = self.conn.execute(
+                f"""
+                SELECT data, {column}, seq FROM entries {clause(page_where)}
+                ORDER BY {column} {direction}, seq {direction} LIMIT ?
+                """,
+                page_params + [query.limit + 1],
+            ).fetchall()
+        page = rows[:query.limit]
+        next_cursor = encode_cursor(page[-1][1], page[-1][2]) if len(rows) > query.limit else None
+        return [self._row_to_entry(row) for row in page], next_cursor, total
+
+    def put_many(self, entries: Iterable[LibraryEntry]):
+        rows = [
+            (
+                entry.id, entry.filename, entry.created_at, entry.status,
+                entry.analysis.bpm if entry.analysis else None,
+                entry.analysis.key_camelot if entry.analysis else None,
+                json.dumps(entry.dict()),
+            )
+            for entry in entries
+        ]
+        with self.lock, self._transaction():
+            self.conn.executemany(
+                """
+                INSERT INTO entries (id, filename, created_at, status, bpm, key_camelot, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    filename = excluded.filename,
+                    status = excluded.status,
+                    bpm = excluded.bpm,
+                    key_camelot = excluded.key_camelot,
+                    data = excluded.data
+                """,
+                rows,
+            )
+
+    def delete_many(self, ids: Iterable[str]):
+        with self.lock, self._transaction():
+            self.conn.executemany("DELETE FROM entries WHERE id = ?", [(id,) for id in ids])
+
+    def clear(self):
+        with self.lock, self._transaction():
+            self.conn.execute("DELETE FROM entries")
+
+    @contextmanager
+    def _transaction(self):
+        start = time.perf_counter()
+        with self.conn:
+            yield
+        self._changed()
+        self._record_flush(time.perf_counter() - start)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
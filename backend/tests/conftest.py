@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app_data(tmp_path, monkeypatch):
+    """
+    Points main's data directories, library and job queue at a temporary data
+    dir, so endpoint tests never touch the real one. Test modules mock
+    Essentia before this imports main.
+    """
+    import main
+    from jobs import JobQueue
+    from library import LibraryManager
+
+    root = tmp_path / "data"
+    for name in ("input", "output", "peaks", "timeline"):
+        (root / name).mkdir(parents=True)
+    monkeypatch.setattr(main, "DATA_DIR", str(root))
+    monkeypatch.setattr(main, "INPUT_DIR", str(root / "input"))
+    monkeypatch.setattr(main, "OUTPUT_DIR", str(root / "output"))
+    monkeypatch.setattr(main, "PEAKS_DIR", str(root / "peaks"))
+    monkeypatch.setattr(main, "TIMELINE_DIR", str(root / "timeline"))
+
+    library = LibraryManager(str(root))
+    jobs = JobQueue(str(root / "jobs.db"))
+    monkeypatch.setattr(main, "library", library)
+    monkeypatch.setattr(main, "jobs", jobs)
+    monkeypatch.setattr(main.processor, "jobs", jobs)
+    monkeypatch.setattr(main.processor, "upload_dir", str(root / "input"))
+    monkeypatch.setattr(main.processor, "peaks_dir", str(root / "peaks"))
+    monkeypatch.setattr(main.reanalyzer, "library", library)
+    yield root
+    library.close()
+    jobs.close()
@@ -0,0 +1,212 @@
+import sys
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pytest
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import AlgorithmPool, AudioAnalyzer
+import waveform
+
+
+def test_params_round_trip_into_constructor():
+    analyzer = AudioAnalyzer(silence_threshold=-50, streaming_min_bytes=0)
+    assert AudioAnalyzer(**analyzer.params()).params() == analyzer.params()
+
+
+@patch.object(AudioAnalyzer, "_analyze_streaming", return_value={"bpm": 100.0})
+def test_streaming_used_above_size_threshold(mock_streaming, tmp_path):
+    small = tmp_path / "small.mp3"
+    large = tmp_path / "large.mp3"
+    small.write_bytes(b"x" * 10)
+    large.write_bytes(b"x" * 1000)
+
+    analyzer = AudioAnalyzer(streaming_min_bytes=100)
+    assert analyzer._should_stream(str(large))
+    assert not analyzer._should_stream(str(small))
+    assert analyzer.analyze_file(str(large)) == {"bpm": 100.0}
+    mock_streaming.assert_called_once_with(str(large), None)
+
+
+def test_streaming_disabled_by_default(tmp_path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(b"x" * 1000)
+    assert not AudioAnalyzer()._should_stream(str(path))
+
+
+def test_preview_excerpts_are_short_windows():
+    analyzer = AudioAnalyzer()
+    sample_rate = analyzer.PREVIEW_SAMPLE_RATE
+    audio = np.arange(sample_rate * 300, dtype=np.float32)  # 5 minutes
+
+    excerpts = analyzer._excerpts(audio, sample_rate)
+    length = int(analyzer.PREVIEW_EXCERPT_SECONDS * sample_rate)
+    assert len(excerpts) == len(analyzer.PREVIEW_EXCERPTS)
+    assert all(len(excerpt) == length for excerpt in excerpts)
+    assert excerpts[1][length // 2] == len(audio) // 2
+
+
+def test_preview_uses_whole_signal_for_short_clips():
+    analyzer = AudioAnalyzer()
+    audio = np.zeros(analyzer.PREVIEW_SAMPLE_RATE * 10, dtype=np.float32)
+    assert len(analyzer._excerpts(audio, analyzer.PREVIEW_SAMPLE_RATE)) == 1
+
+
+def test_full_analysis_writes_peaks_from_the_same_decode(tmp_path):
+    audio = np.sin(np.linspace(0, 200 * np.pi, 44100 * 2)).astype(np.float32)
+    algorithms = {
+        "silence": MagicMock(return_value=(0.5, 1.5)),
+        "rhythm": MagicMock(return_value=(120.0, None, 3.5, None, None)),
+        "key": MagicMock(return_value=("A", "minor", 0.7)),
+    }
+    peaks_path = str(tmp_path / "song.peaks")
+
+    with patch("analyzer.es.MonoLoader", return_value=lambda: audio) as loader, \
+            patch.object(AudioAnalyzer, "_build_algorithms", return_value=algorithms):
+        analyzer = AudioAnalyzer()
+        result = analyzer.analyze_file("song.mp3", peaks_path=peaks_path)
+
+    loader.assert_called_once()
+    assert result["key_camelot"] == "8A"
+    assert "peaks" in analyzer.last_timings
+    with open(peaks_path, "rb") as f:
+        peaks = waveform.decode(f.read())
+    # Peaks cover the whole track, not just the non-silent region
+    assert peaks["total_samples"] == len(audio)
+    assert peaks["levels"][0]["peaks"].max() == 127
+
+
+class StatefulAlgorithm:
+    """Stands in for an Essentia algorithm whose output drifts unless reset between files."""
+
+    def __init__(self, output):
+        self.output = output
+        self.calls = 0
+        self.in_use = False
+
+    def __call__(self, signal):
+        assert not self.in_use, "algorithm lent to two analyses at once"
+        self.in_use = True
+        time.sleep(0.001)
+        self.calls += 1
+        self.in_use = False
+        return self.output(float(signal[0]), self.calls)
+
+    def reset(self):
+        self.calls = 0
+
+
+def stateful_algorithms():
+    return {
+        "silence": StatefulAlgorithm(lambda first, calls: (0.0, 1.0 * calls)),
+        "rhythm": StatefulAlgorithm(lambda first, calls: (100.0 + first + calls, None, 3.0, None, None)),
+        "key": StatefulAlgorithm(lambda first, calls: ("C", "major", 0.5 * calls)),
+    }
+
+
+def analyze_all(analyzer, signals, workers=1):
+    def analyze(signal):
+        with patch("analyzer.es.MonoLoader", return_value=lambda: signal):
+            return analyzer.analyze_file("song.mp3")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(analyze, signals))
+
+
+@patch.object(AudioAnalyzer, "_build_algorithms", side_effect=stateful_algorithms)
+def test_pooled_algorithms_match_fresh_instances(mock_build):
+    signals = [np.full(44100, i, dtype=np.float32) for i in range(6)]
+    fresh = analyze_all(AudioAnalyzer(reuse_algorithms=False), signals)
+    assert mock_build.call_count == len(signals)
+
+    mock_build.reset_mock()
+    pooled = AudioAnalyzer()
+    assert analyze_all(pooled, signals) == fresh
+    assert mock_build.call_count == 1
+    assert pooled._pools["full"].created == 1
+
+
+@patch.object(AudioAnalyzer, "_build_algorithms", side_effect=stateful_algorithms)
+def test_reset_restores_fresh_instance_output(mock_build):
+    signal = np.full(44100, 3, dtype=np.float32)
+    fresh = analyze_all(AudioAnalyzer(reuse_algorithms=False), [signal])[0]
+
+    pooled = AudioAnalyzer()
+    # One set analyses every file and matches a fresh instance each time
+    assert analyze_all(pooled, [signal] * 3) == [fresh] * 3
+    assert pooled._pools["full"].created == 1
+
+    # Control: the fakes really are stateful, so without reset() the output drifts
+    with patch.object(StatefulAlgorithm, "reset"):
+        drifted = analyze_all(AudioAnalyzer(), [signal] * 2)
+    assert drifted[0] == fresh and drifted[1] != fresh
+
+
+@patch.object(AudioAnalyzer, "_build_algorithms", side_effect=stateful_algorithms)
+def test_pool_is_safe_to_share_across_threads(mock_build):
+    signals = [np.full(44100, i % 5, dtype=np.float32) for i in range(40)]
+    fresh = analyze_all(AudioAnalyzer(reuse_algorithms=False), signals)
+
+    pooled = AudioAnalyzer()
+    assert analyze_all(pooled, signals, workers=4) == fresh
+    assert pooled._pools["full"].created <= 4
+
+
+def test_pool_discards_sets_that_fail_to_reset():
+    broken = MagicMock()
+    broken.reset.side_effect = RuntimeError("reset failed")
+    pool = AlgorithmPool(lambda: {"key": broken})
+    with pool.checkout():
+        pass
+    assert pool.idle == []
+
+
+def test_analyzer_pickles_for_process_pools():
+    analyzer = AudioAnalyzer(silence_threshold=-50)
+    analyzer._pools["full"].idle.append({"key": MagicMock()})
+    copy = pickle.loads(pickle.dumps(analyzer))
+    assert copy.params() == analyzer.params()
+    assert copy._pools["full"].idle == []
+    assert copy.last_timings == {}
+
+
+@pytest.mark.skipif(isinstance(sys.modules["essentia"], MagicMock), reason="needs Essentia")
+def test_pooled_results_identical_with_essentia(tmp_path):
+    from benchmarks.fixtures import make_fixture
+
+    paths = []
+    for i, (bpm, key, scale) in enumerate([(90.0, "D", "major"), (128.0, "F", "minor"), (100.0, "C", "major")]):
+        path = str(tmp_path / f"fixture_{i}.wav")
+        make_fixture(path, bpm, key, scale, seconds=20)
+        paths.append(path)
+
+    fresh = [AudioAnalyzer(reuse_algorithms=False).analyze_file(path) for path in paths]
+    pooled_analyzer = AudioAnalyzer()
+    # Twice through, so every file after the first runs on a reset instance
+    pooled = [pooled_analyzer.analyze_file(path) for path in paths + paths]
+    assert pooled == fresh + fresh
+
+@pytest.mark.skipif(isinstance(sys.modules["essentia"], MagicMock), reason="needs Essentia")
+def test_streaming_results_match_standard_within_tolerance(tmp_path):
+    from benchmarks.fixtures import make_fixture
+
+    standard = AudioAnalyzer()
+    streaming = AudioAnalyzer(streaming_min_bytes=0)
+    frame = AudioAnalyzer.STREAM_FRAME_SIZE / float(standard.sample_rate)
+    for i, (bpm, key, scale) in enumerate([(90.0, "D", "major"), (128.0, "F", "minor"), (100.0, "C", "major")]):
+        path = str(tmp_path / f"fixture_{i}.wav")
+        make_fixture(path, bpm, key, scale, seconds=30)
+        expected = standard.analyze_file(path)
+        result = streaming.analyze_file(path)
+        # Documented in _analyze_streaming: one frame per trimmed end, one BPM rounding step
+        assert abs(result["duration"] - expected["duration"]) <= 2 * frame
+        assert abs(result["bpm"] - expected["bpm"]) <= 0.5
+        assert result["key_standard"] == expected["key_standard"]
@@ -16,7 +16,7 @@ from main import app
 client = TestClient(app)
 
 # Mock file content
-FAKE_AUDIO_CONTENT = b"fake audio content"
+FAKE_AUDIO_CONTENT = b"ID3fake audio content"
 
 @pytest.fixture
 def clean_upload_dir():
@@ -109,3 +109,19 @@ def test_rename_file(clean_upload_dir):
     assert data["new_filename"] == expected_name
     assert os.path.exists(os.path.join(clean_upload_dir, expected_name))
     assert not os.path.exists(os.path.join(clean_upload_dir, filename))
+
+def test_library_page_and_etag():
+    response = client.get("/api/library/page", params={"compatible_with": "8A", "limit": 5})
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data) == {"entries", "next_cursor", "total"}
+    assert all(e["analysis"]["key_camelot"] in ("8A", "7A", "9A", "8B") for e in data["entries"])
+
+    cached = client.get(
+        "/api/library/page", params={"compatible_with": "8A", "limit": 5},
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+    assert cached.status_code == 304
+
+    assert client.get("/api/library/page", params={"sort": "nope"}).status_code == 400
+    assert client.get("/api/library/page", params={"compatible_with": "Z9"}).status_code == 400
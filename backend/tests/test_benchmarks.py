@@ -0,0 +1,59 @@
+import sys
+import os
+import json
+import wave
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock essentia before importing modules that use it (the io scenario imports main)
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import SAMPLE_RATE, click_track, make_fixture
+from benchmarks.run import bench_io, bench_library, flatten
+
+
+def test_fixture_has_expected_length_and_silence(tmp_path):
+    path = str(tmp_path / "fixture.wav")
+    meta = make_fixture(path, 120.0, "A", "minor", 4.0, lead_silence=1.0, tail_silence=0.5)
+
+    with wave.open(path) as f:
+        assert f.getframerate() == SAMPLE_RATE
+        assert f.getnframes() == int(5.5 * SAMPLE_RATE)
+        lead = f.readframes(SAMPLE_RATE)
+    assert set(lead) == {0}
+    assert meta["key_standard"] == "A Minor"
+    assert meta["total_duration"] == 5.5
+
+
+def test_click_track_beats_match_bpm():
+    signal = click_track(120.0, 4.0)
+    beat = SAMPLE_RATE // 2
+    # A click right after every beat, silence between clicks
+    for start in range(0, len(signal), beat):
+        assert abs(signal[start:start + 100]).max() > 0.1
+        assert abs(signal[start + beat // 4:start + beat]).max() == 0
+
+
+def test_library_scenario_reports_json_serialisable_timings():
+    results = bench_library([50], ["sqlite", "json"], samples=10, updates=2)
+    assert "get_entry_us" in results["sqlite_50"]
+    assert results["json_50"]["storage"]["backend"] == "json"
+    assert "sqlite_50.bulk_insert_seconds" in flatten(json.loads(json.dumps(results)))
+
+
+def test_io_scenario_serves_status_while_copying():
+    pytest.importorskip("mutagen")
+    results = bench_io(files=2, size_mb=8, idle_seconds=0.2)
+    assert results["failed"] == 0
+    assert results["idle"]["requests"] > 0
+    assert {"status_ms_p50", "status_ms_p95", "status_ms_max"} <= results["upload"].keys()
+    assert json.loads(json.dumps(results))["process"]["requests"] >= 0
+    # File work stays off the event loop, so status latency stays near idle
+    bound = 5 * results["idle"]["status_ms_p95"] + 50
+    for phase in ("upload", "process"):
+        if results[phase]["requests"]:
+            assert results[phase]["status_ms_p95"] <= bound
@@ -0,0 +1,85 @@
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import AnalysisCache
+from processor import BatchProcessor
+
+RESULT = {
+    "bpm": 120.0,
+    "bpm_confidence": 0.9,
+    "key_standard": "C Major",
+    "key_camelot": "8B",
+    "key_confidence": 0.8,
+    "duration": 180.0
+}
+
+
+def test_lru_eviction_and_persistence(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = AnalysisCache(path, max_entries=2)
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    assert cache.get("a") == RESULT  # "a" becomes most recently used
+    cache.put("c", RESULT)
+
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+    reloaded = AnalysisCache(path, max_entries=2)
+    assert list(reloaded.entries) == ["a", "c"]
+
+
+def test_batched_writes_flush_on_timer_and_close(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = AnalysisCache(path, flush_interval=60)
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    assert not os.path.exists(path)  # Pending on the timer
+    cache.close()
+    assert list(AnalysisCache(path).entries) == ["a", "b"]
+
+    fast = AnalysisCache(path, flush_interval=0.2)
+    fast.put("c", RESULT)
+    fast._timer.join()
+    assert list(AnalysisCache(path).entries) == ["a", "b", "c"]
+
+
+def test_key_depends_on_params():
+    params = {"sample_rate": 44100, "silence_threshold": -60, "rhythm_method": "multifeature"}
+    other = dict(params, rhythm_method="degara")
+    assert AnalysisCache.make_key("abc", params) == AnalysisCache.make_key("abc", dict(params))
+    assert AnalysisCache.make_key("abc", params) != AnalysisCache.make_key("abc", other)
+
+
+def test_processor_skips_analysis_on_cache_hit(tmp_path):
+    upload_dir = tmp_path / "input"
+    upload_dir.mkdir()
+    (upload_dir / "first.mp3").write_bytes(b"same audio")
+    (upload_dir / "copy.mp3").write_bytes(b"same audio")
+
+    cache = AnalysisCache(str(tmp_path / "cache.json"))
+    processor = BatchProcessor(str(upload_dir), mode="serial", cache=cache)
+    calls = []
+
+    async def fake_analyze(file_path, preview=False, peaks_path=None, timeline_path=None):
+        calls.append(file_path)
+        return dict(RESULT)
+
+    processor._analyze = fake_analyze
+
+    async def run():
+        await processor.process_file("first.mp3")
+        return await processor.process_file("copy.mp3")
+
+    assert asyncio.run(run()) == RESULT
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,22 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import camelot
+
+
+def test_parse():
+    assert camelot.parse("8a") == (8, "A")
+    assert camelot.parse("12B") == (12, "B")
+    assert camelot.parse("13A") is None
+    assert camelot.parse("Unknown") is None
+
+
+def test_compatible_keys_wrap_around_the_wheel():
+    assert camelot.compatible_keys("8A") == ["8A", "7A", "9A", "8B"]
+    assert camelot.compatible_keys("1B") == ["1B", "12B", "2B", "1A"]
+    assert camelot.compatible_keys("12A") == ["12A", "11A", "1A", "12B"]
+    with pytest.raises(ValueError):
+        camelot.compatible_keys("H")
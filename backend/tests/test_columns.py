@@ -0,0 +1,70 @@
+import sys
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columns import AnalysisColumns
+from library import LibraryManager
+from models import AnalysisResult
+
+STANDARD = {"1A": "Ab Minor", "8A": "A Minor", "9A": "E Minor", "7A": "D Minor", "8B": "C Major", "3B": "Db Major"}
+
+
+def result(bpm, key="8A", key_standard=None, **fields):
+    values = dict(bpm=bpm, bpm_confidence=0.9, key_standard=key_standard or STANDARD[key], key_camelot=key,
+                  key_confidence=0.8, duration=200.0)
+    values.update(fields)
+    return AnalysisResult(**values)
+
+
+def test_stats_count_keys_by_camelot_code():
+    columns = AnalysisColumns(capacity=2)
+    columns.update("a", result(120.0, "8A"))
+    columns.update("b", result(121.0, "8A"))
+    columns.update("c", result(122.0, "3B"))
+    columns.update("unknown", result(123.0, key_standard="Unknown", key_camelot="Unknown"))
+
+    stats = columns.stats()
+    assert stats["keys"] == {"8A": 2, "3B": 1}
+    assert stats["analysed"] == 4
+
+
+def test_remove_moves_last_row_and_keeps_ids_consistent():
+    columns = AnalysisColumns(capacity=1)
+    for i in range(5):
+        columns.update(str(i), result(100.0 + i))
+    columns.remove("1")
+    columns.update("3", None)  # No analysis removes the row too
+    columns.update("4", result(150.0))
+
+    assert len(columns) == 3
+    assert sorted(columns.ids) == ["0", "2", "4"]
+    assert all(columns.ids[row] == id for id, row in columns._rows.items())
+    assert columns.stats()["bpm"]["max"] == 150.0
+    assert columns.stats()["bpm"]["min"] == 100.0
+
+
+def test_library_stats_follow_writes(tmp_path):
+    library = LibraryManager(str(tmp_path), backend="json")
+    assert library.stats()["analysed"] == 0
+    first = library.add_entry("a.mp3", analysis=result(121.0, "8A"))
+    library.add_entry("b.mp3", analysis=result(128.0, "8A"))
+    library.add_entry("c.mp3")
+
+    stats = library.stats()
+    assert stats["analysed"] == 2
+    assert stats["keys"] == {"8A": 2}
+    assert stats["bpm_histogram"] == {"120": 1, "125": 1}
+    assert stats["bpm"]["median"] == pytest.approx(124.5)
+
+    library.delete_input(first.id)
+    assert library.stats()["analysed"] == 1
+    library.clear()
+    assert library.stats()["analysed"] == 0
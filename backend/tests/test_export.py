@@ -0,0 +1,83 @@
+import sys
+import os
+import csv
+import io
+import xml.etree.ElementTree as ET
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+import export
+from library import LibraryManager
+from models import AnalysisResult, LibraryQuery
+
+
+def build_library(tmp_path, count=25):
+    library = LibraryManager(str(tmp_path), backend="json")
+    entries = []
+    for i in range(count):
+        analysis = AnalysisResult(
+            bpm=100.0 + i, bpm_confidence=0.9, key_standard="A Minor" if i % 2 else "F# Major",
+            key_camelot="8A" if i % 2 else "2B", key_confidence=0.7, duration=180.4,
+        )
+        entries.append(library.new_entry(f"track & {i}.mp3", analysis=analysis, file_size=1000 + i))
+    entries.append(library.new_entry("pending.mp3"))
+    library.save_entries(entries)
+    return library
+
+
+def test_csv_streams_every_page(tmp_path):
+    library = build_library(tmp_path)
+    chunks = list(export.csv_chunks(export.iter_pages(library, LibraryQuery(), page_size=10)))
+    assert len(chunks) == 3  # One chunk per page
+
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert len(rows) == 26
+    assert rows[0]["filename"] == "track & 0.mp3" and rows[0]["key_camelot"] == "2B"
+    assert rows[-1]["bpm"] == ""
+
+    filtered = LibraryQuery(bpm_min=110, keys=["8A"], sort="bpm", order="desc")
+    rows = list(csv.DictReader(io.StringIO("".join(export.csv_chunks(export.iter_pages(library, filtered, 4))))))
+    assert [float(r["bpm"]) for r in rows] == [123.0, 121.0, 119.0, 117.0, 115.0, 113.0, 111.0]
+
+
+def test_rekordbox_xml_is_well_formed(tmp_path):
+    library = build_library(tmp_path, count=3)
+    pages = export.iter_pages(library, LibraryQuery(bpm_min=0))
+    text = "".join(export.rekordbox_xml_chunks(pages, 3, lambda entry: f"/data/input/{entry.filename}"))
+
+    collection = ET.fromstring(text).find("COLLECTION")
+    tracks = collection.findall("TRACK")
+    assert collection.get("Entries") == "3" and len(tracks) == 3
+    assert tracks[0].get("Name") == "track & 0"
+    assert tracks[0].get("Tonality") == "F#" and tracks[1].get("Tonality") == "Am"
+    assert tracks[0].get("AverageBpm") == "100.00" and tracks[0].get("TotalTime") == "180"
+    assert tracks[0].get("Location") == "file://localhost/data/input/track%20%26%200.mp3"
+
+
+def test_parquet_row_groups(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    library = build_library(tmp_path)
+    data = b"".join(export.parquet_chunks(export.iter_pages(library, LibraryQuery(), page_size=10)))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 26
+    assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == 3
+
+
+def test_export_endpoint(app_data):
+    from main import app
+
+    client = TestClient(app)
+    response = client.get("/api/library/export", params={"format": "csv", "key": "8A"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[0] == ",".join(export.COLUMNS)
+    assert client.get("/api/library/export", params={"format": "mp3"}).status_code == 400
+    assert client.get("/api/library/export", params={"sort": "genre"}).status_code == 400
@@ -0,0 +1,88 @@
+import sys
+import os
+import random
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harmonic import HarmonicIndex
+from library import LibraryManager
+from models import AnalysisResult
+
+
+def build_index():
+    index = HarmonicIndex()
+    index.update("same", "8A", 124.0)
+    index.update("adjacent", "9A", 126.0)
+    index.update("relative", "8B", 121.0)
+    index.update("half", "7A", 62.5)
+    index.update("double", "8A", 247.0)
+    index.update("clash", "3B", 124.0)
+    index.update("too-fast", "8A", 140.0)
+    return index
+
+
+def test_finds_compatible_keys_and_tempos():
+    matches = build_index().compatible("8A", 124.0)
+    by_id = {match["id"]: match for match in matches}
+    assert set(by_id) == {"same", "adjacent", "relative", "half", "double"}
+    assert by_id["relative"]["relation"] == "relative"
+    assert by_id["half"]["tempo"] == "half"
+    assert by_id["double"]["tempo"] == "double"
+    assert matches[0]["id"] == "same"  # Closest tempo first
+
+
+def test_tolerance_half_double_and_exclude():
+    index = build_index()
+    assert {m["id"] for m in index.compatible("8A", 124.0, tolerance=1)} == {"same", "half", "double"}
+    assert {m["id"] for m in index.compatible("8A", 124.0, half_double=False)} == {"same", "adjacent", "relative"}
+    assert "same" not in {m["id"] for m in index.compatible("8A", 124.0, exclude="same")}
+
+
+def test_updates_move_and_remove_entries():
+    index = build_index()
+    index.update("same", "3B", 124.0)
+    assert "same" not in {m["id"] for m in index.compatible("8A", 124.0)}
+    index.update("clash", None, None)
+    index.remove("adjacent")
+    assert {m["id"] for m in index.compatible("3B", 124.0)} == {"same"}
+    assert len(index) == 5
+
+
+def test_library_keeps_index_in_step(tmp_path):
+    library = LibraryManager(str(tmp_path))
+    entry = library.add_entry("a.mp3")
+    other = library.add_entry("b.mp3")
+    result = AnalysisResult(bpm=128.0, bpm_confidence=1, key_standard="A Minor", key_camelot="8A",
+                            key_confidence=1, duration=200)
+    library.update_analysis(entry.id, result)
+    library.update_analysis(other.id, result.copy(update={"key_camelot": "9A"}))
+
+    matches = library.compatible("8A", 128.0, exclude=entry.id)
+    assert [m["entry"].id for m in matches] == [other.id]
+
+    library.set_output(other.id, "out.mp3")
+    library.delete_input(other.id)
+    library.delete_output(other.id)
+    assert library.compatible("8A", 128.0, exclude=entry.id) == []
+    library.close()
+
+    # Rebuilt from storage on start
+    reopened = LibraryManager(str(tmp_path))
+    assert [m["id"] for m in reopened.compatible("8B", 128.0)] == [entry.id]
+    reopened.close()
+
+
+def test_queries_stay_fast_at_100k_tracks():
+    rng = random.Random(1)
+    index = HarmonicIndex()
+    for i in range(100_000):
+        index.update(f"track-{i}", f"{rng.randint(1, 12)}{rng.choice('AB')}", round(rng.uniform(70, 175), 1))
+
+    queries = [(f"{rng.randint(1, 12)}{rng.choice('AB')}", rng.uniform(70, 175)) for _ in range(200)]
+    start = time.perf_counter()
+    for key, bpm in queries:
+        index.compatible(key, bpm, tolerance=1, limit=20)
+    average = (time.perf_counter() - start) / len(queries)
+    # Sub-millisecond on typical hardware; generous bound to keep CI stable
+    assert average < 0.005
@@ -0,0 +1,140 @@
+import sys
+import os
+import pytest
+from unittest.mock import MagicMock, patch
+
+# Mock essentia before importing modules that use it (the endpoint test imports main)
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import AnalysisCache
+from ingest import ingest_directory, resolve_directory, scan_audio_files
+from library import LibraryManager
+from models import AnalysisResult
+
+RESULT = AnalysisResult(
+    bpm=120.0,
+    bpm_confidence=0.9,
+    key_standard="C Major",
+    key_camelot="8B",
+    key_confidence=0.8,
+    duration=180.0
+)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    (tmp_path / "input").mkdir()
+    crate = tmp_path / "crates" / "house"
+    crate.mkdir(parents=True)
+    (crate / "one.mp3").write_bytes(b"one")
+    (crate / "TWO.FLAC").write_bytes(b"two")
+    (crate / "notes.txt").write_bytes(b"not audio")
+    (tmp_path / "crates" / "top.wav").write_bytes(b"top")
+    return tmp_path
+
+
+def test_scan_filters_extensions_and_recurses(data_dir):
+    names = sorted(item.name for item in scan_audio_files(str(data_dir / "crates")))
+    assert names == ["TWO.FLAC", "one.mp3", "top.wav"]
+
+    flat = [item.name for item in scan_audio_files(str(data_dir / "crates"), recursive=False)]
+    assert flat == ["top.wav"]
+
+
+def test_resolve_directory_stays_inside_data_dir(data_dir):
+    assert resolve_directory("crates", str(data_dir)) == os.path.realpath(data_dir / "crates")
+    with pytest.raises(ValueError):
+        resolve_directory("../", str(data_dir))
+    with pytest.raises(FileNotFoundError):
+        resolve_directory("missing", str(data_dir))
+
+
+def test_ingest_registers_once_and_skips_unchanged(data_dir):
+    library = LibraryManager(str(data_dir))
+    input_dir = str(data_dir / "input")
+
+    result, to_analyze = ingest_directory(library, str(data_dir / "crates"), input_dir)
+    assert (result.scanned, result.registered, result.skipped) == (3, 3, 0)
+    assert os.path.join("..", "crates", "top.wav") in to_analyze
+
+    for filename in to_analyze:
+        library.update_analysis(library.get_entry_by_filename(filename).id, RESULT)
+
+    result, to_analyze = ingest_directory(library, str(data_dir / "crates"), input_dir)
+    assert (result.registered, result.skipped) == (0, 3)
+    assert to_analyze == []
+
+    (data_dir / "crates" / "top.wav").write_bytes(b"top, remastered")
+    result, to_analyze = ingest_directory(library, str(data_dir / "crates"), input_dir)
+    assert (result.updated, result.skipped) == (1, 2)
+    assert to_analyze == [os.path.join("..", "crates", "top.wav")]
+    library.close()
+
+
+def test_entries_not_enqueued_are_left_uploaded(data_dir):
+    library = LibraryManager(str(data_dir))
+    _, to_analyze = ingest_directory(library, str(data_dir / "crates"), str(data_dir / "input"), enqueue=False)
+    assert len(to_analyze) == 3
+    assert {library.get_entry_by_filename(filename).status for filename in to_analyze} == {"uploaded"}
+
+    _, to_analyze = ingest_directory(library, str(data_dir / "crates"), str(data_dir / "input"))
+    assert {library.get_entry_by_filename(filename).status for filename in to_analyze} == {"pending"}
+    library.close()
+
+
+def test_hash_mode_ignores_touched_but_identical_files(data_dir):
+    library = LibraryManager(str(data_dir))
+    input_dir = str(data_dir / "input")
+    _, to_analyze = ingest_directory(library, str(data_dir / "crates"), input_dir, detect_changes="hash")
+    for filename in to_analyze:
+        library.update_analysis(library.get_entry_by_filename(filename).id, RESULT)
+
+    os.utime(data_dir / "crates" / "top.wav", (1, 1))
+    result, to_analyze = ingest_directory(library, str(data_dir / "crates"), input_dir, detect_changes="hash")
+    assert result.skipped == 3
+    assert to_analyze == []
+
+    # A really changed file is hashed once, and that hash is stored
+    changed = data_dir / "crates" / "top.wav"
+    changed.write_bytes(b"new top")
+    with patch("ingest.AnalysisCache.hash_file", wraps=AnalysisCache.hash_file) as hash_file:
+        result, to_analyze = ingest_directory(library, str(data_dir / "crates"), input_dir, detect_changes="hash")
+    assert hash_file.call_count == 1
+    assert to_analyze == [os.path.join("..", "crates", "top.wav")]
+    assert library.get_entry_by_filename(to_analyze[0]).content_hash == AnalysisCache.hash_file(str(changed))
+    library.close()
+
+
+def test_ingested_entries_survive_input_wipe(data_dir):
+    library = LibraryManager(str(data_dir))
+    ingest_directory(library, str(data_dir / "crates"), str(data_dir / "input"))
+    library.add_entry("upload.mp3")
+
+    library.clear_inputs()
+    assert len(library.get_all()) == 3
+    library.close()
+
+
+def test_deleting_an_ingested_input_keeps_the_original_file(data_dir, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    library = LibraryManager(str(data_dir))
+    monkeypatch.setattr(main, "library", library)
+    monkeypatch.setattr(main, "INPUT_DIR", str(data_dir / "input"))
+    ingest_directory(library, str(data_dir / "crates"), str(data_dir / "input"))
+    (data_dir / "input" / "upload.mp3").write_bytes(b"ID3")
+    upload = library.add_entry("upload.mp3")
+    ingested = library.get_entry_by_filename(os.path.join("..", "crates", "top.wav"))
+
+    client = TestClient(main.app)
+    assert client.delete(f"/api/library/{ingested.id}/input").status_code == 200
+    assert (data_dir / "crates" / "top.wav").exists()
+    assert library.get_entry(ingested.id) is None  # Only the library reference goes
+
+    assert client.delete(f"/api/library/{upload.id}/input").status_code == 200
+    assert not (data_dir / "input" / "upload.mp3").exists()
+    library.close()
@@ -0,0 +1,169 @@
+import sys
+import os
+import time
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import JobQueue
+
+
+def test_enqueue_deduplicates_queued_filenames():
+    jobs = JobQueue()
+    assert len(jobs.enqueue(["a.mp3", "b.mp3", "a.mp3"])) == 2
+    assert jobs.enqueue(["a.mp3"]) == []
+
+    job = jobs.claim()
+    jobs.complete(job.id)
+    # Finished jobs can be queued again
+    assert [job.filename for job in jobs.enqueue(["a.mp3"])] == ["a.mp3"]
+
+
+def test_full_analysis_is_not_swallowed_by_a_queued_preview():
+    jobs = JobQueue()
+    preview = jobs.enqueue(["a.mp3", "b.mp3"], preview=True)[0]
+    # A pending preview is upgraded in place, keeping its queue position
+    assert jobs.enqueue(["a.mp3"], priority="interactive") == []
+    upgraded = jobs.get(preview.id)
+    assert not upgraded.preview and upgraded.priority == "interactive"
+    assert jobs.enqueue(["a.mp3"], preview=True) == []
+
+    running = jobs.claim()
+    assert running.filename == "a.mp3" and not running.preview
+    job = jobs.claim()
+    assert job.filename == "b.mp3" and job.preview
+    # A running preview can't be upgraded, so the full analysis queues behind it
+    [full] = jobs.enqueue(["b.mp3"])
+    assert not full.preview
+    assert jobs.enqueue(["b.mp3"]) == []
+
+
+def test_claim_is_fifo_and_marks_running():
+    jobs = JobQueue()
+    jobs.enqueue(["first.mp3", "second.mp3"])
+
+    job = jobs.claim()
+    assert job.filename == "first.mp3"
+    assert job.state == "running"
+    assert job.attempts == 1
+    assert jobs.counts() == {"pending": 1, "running": 1, "done": 0, "failed": 0, "cancelled": 0}
+
+
+def test_retry_backoff_then_failure():
+    jobs = JobQueue(max_attempts=2, backoff_seconds=60)
+    jobs.enqueue(["bad.mp3"])
+
+    job = jobs.fail(jobs.claim().id, "decode error")
+    assert job.state == "pending"
+    assert job.next_attempt_at > time.time() + 50
+    assert jobs.claim() is None  # still backing off
+    assert jobs.next_retry_delay() > 50
+
+    jobs.conn.execute("UPDATE jobs SET next_attempt_at = 0")
+    job = jobs.fail(jobs.claim().id, "decode error")
+    assert job.state == "failed"
+    assert job.error == "decode error"
+    assert jobs.next_retry_delay() is None
+
+
+def test_running_jobs_recovered_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    jobs = JobQueue(path)
+    jobs.enqueue(["a.mp3", "b.mp3"])
+    jobs.claim()
+    jobs.close()  # simulated crash while a.mp3 was running
+
+    reopened = JobQueue(path)
+    assert reopened.counts()["pending"] == 2
+    assert reopened.claim().filename == "a.mp3"
+    # WAL without an fsync per commit, like library.db
+    assert reopened.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert reopened.conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    reopened.close()
+
+
+def test_interactive_priority_and_reordering():
+    jobs = JobQueue()
+    a, b, c = jobs.enqueue(["a.mp3", "b.mp3", "c.mp3"])
+    urgent, = jobs.enqueue(["urgent.mp3"], priority="interactive")
+    assert urgent.priority == "interactive"
+
+    jobs.move(c.id, to="front")
+    jobs.move(a.id, before=b.id)
+    assert [job.filename for job in jobs.list(state="pending")] == ["urgent.mp3", "c.mp3", "a.mp3", "b.mp3"]
+    jobs.move(b.id, priority="interactive")
+    assert [jobs.claim().filename for _ in range(4)] == ["urgent.mp3", "b.mp3", "c.mp3", "a.mp3"]
+    with pytest.raises(ValueError):
+        jobs.move(b.id, to="front")  # Running now
+
+
+def test_move_to_front_of_empty_priority_class():
+    jobs = JobQueue()
+    a, b = jobs.enqueue(["a.mp3", "b.mp3"])
+    moved = jobs.move(b.id, to="front", priority="interactive")
+    assert moved.priority == "interactive"
+    assert [jobs.claim().filename for _ in range(2)] == ["b.mp3", "a.mp3"]
+
+
+def test_cancel_pending_and_running_jobs():
+    jobs = JobQueue()
+    first, second = jobs.enqueue(["a.mp3", "b.mp3"])
+    running = jobs.claim()
+
+    assert jobs.cancel(second.id).state == "cancelled"
+    assert jobs.cancel(running.id).state == "cancelled"
+    jobs.complete(running.id)  # A late result doesn't revive it
+    assert jobs.get(running.id).state == "cancelled"
+    assert jobs.claim() is None
+    assert jobs.cancel(12345) is None
+    # A cancelled file can be queued again
+    assert len(jobs.enqueue(["a.mp3"])) == 1
+
+
+def test_running_limit_per_client():
+    jobs = JobQueue(max_running_per_client=1)
+    jobs.enqueue(["a1.mp3", "a2.mp3"], client="alice")
+    jobs.enqueue(["b1.mp3"], client="bob")
+
+    assert jobs.claim().filename == "a1.mp3"
+    assert jobs.claim().filename == "b1.mp3"  # alice is at her limit
+    assert jobs.claim() is None
+    assert jobs.next_retry_delay() is None  # Nothing claimable, so nothing to wait for
+
+
+def test_scheduling_columns_added_to_old_queue(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "jobs.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL, preview INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL DEFAULT 0,
+            error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("INSERT INTO jobs (filename, state, created_at, updated_at) VALUES ('old.mp3', 'pending', 1, 1)")
+    conn.commit()
+    conn.close()
+
+    jobs = JobQueue(path)
+    jobs.enqueue(["new.mp3"])
+    assert [jobs.claim().filename for _ in range(2)] == ["old.mp3", "new.mp3"]
+    jobs.close()
+
+
+def test_pending_count_and_retention_of_finished_jobs():
+    jobs = JobQueue(retention_seconds=60)
+    _, cancelled, waiting = jobs.enqueue(["done.mp3", "cancelled.mp3", "waiting.mp3"])
+    jobs.complete(jobs.claim().id)
+    jobs.cancel(cancelled.id)
+    assert jobs.pending_count() == 1
+
+    assert jobs.prune() == 0  # Still within the retention window
+    jobs.conn.execute("UPDATE jobs SET updated_at = updated_at - 120")
+    assert jobs.prune() == 2
+    assert [job.id for job in jobs.list()] == [waiting.id]
+    assert JobQueue().prune() == 0  # No retention configured
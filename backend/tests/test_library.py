@@ -0,0 +1,268 @@
+import sys
+import os
+import json
+import sqlite3
+import threading
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library import LibraryManager
+from models import AnalysisResult, LibraryQuery
+
+RESULT = AnalysisResult(
+    bpm=120.0,
+    bpm_confidence=0.9,
+    key_standard="C Major",
+    key_camelot="8B",
+    key_confidence=0.8,
+    duration=180.0
+)
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def library(request, tmp_path):
+    manager = LibraryManager(str(tmp_path), backend=request.param)
+    yield manager
+    manager.close()
+
+
+def test_add_update_and_lookup(library):
+    entry = library.add_entry("song.mp3")
+    library.update_analysis(entry.id, RESULT)
+
+    by_id = library.get_entry(entry.id)
+    assert by_id.status == "completed"
+    assert by_id.analysis.key_camelot == "8B"
+    assert library.get_entry_by_filename("song.mp3").id == entry.id
+    assert library.get_entry_by_filename("missing.mp3") is None
+
+
+def test_entry_removed_once_input_and_output_deleted(library):
+    entry = library.add_entry("song.mp3")
+    library.set_output(entry.id, "8B - song.mp3")
+    library.delete_input(entry.id)
+    assert library.get_entry(entry.id).input_path is None
+
+    library.delete_output(entry.id)
+    assert library.get_entry(entry.id) is None
+
+
+def test_clear_inputs_keeps_processed_entries(library):
+    transient = library.add_entry("a.mp3")
+    processed = library.add_entry("b.mp3")
+    library.set_output(processed.id, "out.mp3")
+
+    library.clear_inputs()
+
+    assert library.get_entry(transient.id) is None
+    assert library.get_entry(processed.id).input_path is None
+    assert [e.id for e in library.get_all()] == [processed.id]
+
+
+def test_changes_survive_reopen(tmp_path):
+    manager = LibraryManager(str(tmp_path))
+    entry = manager.add_entry("song.mp3")
+    manager.update_analysis(entry.id, RESULT)
+    manager.close()
+
+    reopened = LibraryManager(str(tmp_path))
+    assert reopened.get_entry(entry.id).analysis.bpm == 120.0
+    reopened.close()
+
+
+def test_sqlite_migrates_legacy_json_once(tmp_path):
+    legacy = [{
+        "id": "legacy-1",
+        "filename": "old.mp3",
+        "input_path": "old.mp3",
+        "output_path": None,
+        "analysis": RESULT.dict(),
+        "created_at": 1.0,
+        "status": "completed"
+    }]
+    (tmp_path / "library.json").write_text(json.dumps(legacy))
+
+    manager = LibraryManager(str(tmp_path), backend="sqlite")
+    assert manager.get_entry_by_filename("old.mp3").id == "legacy-1"
+    assert not (tmp_path / "library.json").exists()
+    assert (tmp_path / "library.json.migrated").exists()
+    manager.close()
+
+
+def test_json_write_behind_coalesces_flushes(tmp_path):
+    manager = LibraryManager(str(tmp_path), backend="json", flush_interval=60, flush_batch=1000)
+    entry = manager.add_entry("song.mp3")  # first change after start flushes right away
+    for _ in range(10):
+        manager.update_analysis(entry.id, RESULT)
+
+    stats = manager.storage_stats()
+    assert stats["flush_count"] == 1
+    assert stats["pending_changes"] == 10
+
+    manager.close()  # shutdown flushes whatever is still buffered
+    assert manager.storage_stats()["flush_count"] == 2
+    assert not (tmp_path / "library.json.tmp").exists()
+    saved = json.loads((tmp_path / "library.json").read_text())
+    assert saved[0]["status"] == "completed"
+
+
+def test_json_write_behind_flushes_on_batch_size(tmp_path):
+    manager = LibraryManager(str(tmp_path), backend="json", flush_interval=60, flush_batch=5)
+    for i in range(11):
+        manager.add_entry(f"song{i}.mp3")
+
+    assert manager.storage_stats()["flush_count"] == 3
+    manager.close()
+
+
+def test_preview_results_never_replace_full_analysis(library):
+    entry = library.add_entry("song.mp3")
+    preview = RESULT.copy(update={"bpm": 60.0, "preview": True})
+
+    library.update_analysis(entry.id, preview)
+    assert library.get_entry(entry.id).analysis.preview
+
+    library.update_analysis(entry.id, RESULT)
+    assert library.get_entry(entry.id).analysis.bpm == 120.0
+
+    library.update_analysis(entry.id, preview)
+    assert not library.get_entry(entry.id).analysis.preview
+
+
+def add_analysed(library, count=30):
+    entries = []
+    for i in range(count):
+        entry = library.new_entry(
+            f"song{i:02d}.mp3",
+            created_at=1000.0 + i,
+            status="completed" if i % 3 else "uploaded",
+            analysis=RESULT.copy(update={"bpm": 100.0 + i % 10, "key_camelot": f"{i % 12 + 1}A"}) if i % 3 else None,
+        )
+        entries.append(entry)
+    library.save_entries(entries)
+    return entries
+
+
+def collect_pages(library, **filters):
+    query = LibraryQuery(limit=4, **filters)
+    pages = [library.query(query)]
+    while pages[-1].next_cursor:
+        pages.append(library.query(query.copy(update={"cursor": pages[-1].next_cursor})))
+    return [entry for page in pages for entry in page.entries], pages[0].total
+
+
+def test_query_pages_through_filtered_results(library):
+    entries = add_analysed(library)
+    found, total = collect_pages(library, bpm_min=102, bpm_max=105, keys=["3A", "4A", "5A", "6A", "9A"])
+
+    expected = [
+        e for e in entries
+        if e.analysis and 102 <= e.analysis.bpm <= 105 and e.analysis.key_camelot in ("3A", "4A", "5A", "6A", "9A")
+    ]
+    assert [e.id for e in found] == [e.id for e in expected]
+    assert total == len(expected)
+
+
+def test_query_sorts_by_bpm_with_stable_cursor(library):
+    entries = add_analysed(library)
+    found, total = collect_pages(library, sort="bpm", order="desc")
+
+    analysed = [e for e in entries if e.analysis]
+    expected = sorted(analysed, key=lambda e: (e.analysis.bpm, entries.index(e)), reverse=True)
+    assert [e.id for e in found] == [e.id for e in expected]
+    assert total == len(analysed)
+
+
+def test_query_filters_status_and_rejects_bad_input(library):
+    add_analysed(library)
+    page = library.query(LibraryQuery(status="uploaded", limit=100))
+    assert page.total == 10
+    assert all(e.status == "uploaded" for e in page.entries)
+    assert page.next_cursor is None
+
+    with pytest.raises(ValueError):
+        library.query(LibraryQuery(sort="duration"))
+    with pytest.raises(ValueError):
+        library.query(LibraryQuery(cursor="not-a-cursor"))
+
+
+def test_query_indexes_follow_updates(library):
+    entry = library.add_entry("song.mp3")
+    library.update_analysis(entry.id, RESULT)
+    assert library.query(LibraryQuery(keys=["8B"])).total == 1
+
+    library.update_analysis(entry.id, RESULT.copy(update={"key_camelot": "9B", "bpm": 90.0}))
+    assert library.query(LibraryQuery(keys=["8B"])).total == 0
+    assert library.query(LibraryQuery(bpm_max=95)).entries[0].id == entry.id
+
+    etag = library.etag()
+    library.set_output(entry.id, "out.mp3")
+    library.delete_input(entry.id)
+    library.delete_output(entry.id)
+    assert library.query(LibraryQuery(keys=["9B"])).total == 0
+    assert library.etag() != etag
+
+
+def test_sort_and_filename_indexes_follow_changes(library):
+    first = library.add_entry("b.mp3", created_at=2.0)
+    library.add_entry("a.mp3", created_at=3.0)
+    library.add_entry("b.mp3", created_at=1.0)
+    assert library.get_entry_by_filename("b.mp3").id == first.id  # Oldest entry wins
+
+    first.filename = "c.mp3"
+    library.save_entries([first])
+    assert library.get_entry_by_filename("c.mp3").id == first.id
+    assert library.get_entry_by_filename("b.mp3").created_at == 1.0
+    page = library.query(LibraryQuery(sort="filename", order="desc", limit=2))
+    assert [entry.filename for entry in page.entries] == ["c.mp3", "b.mp3"]
+    rest = library.query(LibraryQuery(sort="filename", order="desc", limit=2, cursor=page.next_cursor))
+    assert [entry.filename for entry in rest.entries] == ["a.mp3"] and rest.next_cursor is None
+    assert [entry.created_at for entry in library.query(LibraryQuery()).entries] == [1.0, 2.0, 3.0]
+
+
+def test_sqlite_adds_query_columns_to_existing_libraries(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "library.db"))
+    conn.execute(
+        """
+        CREATE TABLE entries (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, filename TEXT NOT NULL,
+            created_at REAL NOT NULL, status TEXT NOT NULL, data TEXT NOT NULL
+        )
+        """
+    )
+    entry = {"id": "old-1", "filename": "old.mp3", "input_path": "old.mp3", "output_path": None,
+             "analysis": RESULT.dict(), "created_at": 1.0, "status": "completed"}
+    conn.execute("INSERT INTO entries (id, filename, created_at, status, data) VALUES (?, ?, ?, ?, ?)",
+                 ("old-1", "old.mp3", 1.0, "completed", json.dumps(entry)))
+    conn.commit()
+    conn.close()
+
+    manager = LibraryManager(str(tmp_path))
+    assert [e.id for e in manager.query(LibraryQuery(keys=["8B"], bpm_min=120)).entries] == ["old-1"]
+    manager.close()
+
+
+def test_concurrent_updates_of_one_entry_are_not_lost(library):
+    entries = [library.add_entry(f"{i}.mp3") for i in range(200)]
+    start = threading.Barrier(2)
+
+    def analyse():
+        start.wait()
+        for entry in entries:
+            library.update_analysis(entry.id, RESULT)
+
+    def place_outputs():
+        start.wait()
+        for entry in entries:
+            library.set_output(entry.id, f"8B - {entry.filename}")
+
+    threads = [threading.Thread(target=analyse), threading.Thread(target=place_outputs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for entry in entries:
+        stored = library.get_entry(entry.id)
+        assert stored.analysis is not None and stored.status == "completed"
+        assert stored.output_path == f"8B - {entry.filename}"
@@ -0,0 +1,105 @@
+import sys
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from metrics import ANALYSIS_STAGE_SECONDS, JOB_RUN_SECONDS, JOBS_TOTAL, MetricsRegistry, RequestProfiler
+from processor import BatchProcessor
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+    histogram.observe(5.0, route="/a")
+    registry.counter("requests_total", "Requests").inc()
+
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+    assert "requests_total 1" in text
+
+
+def test_serial_analysis_records_stage_timings(tmp_path):
+    (tmp_path / "song.mp3").write_bytes(b"audio")
+    analyzer = MagicMock()
+    analyzer.params.return_value = {}
+    analyzer.analyze_file.return_value = {"bpm": 120.0}
+    analyzer.last_timings = {"decode": 0.2, "rhythm": 0.5}
+    processor = BatchProcessor(str(tmp_path), mode="serial", analyzer=analyzer)
+    before = ANALYSIS_STAGE_SECONDS.count(stage="rhythm")
+
+    assert asyncio.run(processor.process_file("song.mp3")) == {"bpm": 120.0}
+    assert ANALYSIS_STAGE_SECONDS.count(stage="rhythm") == before + 1
+
+
+def test_batch_jobs_record_run_time(tmp_path):
+    processor = BatchProcessor(str(tmp_path), mode="process", workers=2)
+
+    async def fake_analyze(file_path, preview=False, peaks_path=None):
+        return {"bpm": 128.0}
+
+    processor._analyze = fake_analyze
+    runs, done = JOB_RUN_SECONDS.count(), JOBS_TOTAL.get(outcome="done")
+
+    async def run():
+        await processor.add_to_queue(["a.mp3", "b.mp3"])
+        while processor.is_processing:
+            await asyncio.sleep(0.005)
+
+    asyncio.run(run())
+    assert JOB_RUN_SECONDS.count() == runs + 2
+    assert JOBS_TOTAL.get(outcome="done") == done + 2
+
+
+def test_profiler_only_runs_when_enabled():
+    profiler = RequestProfiler()
+    assert profiler.start() is None
+    profiler.enabled = True
+    profile = profiler.start()
+    sum(range(1000))
+    profiler.stop(profile, "GET", "/api/library", 0.01)
+    assert profiler.recent()[0]["path"] == "/api/library"
+    assert "function calls" in profiler.recent()[0]["report"]
+
+
+def test_sync_endpoints_are_profiled_in_their_worker_thread():
+    profiler = RequestProfiler()
+    profiler.enabled = True
+
+    def sync_endpoint_body():
+        return sum(range(1000))
+
+    endpoint = profiler.wrap_sync(sync_endpoint_body)
+    assert endpoint() == 499500  # Not profiled outside a request
+    profile = profiler.start()
+    # Like FastAPI's threadpool: another thread, with the request's context
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(contextvars.copy_context().run, endpoint).result() == 499500
+    profiler.stop(profile, "GET", "/api/library/stats", 0.01)
+    assert "sync_endpoint_body" in profiler.recent()[0]["report"]
+
+
+def test_metrics_endpoint_labels_requests_by_route(app_data):
+    from main import app
+
+    client = TestClient(app)
+    client.delete("/api/library/does-not-exist/input")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/api/library/{id}/input",status="404"' in response.text
+    assert 'jobs{state="pending"}' in response.text
@@ -0,0 +1,119 @@
+import sys
+import os
+import wave
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+import outputs
+from models import AnalysisResult
+
+
+def write_wav(path, seconds=0.1):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\x00\x00" * int(8000 * seconds))
+
+
+def test_output_name_and_unique_path(tmp_path):
+    name = outputs.output_name("song.mp3", "{Camelot} - {BPM} - {OriginalName}", 128.0, "A Minor", "8A")
+    assert name == "8A - 128.0 - song.mp3"
+    assert outputs.unique_path(str(tmp_path), name)[0] == name
+    (tmp_path / name).write_bytes(b"x")
+    assert outputs.unique_path(str(tmp_path), name)[0] == "8A - 128.0 - song_1.mp3"
+
+
+def test_place_hardlinks_only_unmodified_outputs(tmp_path):
+    source = tmp_path / "in.wav"
+    write_wav(source)
+
+    assert outputs.place(str(source), str(tmp_path / "linked.wav")) == "hardlink"
+    assert os.path.samefile(source, tmp_path / "linked.wav")
+
+    assert outputs.place(str(source), str(tmp_path / "tagged.wav"), modify=True) in ("reflink", "copy")
+    assert not os.path.samefile(source, tmp_path / "tagged.wav")
+    assert (tmp_path / "tagged.wav").read_bytes() == source.read_bytes()
+
+
+@pytest.mark.parametrize("hardlinks", [True, False])
+def test_produce_retries_names_taken_concurrently(tmp_path, hardlinks):
+    source = tmp_path / "in.wav"
+    write_wav(source)
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    (output_dir / "song.wav").write_bytes(b"taken")
+    # As if another request created song.wav right after this one checked for it
+    stale = iter([("song.wav", str(output_dir / "song.wav"))])
+    unique_path = outputs.unique_path
+
+    def racing_unique_path(directory, filename):
+        return next(stale, None) or unique_path(directory, filename)
+
+    link = os.link if hardlinks else MagicMock(side_effect=PermissionError("no hardlinks here"))
+    with patch("outputs.unique_path", side_effect=racing_unique_path), patch("outputs.os.link", link):
+        result = outputs.produce(str(source), str(output_dir), "song.wav")
+    assert result["output_filename"] == "song_1.wav"
+    assert result["method"] in (("hardlink",) if hardlinks else ("reflink", "copy"))
+    assert (output_dir / "song.wav").read_bytes() == b"taken"
+    assert (output_dir / "song_1.wav").read_bytes() == source.read_bytes()
+
+
+def test_produce_writes_id3_tags_without_touching_input(tmp_path):
+    pytest.importorskip("mutagen")
+    from mutagen.wave import WAVE
+
+    source = tmp_path / "in.wav"
+    write_wav(source)
+    original = source.read_bytes()
+    (tmp_path / "out").mkdir()
+
+    result = outputs.produce(str(source), str(tmp_path / "out"), "8A - in.wav", (127.6, "F# Minor", "11A"))
+    assert result["tagged"] and result["output_filename"] == "8A - in.wav"
+    tags = WAVE(str(tmp_path / "out" / "8A - in.wav")).tags
+    assert tags["TBPM"].text == ["128"]
+    assert tags["TKEY"].text == ["F#m"]
+    assert tags["TXXX:CAMELOT"].text == ["11A"]
+    assert source.read_bytes() == original
+
+
+def test_failed_tagging_removes_output(tmp_path):
+    pytest.importorskip("mutagen")
+    source = tmp_path / "in.mp3"
+    source.write_bytes(b"not really audio")
+
+    with pytest.raises(ValueError):
+        outputs.produce(str(source), str(tmp_path), "out.mp3", (120.0, "A Minor", "8A"))
+    assert not (tmp_path / "out.mp3").exists()
+
+
+def test_process_batch_endpoint(app_data):
+    pytest.importorskip("mutagen")
+    import main
+
+    input_dir, output_dir = app_data / "input", app_data / "output"
+    write_wav(input_dir / "test_a.wav")
+    analysis = AnalysisResult(bpm=124.0, bpm_confidence=0.9, key_standard="A Minor", key_camelot="8A",
+                              key_confidence=0.8, duration=0.1)
+    analysed = main.library.add_entry("test_a.wav", analysis=analysis)
+    pending = main.library.add_entry("test_b.wav")
+
+    client = TestClient(main.app)
+    response = client.post("/api/process/batch", json={
+        "ids": [analysed.id, pending.id, "missing"], "pattern": "{Camelot} - {OriginalName}", "tags": True,
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert [p["output_filename"] for p in body["processed"]] == ["8A - test_a.wav"]
+    assert body["processed"][0]["tagged"] is True
+    assert {s["id"] for s in body["skipped"]} == {pending.id, "missing"}
+    assert (output_dir / "8A - test_a.wav").exists()
+    assert main.library.get_entry(analysed.id).output_path == "8A - test_a.wav"
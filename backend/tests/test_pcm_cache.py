@@ -0,0 +1,82 @@
+import sys
+import os
+from unittest.mock import MagicMock, patch
+import numpy as np
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import AudioAnalyzer
+from pcm_cache import PCMCache
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    source = tmp_path / "song.mp3"
+    source.write_bytes(b"x" * 10)
+    cache = PCMCache(str(tmp_path / "pcm"), max_bytes=1 << 20)
+    assert cache.get(str(source), 44100) is None
+
+    audio = np.linspace(-1, 1, 1000).astype(np.float32)
+    cache.put(str(source), 44100, audio)
+    cached = cache.get(str(source), 44100)
+    assert isinstance(cached.base, np.memmap)
+    np.testing.assert_array_equal(cached, audio)
+    assert cache.get(str(source), 22050) is None  # Other sample rate
+    assert cache.stats() == {"entries": 1, "bytes": 4000, "max_bytes": 1 << 20}
+
+
+def test_changed_source_misses_and_replaces_old_entry(tmp_path):
+    source = tmp_path / "song.mp3"
+    source.write_bytes(b"x" * 10)
+    cache = PCMCache(str(tmp_path / "pcm"), max_bytes=1 << 20)
+    cache.put(str(source), 44100, np.zeros(100, dtype=np.float32))
+
+    source.write_bytes(b"y" * 20)
+    assert cache.get(str(source), 44100) is None
+    cache.put(str(source), 44100, np.ones(100, dtype=np.float32))
+    assert cache.stats()["entries"] == 1
+    assert cache.get(str(source), 44100)[0] == 1.0
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PCMCache(str(tmp_path / "pcm"), max_bytes=1200)
+    sources = []
+    for i in range(3):
+        source = tmp_path / f"{i}.mp3"
+        source.write_bytes(b"x")
+        sources.append(str(source))
+        cache.put(str(source), 44100, np.zeros(100, dtype=np.float32))  # 400 bytes each
+        os.utime(cache.path_for(str(source), 44100), (i, i))
+
+    cache.get(sources[0], 44100)  # Refreshes the oldest entry
+    cache.max_bytes = 800
+    cache.evict()
+    assert cache.get(sources[1], 44100) is None
+    assert cache.get(sources[0], 44100) is not None
+    assert cache.get(sources[2], 44100) is not None
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+
+
+def test_analyzer_decodes_once(tmp_path):
+    source = tmp_path / "song.mp3"
+    source.write_bytes(b"x" * 10)
+    analyzer = AudioAnalyzer(pcm_cache_dir=str(tmp_path / "pcm"), pcm_cache_max_bytes=1 << 20)
+    audio = np.arange(500, dtype=np.float32)
+
+    with patch("analyzer.es.MonoLoader") as loader:
+        loader.return_value.return_value = audio
+        np.testing.assert_array_equal(analyzer._load(str(source)), audio)
+        np.testing.assert_array_equal(analyzer._load(str(source)), audio)
+    assert loader.call_count == 1
+
+    # Pool workers rebuild the analyzer from config() and share the cache
+    worker = AudioAnalyzer(**analyzer.config())
+    with patch("analyzer.es.MonoLoader") as loader:
+        np.testing.assert_array_equal(worker._load(str(source)), audio)
+    loader.assert_not_called()
+    assert "pcm_cache_dir" not in analyzer.params()  # Doesn't change analysis cache keys
@@ -0,0 +1,159 @@
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock
+import pytest
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processor import BatchProcessor
+from jobs import JobQueue
+
+
+def test_rejects_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        BatchProcessor(str(tmp_path), mode="threads")
+
+
+def test_serial_mode_uses_single_worker(tmp_path):
+    processor = BatchProcessor(str(tmp_path), mode="serial", workers=8)
+    assert processor.workers == 1
+
+
+def test_process_mode_keeps_workers_in_flight(tmp_path):
+    processor = BatchProcessor(str(tmp_path), mode="process", workers=3)
+    peak = {"running": 0, "max": 0}
+
+    async def fake_analyze(file_path, preview=False, peaks_path=None):
+        peak["running"] += 1
+        peak["max"] = max(peak["max"], peak["running"])
+        await asyncio.sleep(0.01)
+        peak["running"] -= 1
+        return {"file": os.path.basename(file_path)}
+
+    processor._analyze = fake_analyze
+    completed = []
+    processor.add_listener(lambda event: event["event"] == "completed" and completed.append(event["filename"]))
+
+    async def run():
+        await processor.add_to_queue([f"song{i}.mp3" for i in range(10)])
+        while processor.is_processing:
+            await asyncio.sleep(0.005)
+
+    asyncio.run(run())
+    assert peak["max"] == 3
+    assert processor.processed_count == 10
+    assert set(completed) == {f"song{i}.mp3" for i in range(10)}
+    assert processor.in_flight == set()
+
+
+def test_subscribers_receive_job_events(tmp_path):
+    (tmp_path / "ok.mp3").write_bytes(b"audio")
+    processor = BatchProcessor(str(tmp_path), mode="process", workers=2, jobs=JobQueue(max_attempts=1))
+
+    async def fake_analyze(file_path, preview=False, peaks_path=None):
+        if file_path.endswith("bad.mp3"):
+            raise RuntimeError("decode error")
+        return {"bpm": 128.0}
+
+    processor._analyze = fake_analyze
+
+    async def run():
+        events = processor.subscribe()
+        await processor.add_to_queue(["ok.mp3", "bad.mp3"])
+        received = []
+        while not received or received[-1]["event"] != "idle":
+            received.append(await asyncio.wait_for(events.get(), timeout=1))
+        processor.unsubscribe(events)
+        return received
+
+    received = asyncio.run(run())
+    kinds = [(event["event"], event["filename"]) for event in received]
+    assert kinds[:2] == [("queued", "ok.mp3"), ("queued", "bad.mp3")]
+    assert ("completed", "ok.mp3") in kinds
+    assert ("failed", "bad.mp3") in kinds
+    completed = next(event for event in received if event["event"] == "completed")
+    assert completed["result"] == {"bpm": 128.0}
+    assert processor.get_status()["failed_count"] == 1
+    assert "results" not in processor.get_status()
+
+
+def test_failed_jobs_are_retried(tmp_path):
+    processor = BatchProcessor(
+        str(tmp_path), mode="process", workers=2, jobs=JobQueue(max_attempts=3, backoff_seconds=0.01)
+    )
+    attempts = []
+
+    async def flaky_analyze(file_path, preview=False, peaks_path=None):
+        attempts.append(file_path)
+        if len(attempts) < 3:
+            raise RuntimeError("temporary failure")
+        return {"bpm": 128.0}
+
+    processor._analyze = flaky_analyze
+
+    async def run():
+        await processor.add_to_queue(["flaky.mp3"])
+        while processor.is_processing:
+            await asyncio.sleep(0.005)
+
+    asyncio.run(run())
+    assert len(attempts) == 3
+    assert processor.jobs.counts()["done"] == 1
+    assert processor.failed_count == 0
+
+
+def test_cancel_queued_and_running_jobs(tmp_path):
+    processor = BatchProcessor(str(tmp_path), mode="process", workers=1)
+    events = []
+    processor.add_listener(lambda event: events.append((event["event"], event.get("filename"))))
+    release = asyncio.Event()
+
+    async def slow_analyze(file_path, preview=False, peaks_path=None):
+        await release.wait()
+        return {"bpm": 120.0}
+
+    processor._analyze = slow_analyze
+
+    async def run():
+        running, queued = await processor.add_to_queue(["running.mp3", "queued.mp3"])
+        while "running.mp3" not in processor.in_flight:
+            await asyncio.sleep(0.001)
+        assert processor.cancel(queued.id).state == "cancelled"
+        assert processor.cancel(running.id).state == "cancelled"
+        while processor.is_processing:
+            await asyncio.sleep(0.001)
+
+    asyncio.run(run())
+    assert ("cancelled", "queued.mp3") in events and ("cancelled", "running.mp3") in events
+    assert processor.processed_count == 0
+    assert processor.jobs.counts()["cancelled"] == 2
+
+
+def test_interactive_analysis_takes_next_free_slot(tmp_path):
+    (tmp_path / "now.mp3").write_bytes(b"audio")
+    processor = BatchProcessor(str(tmp_path), mode="process", workers=2)
+    order = []
+
+    async def fake_analyze(file_path, preview=False, peaks_path=None):
+        await asyncio.sleep(0.01)
+        order.append(os.path.basename(file_path))
+        return {"bpm": 120.0}
+
+    processor._analyze = fake_analyze
+
+    async def run():
+        await processor.add_to_queue([f"batch{i}.mp3" for i in range(6)])
+        await asyncio.sleep(0)
+        await processor.process_file("now.mp3")
+        # The batch only got the other slot while the interactive file ran
+        assert len([name for name in order if name.startswith("batch")]) <= 2
+        while processor.is_processing:
+            await asyncio.sleep(0.005)
+
+    asyncio.run(run())
+    assert processor.processed_count == 6
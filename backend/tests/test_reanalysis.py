@@ -0,0 +1,142 @@
+import sys
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import AudioAnalyzer
+from library import LibraryManager
+from models import AnalysisResult
+from processor import BatchProcessor
+from reanalysis import Reanalyzer
+
+
+def analysis(version=None):
+    return AnalysisResult(bpm=120.0, bpm_confidence=0.9, key_standard="A Minor", key_camelot="8A",
+                          key_confidence=0.7, duration=60.0, analyzer_version=version)
+
+
+def setup(tmp_path, chunk_size=100):
+    input_dir, output_dir = tmp_path / "input", tmp_path / "output"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    library = LibraryManager(str(tmp_path), backend="json")
+    processor = BatchProcessor(str(input_dir), mode="serial")
+    calls = []
+
+    async def fake_analyze_path(file_path):
+        calls.append(os.path.relpath(file_path, tmp_path))
+        return {**analysis().dict(), "bpm": 128.0, "analyzer_version": processor.analyzer.version()}
+
+    processor.analyze_path = fake_analyze_path
+    reanalyzer = Reanalyzer(library, processor, str(input_dir), str(output_dir),
+                            str(tmp_path / "reanalysis.json"), chunk_size=chunk_size)
+    return library, reanalyzer, calls
+
+
+def run(reanalyzer):
+    async def main():
+        reanalyzer.start()
+        await reanalyzer.task
+    asyncio.run(main())
+
+
+def test_only_stale_entries_are_reanalysed_from_input_or_output(tmp_path):
+    library, reanalyzer, calls = setup(tmp_path)
+    current = reanalyzer.processor.analyzer.version()
+    for name in ("current.mp3", "old.mp3"):
+        (tmp_path / "input" / name).write_bytes(b"audio")
+    (tmp_path / "output" / "8A - cleared.mp3").write_bytes(b"audio")
+    entries = {
+        "current": library.add_entry("current.mp3", analysis=analysis(current), status="completed"),
+        "old": library.add_entry("old.mp3", analysis=analysis("0-deadbeef"), status="completed"),
+        "cleared": library.add_entry("cleared.mp3", input_path=None, output_path="8A - cleared.mp3",
+                                     analysis=analysis(), status="completed"),
+        "missing": library.add_entry("missing.mp3", analysis=analysis(), status="completed"),
+        "queued": library.add_entry("queued.mp3", analysis=analysis(), status="pending"),
+        "new": library.add_entry("new.mp3"),
+    }
+
+    run(reanalyzer)
+    assert calls == ["input/old.mp3", "output/8A - cleared.mp3"]
+    status = reanalyzer.status()
+    assert status["state"] == "done" and status["analyzer_version"] == current
+    assert (status["checked"], status["reanalysed"], status["skipped"], status["failed"]) == (6, 2, 1, 0)
+    for name in ("old", "cleared"):
+        updated = library.get_entry(entries[name].id).analysis
+        assert updated.bpm == 128.0 and updated.analyzer_version == current
+    assert library.get_entry(entries["missing"].id).analysis.analyzer_version is None
+
+    # Everything is current now, so a new run has nothing to do
+    run(reanalyzer)
+    assert len(calls) == 2
+
+
+def test_library_work_runs_on_the_given_executor(tmp_path):
+    library, reanalyzer, calls = setup(tmp_path)
+    (tmp_path / "input" / "old.mp3").write_bytes(b"audio")
+    library.add_entry("old.mp3", analysis=analysis("0-deadbeef"), status="completed")
+    threads = []
+    for name in ("query", "update_analysis"):
+        method = getattr(library, name)
+
+        def record(*args, method=method):
+            threads.append(threading.current_thread().name)
+            return method(*args)
+
+        setattr(library, name, record)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="io") as executor:
+        reanalyzer.executor = executor
+        run(reanalyzer)
+    assert calls == ["input/old.mp3"]
+    assert threads and all(name.startswith("io") for name in threads)
+
+
+def test_pause_checkpoints_and_resumes_in_a_new_process(tmp_path):
+    library, reanalyzer, calls = setup(tmp_path, chunk_size=2)
+    for i in range(5):
+        (tmp_path / "input" / f"{i}.mp3").write_bytes(b"audio")
+        library.add_entry(f"{i}.mp3", analysis=analysis(), status="completed", created_at=float(i))
+
+    analyze = reanalyzer.processor.analyze_path
+
+    async def pausing_analyze(file_path):
+        result = await analyze(file_path)
+        if len(calls) == 3:
+            asyncio.get_running_loop().create_task(reanalyzer.pause())
+        return result
+
+    reanalyzer.processor.analyze_path = pausing_analyze
+    run(reanalyzer)
+    assert reanalyzer.status()["state"] == "paused"
+    assert calls == ["input/0.mp3", "input/1.mp3", "input/2.mp3"]
+
+    # A fresh instance (e.g. after a restart) continues from the last completed page
+    resumed = Reanalyzer(library, reanalyzer.processor, str(tmp_path / "input"), str(tmp_path / "output"),
+                         str(tmp_path / "reanalysis.json"), chunk_size=2)
+    reanalyzer.processor.analyze_path = analyze
+    assert resumed.status()["state"] == "paused"
+    run(resumed)
+    assert calls == ["input/0.mp3", "input/1.mp3", "input/2.mp3", "input/3.mp3", "input/4.mp3"]
+    assert resumed.status()["state"] == "done"
+    assert resumed.status()["reanalysed"] == 5
+
+
+def test_cpu_budget_and_versions(tmp_path):
+    library, reanalyzer, _ = setup(tmp_path)
+    reanalyzer.cpu_budget = 0.25
+    assert reanalyzer.throttle_delay(1.0) == 3.0  # Busy a quarter of the time
+
+    budgeted = Reanalyzer(library, reanalyzer.processor, "", "", str(tmp_path / "other.json"), cpu_budget=1.5)
+    assert budgeted.slots == 2 and budgeted.throttle_delay(3.0) == 1.0
+
+    assert AudioAnalyzer(silence_threshold=-50).version() != AudioAnalyzer().version()
+    assert AudioAnalyzer().version() == AudioAnalyzer().version()
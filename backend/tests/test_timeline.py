@@ -0,0 +1,128 @@
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock, patch
+import numpy as np
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import AudioAnalyzer
+from cache import AnalysisCache
+from processor import BatchProcessor
+import timeline
+
+
+def test_round_trip_is_delta_encoded():
+    beats = np.arange(0, 60, 0.5)
+    tempo = timeline.tempo_curve(beats + 1.0, 61.0)
+    segments = [(0, "A Minor", 0.7), (44100 * 30, "C Major", 0.5)]
+    data = timeline.encode(beats, tempo, segments, 44100, offset=44100)
+    # Header, then 4 bytes per beat, 2 per tempo point and 6 per key segment
+    assert len(data) == 28 + 4 * len(beats) + 2 * len(tempo) + 6 * 2
+
+    decoded = timeline.decode(data)
+    np.testing.assert_allclose(decoded["beats"], beats + 1.0, atol=1 / 44100)
+    assert decoded["tempo_step"] == timeline.TEMPO_STEP_SECONDS
+    assert list(decoded["tempo"]) == [120.0] * len(tempo)
+    assert decoded["key_segments"] == [
+        {"start": 1.0, "key_standard": "A Minor", "key_camelot": "8A", "strength": 0.698},
+        {"start": 31.0, "key_standard": "C Major", "key_camelot": "8B", "strength": 0.502},
+    ]
+
+
+def test_tempo_curve_follows_drift():
+    beats = np.concatenate([np.arange(0, 10, 0.5), np.arange(10, 20, 0.4)])  # 120 then 150 BPM
+    curve = timeline.tempo_curve(beats, 20.0, step=5.0)
+    np.testing.assert_allclose(curve, [120, 120, 150, 150])
+    assert list(timeline.tempo_curve([], 12.0, step=5.0)) == [0, 0, 0]
+
+
+def test_key_segments_merge_equal_neighbours():
+    keys = iter([("A", "minor", 0.6), ("A", "minor", 0.8), ("C", "major", 0.5)])
+    extract = MagicMock(side_effect=lambda audio: next(keys))
+    audio = np.zeros(100 * 10, dtype=np.float32)  # 10 s at 100 Hz, so 3 s windows: 0, 3, 6 (+1 s folded)
+    segments = timeline.key_segments(audio, 100, extract, seconds=3)
+    assert [(start, name) for start, name, _ in segments] == [(0, "A Minor"), (600, "C Major")]
+    assert abs(segments[0][2] - 0.7) < 1e-9
+    assert len(extract.call_args_list[-1][0][0]) == 400
+
+
+def test_full_analysis_writes_timeline_on_track_timeline(tmp_path):
+    audio = np.zeros(44100 * 70, dtype=np.float32)
+    ticks = np.arange(0, 68, 0.5)
+    algorithms = {
+        "silence": MagicMock(return_value=(1.0, 69.0)),
+        "rhythm": MagicMock(return_value=(120.0, ticks, 3.5, None, None)),
+        "key": MagicMock(side_effect=[("A", "minor", 0.7), ("A", "minor", 0.7), ("E", "minor", 0.6)]),
+    }
+    path = str(tmp_path / "song.timeline")
+
+    with patch("analyzer.es.MonoLoader", return_value=lambda: audio), \
+            patch.object(AudioAnalyzer, "_build_algorithms", return_value=algorithms):
+        analyzer = AudioAnalyzer()
+        result = analyzer.analyze_file("song.mp3", timeline_path=path)
+
+    assert result["key_camelot"] == "8A"
+    assert "timeline" in analyzer.last_timings
+    with open(path, "rb") as f:
+        decoded = timeline.decode(f.read())
+    # Beats and segments are shifted past the trimmed second of silence
+    assert decoded["beats"][0] == 1.0 and len(decoded["beats"]) == len(ticks)
+    assert [(s["start"], s["key_camelot"]) for s in decoded["key_segments"]] == [(1.0, "8A"), (31.0, "9A")]
+    assert decoded["tempo"][0] == 120.0
+
+
+def test_processor_attaches_timeline_to_full_results_only(tmp_path):
+    upload_dir = tmp_path / "input"
+    upload_dir.mkdir()
+    (upload_dir / "song.mp3").write_bytes(b"audio")
+    timeline_dir = str(tmp_path / "timeline")
+    cache = AnalysisCache(str(tmp_path / "cache.json"))
+    processor = BatchProcessor(str(upload_dir), mode="serial", cache=cache, timeline_dir=timeline_dir)
+    calls = []
+
+    async def fake_analyze(file_path, preview=False, peaks_path=None, timeline_path=None):
+        calls.append(timeline_path)
+        if timeline_path:
+            os.makedirs(timeline_dir, exist_ok=True)
+            with open(timeline_path, "wb") as f:
+                f.write(timeline.encode([0.5], [120.0], [(0, "A Minor", 0.7)], 44100))
+        return {"bpm": 120.0}
+
+    processor._analyze = fake_analyze
+    content_hash = AnalysisCache.hash_file(str(upload_dir / "song.mp3"))
+
+    assert "timeline" not in asyncio.run(processor.process_file("song.mp3", preview=True))
+    result = asyncio.run(processor.process_file("song.mp3"))
+    assert result["timeline"] == content_hash
+    assert calls == [None, timeline.timeline_path(timeline_dir, content_hash)]
+
+    asyncio.run(processor.process_file("song.mp3"))
+    assert len(calls) == 2  # Cache hit
+    os.remove(calls[1])
+    asyncio.run(processor.process_file("song.mp3"))
+    assert len(calls) == 3  # Timeline gone, so analysed again
+
+
+def test_timeline_endpoint(app_data):
+    from fastapi.testclient import TestClient
+    from main import app
+    import waveform
+
+    timeline_id = "cd" * 32
+    path = timeline.timeline_path(str(app_data / "timeline"), timeline_id)
+    data = timeline.encode([0.5, 1.0], [120.0], [(0, "F# Minor", 0.9)], 44100)
+    waveform.write(path, data)
+    client = TestClient(app)
+    response = client.get(f"/api/timeline/{timeline_id}")
+    assert response.status_code == 200 and response.content == data
+
+    decoded = client.get(f"/api/timeline/{timeline_id}", params={"format": "json"}).json()
+    assert decoded["beats"] == [0.5, 1.0]
+    assert decoded["key_segments"][0]["key_camelot"] == "11A"
+    assert client.get(f"/api/timeline/{timeline_id}", params={"format": "xml"}).status_code == 400
+    assert client.get(f"/api/timeline/{'ef' * 32}").status_code == 404
@@ -0,0 +1,163 @@
+import sys
+import os
+import io
+import asyncio
+import tarfile
+import zipfile
+import pytest
+from unittest.mock import MagicMock
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from cache import AnalysisCache
+from uploads import CHUNK_SIZE, InvalidAudioError, UploadWriter, extract_archive, save_upload, sniff_audio
+
+WAV_HEADER = b"RIFF\x24\x00\x00\x00WAVEfmt "
+
+
+def chunks(*parts):
+    async def generate():
+        for part in parts:
+            yield part
+    return generate()
+
+
+def test_sniff_audio_formats():
+    assert sniff_audio(b"ID3\x04\x00\x00\x00\x00\x00\x00\x00\x00") == "mp3"
+    assert sniff_audio(b"\xff\xfb\x90\x00") == "mp3"
+    assert sniff_audio(b"\xff\xf1\x50\x80") == "aac"
+    assert sniff_audio(WAV_HEADER) == "wav"
+    assert sniff_audio(b"fLaC\x00\x00\x00\x22") == "flac"
+    assert sniff_audio(b"\x00\x00\x00\x20ftypM4A ") == "m4a"
+    assert sniff_audio(b"<html><body>") is None
+
+
+def test_writer_hashes_like_cache(tmp_path):
+    content = WAV_HEADER + os.urandom(CHUNK_SIZE * 2 + 123)
+    path = tmp_path / "song.wav"
+    parts = [content[i:i + 70000] for i in range(0, len(content), 70000)]
+
+    writer = asyncio.run(save_upload(chunks(*parts), str(path)))
+    assert writer.format == "wav"
+    assert writer.size == len(content)
+    assert path.read_bytes() == content
+    assert writer.content_hash == AnalysisCache.hash_file(str(path))
+    assert [p.name for p in tmp_path.iterdir()] == ["song.wav"]
+    umask = os.umask(0)
+    os.umask(umask)
+    assert path.stat().st_mode & 0o777 == 0o666 & ~umask
+
+
+def test_non_audio_rejected_before_writing(tmp_path):
+    writer = UploadWriter(str(tmp_path / "evil.mp3"))
+    with pytest.raises(InvalidAudioError):
+        writer.write(b"#!/bin/sh\nrm -rf /\n")
+    assert os.path.getsize(writer.tmp_path) == 0
+    writer.abort()
+    assert list(tmp_path.iterdir()) == []
+
+    with pytest.raises(InvalidAudioError):
+        asyncio.run(save_upload(chunks(b"ab"), str(tmp_path / "short.mp3")))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stream_upload_endpoint(app_data):
+    import main
+
+    input_dir = app_data / "input"
+    client = TestClient(main.app)
+    content = b"ID3" + b"\x00" * 5000
+
+    response = client.put("/api/upload/..%5Ctest_stream.mp3", content=content)
+    assert response.status_code == 200
+    entry = response.json()
+    assert entry["filename"] == "test_stream.mp3"
+    assert entry["file_size"] == len(content)
+    assert entry["content_hash"] == AnalysisCache.hash_file(str(input_dir / "test_stream.mp3"))
+
+    response = client.put("/api/upload/test_notes.mp3", content=b"not audio at all")
+    assert response.status_code == 415
+    assert not (input_dir / "test_notes.mp3").exists()
+    # A rejected upload doesn't clear the inputs already there
+    assert (input_dir / "test_stream.mp3").exists()
+    assert main.library.get_entry(entry["id"]) is not None
+
+
+def test_extract_archive_streams_audio_members(tmp_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in [("set/a.mp3", b"ID3a"), ("set/notes.txt", b"hi"), ("b.mp3", b"oops"), ("x/a.mp3", b"ID3b")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    claimed = set()
+
+    def claim(name):
+        if name in claimed:
+            return False
+        claimed.add(name)
+        return True
+
+    saved, rejected = extract_archive(buffer, "set.tar.gz", str(tmp_path), [".mp3"], claim)
+    assert [name for name, _ in saved] == ["a.mp3"]
+    assert (tmp_path / "a.mp3").read_bytes() == b"ID3a"
+    assert [name for name, _ in rejected] == ["b.mp3", "a.mp3"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.mp3"]
+
+
+def test_corrupt_archive_member_is_rejected_without_leftovers(tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("good.mp3", b"ID3" + os.urandom(5000))
+        archive.writestr("bad.mp3", b"ID3" + os.urandom(5000))
+    data = bytearray(buffer.getvalue())
+    with zipfile.ZipFile(io.BytesIO(bytes(data))) as archive:
+        info = archive.getinfo("bad.mp3")
+    start = info.header_offset + 30 + len(info.filename) + len(info.extra)
+    data[start + 100:start + 200] = b"\x00" * 100  # Corrupt the deflate stream mid-member
+
+    saved, rejected = extract_archive(io.BytesIO(bytes(data)), "set.zip", str(tmp_path), [".mp3"], lambda name: True)
+    assert [name for name, _ in saved] == ["good.mp3"]
+    assert [name for name, _ in rejected] == ["bad.mp3"]
+    assert [p.name for p in tmp_path.iterdir()] == ["good.mp3"]
+
+
+def test_batch_upload_endpoint(app_data, monkeypatch):
+    import main
+
+    input_dir = app_data / "input"
+    queued = []
+
+    async def fake_add_to_queue(filenames, preview=False, priority="batch", client=None):
+        queued.extend(filenames)
+        return filenames
+
+    monkeypatch.setattr(main.processor, "add_to_queue", fake_add_to_queue)
+    (input_dir / "test_keep.mp3").write_bytes(b"ID3keep")
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("crate/test_zip1.flac", b"fLaC" + b"\x00" * 100)
+        z.writestr("crate/cover.jpg", b"\xff\xd8")
+    client = TestClient(main.app)
+
+    response = client.post("/api/upload/batch", files=[
+        ("files", ("test_one.mp3", b"ID3" + b"\x00" * 100, "audio/mpeg")),
+        ("files", ("test_two.wav", WAV_HEADER + b"\x00" * 100, "audio/wav")),
+        ("files", ("test_bad.mp3", b"plain text", "audio/mpeg")),
+        ("files", ("test_crate.zip", archive.getvalue(), "application/zip")),
+    ])
+    assert response.status_code == 200
+    result = response.json()
+    names = sorted(entry["filename"] for entry in result["entries"])
+    assert names == ["test_one.mp3", "test_two.wav", "test_zip1.flac"]
+    assert all(entry["status"] == "pending" and entry["content_hash"] for entry in result["entries"])
+    assert [r["filename"] for r in result["rejected"]] == ["test_bad.mp3"]
+    assert result["queued"] == 3 and sorted(queued) == names
+    # The batch endpoint doesn't wipe the input directory
+    assert (input_dir / "test_keep.mp3").exists()
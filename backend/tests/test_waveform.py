@@ -0,0 +1,89 @@
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock
+import numpy as np
+
+# Mock essentia before importing modules that use it
+sys.modules.setdefault("essentia", MagicMock())
+sys.modules.setdefault("essentia.standard", MagicMock())
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import waveform
+from cache import AnalysisCache
+from processor import BatchProcessor
+
+
+def test_encode_decode_round_trip():
+    audio = np.zeros(44100 * 3, dtype=np.float32)
+    audio[1000] = 1.0
+    audio[70000] = -0.5
+
+    peaks = waveform.decode(waveform.encode_audio(audio, 44100))
+    assert peaks["sample_rate"] == 44100
+    assert peaks["total_samples"] == len(audio)
+    windows = [level["samples_per_peak"] for level in peaks["levels"]]
+    assert windows == [512, 2048, 8192]
+
+    finest = peaks["levels"][0]["peaks"]
+    assert len(finest) == -(-len(audio) // 512)
+    assert finest[1000 // 512].tolist() == [0, 127]
+    assert finest[70000 // 512].tolist() == [-64, 0]
+    # Coarser levels keep the extremes
+    assert peaks["levels"][2]["peaks"][:, 1].max() == 127
+    assert peaks["levels"][2]["peaks"][:, 0].min() == -64
+
+
+def test_windows_line_up_across_sample_rates():
+    assert waveform.samples_per_peak(44100) == 512
+    assert waveform.samples_per_peak(11025) == 128
+
+
+def test_processor_writes_peaks_and_reuses_them_from_cache(tmp_path):
+    upload_dir = tmp_path / "input"
+    upload_dir.mkdir()
+    (upload_dir / "song.mp3").write_bytes(b"audio")
+    peaks_dir = str(tmp_path / "peaks")
+    cache = AnalysisCache(str(tmp_path / "cache.json"))
+    processor = BatchProcessor(str(upload_dir), mode="serial", cache=cache, peaks_dir=peaks_dir)
+    calls = []
+
+    async def fake_analyze(file_path, preview=False, peaks_path=None, timeline_path=None):
+        calls.append(peaks_path)
+        waveform.write(peaks_path, waveform.encode_audio(np.zeros(4096, dtype=np.float32), 44100))
+        return {"bpm": 120.0}
+
+    processor._analyze = fake_analyze
+    content_hash = AnalysisCache.hash_file(str(upload_dir / "song.mp3"))
+
+    result = asyncio.run(processor.process_file("song.mp3"))
+    assert result["waveform"] == content_hash
+    assert calls == [waveform.peaks_path(peaks_dir, content_hash)]
+
+    asyncio.run(processor.process_file("song.mp3"))
+    assert len(calls) == 1  # Cache hit
+
+    # Without its peaks file the cached result is analysed again
+    os.remove(calls[0])
+    asyncio.run(processor.process_file("song.mp3"))
+    assert len(calls) == 2
+    assert os.path.exists(calls[0])
+
+
+def test_peaks_endpoint_serves_cacheable_binary(app_data):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    peaks_id = "ab" * 32
+    data = waveform.encode_audio(np.zeros(4096, dtype=np.float32), 44100)
+    waveform.write(waveform.peaks_path(str(app_data / "peaks"), peaks_id), data)
+    client = TestClient(app)
+    response = client.get(f"/api/peaks/{peaks_id}")
+    assert response.status_code == 200
+    assert response.content == data
+    assert "immutable" in response.headers["cache-control"]
+
+    cached = client.get(f"/api/peaks/{peaks_id}", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get("/api/peaks/..%2Flibrary.db").status_code == 404
@@ -0,0 +1,140 @@
+"""
+Extended analysis outputs taken from the analyzer's full pass: the beat grid,
+a tempo curve showing drift over the track, and key per segment for tracks
+that change key. Mixing tools fetch them lazily instead of re-analysing.
+
+Timeline files are keyed by the audio content hash and use a small binary
+format (all little-endian). Positions are sample offsets on the untrimmed
+track, the same timeline as the waveform peaks:
+
+    header   "TMLN", u8 version (1), u8 reserved, u16 reserved, u32 sample rate,
+             u32 beat count, u32 tempo point count, f32 seconds per tempo point,
+             u32 key segment count
+    beats    beat count x u32: samples since the previous beat (the first
+             since the track start)
+    tempo    tempo point count x i16: change in centi-BPM from the previous
+             point (the first from 0); 0 BPM means no beats in that window
+    keys     key segment count x (u32 samples since the previous segment
+             start, u8 pitch class * 2 + 1 if major, u8 strength * 255)
+"""
+import os
+import struct
+from typing import Callable, List, Sequence, Tuple
+import numpy as np
+import camelot
+
+MAGIC = b"TMLN"
+VERSION = 1
+TEMPO_STEP_SECONDS = 5.0
+KEY_SEGMENT_SECONDS = 30.0
+KEY_NAMES = ("C", "C#", "D", "Eb", "E", "F", "F#", "G", "Ab", "A", "Bb", "B")
+PITCH_CLASSES = {
+    "C": 0, "C#": 1, "Db": 1, "D": 2, "D#": 3, "Eb": 3, "E": 4, "F": 5, "F#": 6, "Gb": 6,
+    "G": 7, "G#": 8, "Ab": 8, "A": 9, "A#": 10, "Bb": 10, "B": 11,
+}
+
+_HEADER = struct.Struct("<4sBBHIIIfI")
+_SEGMENT = np.dtype([("start", "<u4"), ("key", "u1"), ("strength", "u1")])
+
+def timeline_path(timeline_dir: str, content_hash: str) -> str:
+    return os.path.join(timeline_dir, f"{content_hash}.timeline")
+
+def tempo_curve(beats: Sequence[float], duration: float, step: float = TEMPO_STEP_SECONDS) -> np.ndarray:
+    """Local BPM per `step`-second window: the median of the beat intervals ending in it (0 if none)."""
+    beats = np.asarray(beats, dtype=np.float64)
+    curve = np.zeros(max(1, int(np.ceil(duration / step))), dtype=np.float32)
+    if len(beats) < 2:
+        return curve
+    intervals = np.diff(beats)
+    valid = intervals > 0
+    local_bpm = 60.0 / intervals[valid]
+    windows = np.minimum((beats[1:][valid] // step).astype(np.int64), len(curve) - 1)
+    for window in np.unique(windows):
+        curve[window] = np.median(local_bpm[windows == window])
+    return curve
+
+def key_segments(audio: np.ndarray, sample_rate: int, extract: Callable[[np.ndarray], tuple],
+                 seconds: float = KEY_SEGMENT_SECONDS) -> List[Tuple[int, str, float]]:
+    """
+    Runs `extract` (KeyExtractor: audio -> key, scale, strength) on consecutive
+    `seconds`-long windows and merges neighbours with the same key. Returns
+    (start sample, "A Minor", strength) per segment, strength being the mean
+    over its windows. A short last window is folded into the one before it.
+    """
+    length = max(1, int(seconds * sample_rate))
+    starts = list(range(0, len(audio), length))
+    if len(starts) > 1 and len(audio) - starts[-1] < length // 2:
+        starts.pop()
+    segments: List[Tuple[int, str, float]] = []
+    counts: List[int] = []
+    for index, start in enumerate(starts):
+        end = starts[index + 1] if index + 1 < len(starts) else len(audio)
+        key, scale, strength = extract(audio[start:end])
+        name = f"{key} {scale.capitalize()}"
+        if segments and segments[-1][1] == name:
+            first, _, total = segments[-1]
+            segments[-1] = (first, name, total + float(strength))
+            counts[-1] += 1
+        else:
+            segments.append((start, name, float(strength)))
+            counts.append(1)
+    return [(start, name, total / count) for (start, name, total), count in zip(segments, counts)]
+
+def _key_code(name: str) -> int:
+    key, _, scale = name.partition(" ")
+    return PITCH_CLASSES.get(key, 0) * 2 + (1 if scale.lower() == "major" else 0)
+
+def encode(beats: Sequence[float], tempo: Sequence[float], segments: Sequence[Tuple[int, str, float]],
+           sample_rate: int, offset: int = 0, tempo_step: float = TEMPO_STEP_SECONDS) -> bytes:
+    """
+    Builds a timeline file. `beats` are in seconds and `segments` start in
+    samples, both relative to a point `offset` samples into the track (where
+    silence trimming started).
+    """
+    positions = offset + np.round(np.asarray(beats, dtype=np.float64) * sample_rate).astype(np.int64)
+    beat_deltas = np.diff(np.maximum.accumulate(positions), prepend=0).astype("<u4")
+    # Capped at 327.67 BPM so every delta fits an i16
+    centi_bpm = np.clip(np.round(np.asarray(tempo, dtype=np.float64) * 100), 0, 32767).astype(np.int64)
+    tempo_deltas = np.diff(centi_bpm, prepend=0).astype("<i2")
+    keys = np.zeros(len(segments), dtype=_SEGMENT)
+    starts = np.array([offset + start for start, _, _ in segments], dtype=np.int64)
+    keys["start"] = np.diff(starts, prepend=0)
+    keys["key"] = [_key_code(name) for _, name, _ in segments]
+    keys["strength"] = [int(round(min(max(strength, 0.0), 1.0) * 255)) for _, _, strength in segments]
+    header = _HEADER.pack(MAGIC, VERSION, 0, 0, sample_rate, len(beat_deltas), len(tempo_deltas),
+                          tempo_step, len(keys))
+    return header + beat_deltas.tobytes() + tempo_deltas.tobytes() + keys.tobytes()
+
+def decode(data: bytes) -> dict:
+    """
+    Parses a timeline file into {"sample_rate", "beats" (seconds), "tempo_step",
+    "tempo" (BPM per window), "key_segments": [{"start", "key_standard",
+    "key_camelot", "strength"}]}.
+    """
+    magic, version, _, _, sample_rate, beat_count, tempo_count, tempo_step, key_count = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a supported timeline file")
+    offset = _HEADER.size
+    beat_deltas = np.frombuffer(data, dtype="<u4", count=beat_count, offset=offset)
+    offset += beat_deltas.nbytes
+    tempo_deltas = np.frombuffer(data, dtype="<i2", count=tempo_count, offset=offset)
+    offset += tempo_deltas.nbytes
+    keys = np.frombuffer(data, dtype=_SEGMENT, count=key_count, offset=offset)
+
+    names = [f"{KEY_NAMES[code // 2]} {'Major' if code % 2 else 'Minor'}" for code in keys["key"].tolist()]
+    starts = np.cumsum(keys["start"], dtype=np.int64) / sample_rate
+    return {
+        "sample_rate": sample_rate,
+        "beats": np.cumsum(beat_deltas, dtype=np.int64) / sample_rate,
+        "tempo_step": tempo_step,
+        "tempo": np.cumsum(tempo_deltas, dtype=np.int64) / 100.0,
+        "key_segments": [
+            {
+                "start": float(starts[i]),
+                "key_standard": names[i],
+                "key_camelot": camelot.STANDARD_TO_CAMELOT.get(names[i], "Unknown"),
+                "strength": round(keys["strength"][i] / 255.0, 3),
+            }
+            for i in range(key_count)
+        ],
+    }
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import os
+import tarfile
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import Executor
+from typing import AsyncIterator, BinaryIO, Callable, Iterable, List, Optional, Tuple
+
+# Enough to recognise every supported container from its first bytes
+HEADER_BYTES = 12
+# Uploads are buffered and written in chunks of this size
+CHUNK_SIZE = 1024 * 1024
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+# Corrupt or truncated archive data, and failed writes of a member
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError, OSError)
+# Read once: os.umask() can only be queried by setting it, which isn't thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+class InvalidAudioError(ValueError):
+    pass
+
+def sniff_audio(header: bytes) -> Optional[str]:
+    """Identifies an audio container from its leading bytes; None if it isn't one we decode."""
+    if header.startswith(b"ID3"):
+        return "mp3"
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        # MPEG audio frame sync (MP3 without ID3 tag) or ADTS AAC
+        return "aac" if header[1] & 0x06 == 0 else "mp3"
+    if header.startswith(b"RIFF") and header[8:12] == b"WAVE":
+        return "wav"
+    if header.startswith(b"fLaC"):
+        return "flac"
+    if header.startswith(b"FORM") and header[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if header.startswith(b"OggS"):
+        return "ogg"
+    if header[4:8] == b"ftyp":
+        return "m4a"
+    if header.startswith(b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"):
+        return "wma"
+    return None
+
+class UploadWriter:
+    """
+    Writes an upload to disk in one pass: chunks are buffered into CHUNK_SIZE
+    writes while a SHA-256 of the content (the same hash AnalysisCache uses) is
+    computed along the way. The header is checked as soon as the first bytes
+    arrive, so a non-audio upload fails before anything is written.
+    Data goes to a temp file next to `path` that only replaces it on finish().
+
+    write() only buffers and hashes; async callers run flush() (the blocking
+    disk write) off the event loop whenever `flush_due` is set.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.format: Optional[str] = None
+        self.content_hash: Optional[str] = None
+        self.buffer = bytearray()
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".upload-")
+        # mkstemp creates the file owner-only; uploads get the usual umask-based mode
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        """Buffers a chunk; raises InvalidAudioError once the header is known not to be audio."""
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+        self.buffer += chunk
+        if self.format is None and len(self.buffer) >= HEADER_BYTES:
+            self._check_header()
+
+    @property
+    def flush_due(self) -> bool:
+        return len(self.buffer) >= CHUNK_SIZE
+
+    def _check_header(self):
+        self.format = sniff_audio(bytes(self.buffer[:HEADER_BYTES]))
+        if self.format is None:
+            raise InvalidAudioError("File is not a supported audio format")
+
+    def flush(self):
+        if self.buffer and self.format is not None:
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+
+    def finish(self) -> str:
+        """Moves the complete upload into place and returns its content hash."""
+        if self.format is None:
+            self._check_header()  # Shorter than HEADER_BYTES
+        self.flush()
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        self.content_hash = self.hasher.hexdigest()
+        return self.content_hash
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+async def save_upload(chunks: AsyncIterator[bytes], path: str, executor: Optional[Executor] = None) -> UploadWriter:
+    """
+    Streams `chunks` to `path` through an UploadWriter, with disk writes on
+    `executor` (the loop's default one if None). Returns the finished writer (size, format, content_hash);
+    on any error, including InvalidAudioError, nothing is left on disk.
+    """
+    loop = asyncio.get_running_loop()
+    writer = UploadWriter(path)
+    try:
+        async for chunk in chunks:
+            writer.write(chunk)
+            if writer.flush_due:
+                await loop.run_in_executor(executor, writer.flush)
+        await loop.run_in_executor(executor, writer.finish)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer
+
+def copy_upload(source: BinaryIO, path: str) -> UploadWriter:
+    """Blocking counterpart of save_upload for file-like sources (e.g. archive members)."""
+    writer = UploadWriter(path)
+    try:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+            if writer.flush_due:
+                writer.flush()
+        writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+    return writer
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def _archive_members(source: BinaryIO, filename: str) -> Iterable[Tuple[str, Callable[[], BinaryIO]]]:
+    # Yields (member name, opener) for regular files. Tars are read as a
+    # stream ("r|*"), so each member must be consumed before the next one.
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield info.filename, lambda info=info: archive.open(info)
+    else:
+        with tarfile.open(fileobj=source, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, lambda member=member: archive.extractfile(member)
+
+def extract_archive(source: BinaryIO, filename: str, dest_dir: str, extensions: Iterable[str],
+                    claim: Callable[[str], bool]) -> Tuple[List[Tuple[str, UploadWriter]], List[Tuple[str, str]]]:
+    """
+    Streams the audio files out of a zip/tar archive into `dest_dir`, flattening
+    member paths to their basename and validating each like a direct upload.
+    `claim(name)` must return False for names already taken by this batch.
+    Returns (saved [(name, writer)], rejected [(name, reason)]). A member that
+    can't be read or written is rejected and leaves nothing behind; if the
+    archive itself breaks off, the members saved before that are still returned.
+    """
+    extensions = tuple(extensions)
+    saved, rejected = [], []
+    try:
+        for member_name, open_member in _archive_members(source, filename):
+            name = os.path.basename(member_name.replace("\\", "/"))
+            if name.startswith(".") or not name.lower().endswith(extensions):
+                continue
+            if not claim(name):
+                rejected.append((name, "Duplicate filename in upload"))
+                continue
+            try:
+                with open_member() as member:
+                    saved.append((name, copy_upload(member, os.path.join(dest_dir, name))))
+            except InvalidAudioError as e:
+                rejected.append((name, str(e)))
+            except ARCHIVE_ERRORS as e:
+                # copy_upload already removed the partial temp file
+                rejected.append((name, f"Unreadable archive member: {e}"))
+    except ARCHIVE_ERRORS as e:
+        rejected.append((filename, f"Unreadable archive: {e}"))
+    return saved, rejected
@@ -0,0 +1,103 @@
+"""
+Compact waveform peaks, produced from the analyzer's decode pass so the
+frontend can draw a track without downloading or decoding the audio.
+
+Peaks files are keyed by the audio content hash and use a small binary format
+(all little-endian):
+
+    header   "PEAK", u8 version (1), u8 level count, u16 reserved,
+             u32 sample rate, u64 total samples
+    levels   per level: u32 samples per peak, u32 peak count
+    data     per level, in the same order: peak count x (i8 min, i8 max),
+             amplitudes scaled from [-1, 1] to [-127, 127]
+
+Level 0 is the finest; each further level is ZOOM_FACTOR times coarser.
+"""
+import os
+import struct
+import tempfile
+from typing import List, Tuple
+import numpy as np
+
+MAGIC = b"PEAK"
+VERSION = 1
+ZOOM_FACTOR = 4
+LEVELS = 3
+# Finest level at 44.1 kHz: 512 samples per peak (~86 peaks per second)
+BASE_SECONDS_PER_PEAK = 512 / 44100
+
+_HEADER = struct.Struct("<4sBBHIQ")
+_LEVEL = struct.Struct("<II")
+
+def samples_per_peak(sample_rate: int) -> int:
+    """Finest-level window for a given decode rate, so zoom levels line up in time across rates."""
+    return max(1, int(round(BASE_SECONDS_PER_PEAK * sample_rate)))
+
+def peaks_path(peaks_dir: str, content_hash: str) -> str:
+    return os.path.join(peaks_dir, f"{content_hash}.peaks")
+
+def _reduce(mins: np.ndarray, maxs: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Repeat the last value so a partial tail still forms a whole window
+    pad = (-len(mins)) % factor
+    if pad:
+        mins = np.concatenate([mins, np.full(pad, mins[-1], dtype=mins.dtype)])
+        maxs = np.concatenate([maxs, np.full(pad, maxs[-1], dtype=maxs.dtype)])
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+def min_max(audio: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-window minimum and maximum of a mono signal."""
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return _reduce(audio, audio, window)
+
+def encode(mins: np.ndarray, maxs: np.ndarray, window: int, sample_rate: int,
+           total_samples: int, levels: int = LEVELS) -> bytes:
+    """Builds a peaks file from finest-level min/max arrays of `window` samples each."""
+    mins = np.asarray(mins, dtype=np.float32)
+    maxs = np.asarray(maxs, dtype=np.float32)
+    headers, blocks = [], []
+    for level in range(levels):
+        if level:
+            if len(mins) <= 1:
+                break
+            mins, maxs = _reduce(mins, maxs, ZOOM_FACTOR)
+            window *= ZOOM_FACTOR
+        interleaved = np.empty(len(mins) * 2, dtype=np.int8)
+        interleaved[0::2] = np.clip(np.round(mins * 127), -127, 127)
+        interleaved[1::2] = np.clip(np.round(maxs * 127), -127, 127)
+        headers.append(_LEVEL.pack(window, len(mins)))
+        blocks.append(interleaved.tobytes())
+    return _HEADER.pack(MAGIC, VERSION, len(headers), 0, sample_rate, total_samples) + b"".join(headers + blocks)
+
+def encode_audio(audio: np.ndarray, sample_rate: int, levels: int = LEVELS) -> bytes:
+    window = samples_per_peak(sample_rate)
+    mins, maxs = min_max(audio, window)
+    return encode(mins, maxs, window, sample_rate, len(audio), levels)
+
+def decode(data: bytes) -> dict:
+    """Parses a peaks file into {"sample_rate", "total_samples", "levels": [{"samples_per_peak", "peaks"}]}."""
+    magic, version, count, _, sample_rate, total_samples = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a supported peaks file")
+    offset = _HEADER.size + count * _LEVEL.size
+    levels: List[dict] = []
+    for index in range(count):
+        window, n = _LEVEL.unpack_from(data, _HEADER.size + index * _LEVEL.size)
+        peaks = np.frombuffer(data, dtype=np.int8, count=n * 2, offset=offset).reshape(-1, 2)
+        levels.append({"samples_per_peak": window, "peaks": peaks})
+        offset += n * 2
+    return {"sample_rate": sample_rate, "total_samples": total_samples, "levels": levels}
+
+def write(path: str, data: bytes):
+    """Atomically writes a peaks (or timeline) file; readers never see a partial file."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -8,6 +8,7 @@ import { buildBackendUrl } from './config';
 function App() {
   const { activeTab, queue, activeFileId, analyzeFile, processOutput, setActiveTab } = useAudioStore();
   const [renamePattern, setRenamePattern] = useState('{Camelot} - {BPM} - {OriginalName}');
+  const [writeTags, setWriteTags] = useState(false);
 
   const activeFile = queue.find(f => f.id === activeFileId);
 
@@ -115,8 +116,16 @@ function App() {
                           className="flex-1 border border-slate-700 rounded px-3 py-2 text-sm bg-slate-800 text-white placeholder-slate-500"
                           placeholder="Rename Pattern"
                         />
+                        <label className="flex items-center gap-1 text-xs text-slate-300 whitespace-nowrap">
+                          <input
+                            type="checkbox"
+                            checked={writeTags}
+                            onChange={(e) => setWriteTags(e.target.checked)}
+                          />
+                          Write tags
+                        </label>
                         <button 
-                          onClick={() => processOutput(activeFile.id, renamePattern)}
+                          onClick={() => processOutput(activeFile.id, renamePattern, writeTags)}
                           className="bg-emerald-500 text-slate-950 px-4 py-2 rounded text-sm font-semibold hover:bg-emerald-400 whitespace-nowrap"
                         >
                           Save to Library
@@ -1,4 +1,4 @@
-import { useAudioStore } from '../store/useAudioStore';
+import { buildLibraryExport, useAudioStore } from '../store/useAudioStore';
 import { WaveformPlayer } from './WaveformPlayer';
 import { LibraryEntry } from '../types';
 import { buildBackendUrl } from '../config';
@@ -11,8 +11,15 @@ export const Library = () => {
     clearLibrary,
     selectedLibraryEntry,
     setSelectedLibraryEntry,
+    libraryFilters,
+    libraryCursor,
+    libraryTotal,
+    setLibraryFilters,
+    loadMoreLibrary,
   } = useAudioStore();
 
+  const parseBpm = (value: string) => (value === '' ? undefined : Number(value));
+
   const getPreviewUrl = (entry: LibraryEntry) => {
     if (entry.output_path) return buildBackendUrl(`/files/output/${entry.output_path}`);
     if (entry.input_path) return buildBackendUrl(`/files/input/${entry.input_path}`);
@@ -20,6 +27,8 @@ export const Library = () => {
   };
 
   const previewUrl = selectedLibraryEntry ? getPreviewUrl(selectedLibraryEntry) : null;
+  const peaksId = selectedLibraryEntry?.analysis?.waveform;
+  const peaksUrl = peaksId ? buildBackendUrl(`/api/peaks/${peaksId}`) : undefined;
 
   return (
     <div className="space-y-6">
@@ -31,7 +40,7 @@ export const Library = () => {
               Manage your input (original) and output (processed) files.
             </p>
           </div>
-          {library.length > 0 && (
+          {libraryTotal > 0 && (
             <button
               onClick={() => {
                 if (
@@ -71,11 +80,92 @@ export const Library = () => {
               </button>
             </div>
             <div className="bg-slate-950 rounded border border-blue-500/20 p-2">
-              <WaveformPlayer audioUrl={previewUrl} />
+              <WaveformPlayer audioUrl={previewUrl} peaksUrl={peaksUrl} />
             </div>
           </div>
         )}
 
+        <div className="flex flex-wrap items-end gap-3 mb-4 text-sm">
+          <label className="flex flex-col text-slate-400">
+            Status
+            <select
+              value={libraryFilters.status ?? ''}
+              onChange={(e) => setLibraryFilters({ status: e.target.value || undefined })}
+              className="mt-1 bg-slate-950 border border-slate-700 rounded px-2 py-1 text-slate-200"
+            >
+              <option value="">Any</option>
+              <option value="uploaded">Uploaded</option>
+              <option value="pending">Pending</option>
+              <option value="completed">Completed</option>
+              <option value="error">Error</option>
+            </select>
+          </label>
+          <label className="flex flex-col text-slate-400">
+            BPM from
+            <input
+              type="number"
+              defaultValue={libraryFilters.bpmMin ?? ''}
+              onBlur={(e) => setLibraryFilters({ bpmMin: parseBpm(e.target.value) })}
+              className="mt-1 w-20 bg-slate-950 border border-slate-700 rounded px-2 py-1 text-slate-200"
+            />
+          </label>
+          <label className="flex flex-col text-slate-400">
+            to
+            <input
+              type="number"
+              defaultValue={libraryFilters.bpmMax ?? ''}
+              onBlur={(e) => setLibraryFilters({ bpmMax: parseBpm(e.target.value) })}
+              className="mt-1 w-20 bg-slate-950 border border-slate-700 rounded px-2 py-1 text-slate-200"
+            />
+          </label>
+          <label className="flex flex-col text-slate-400">
+            Camelot
+            <input
+              type="text"
+              placeholder="8A"
+              defaultValue={libraryFilters.camelot ?? ''}
+              onBlur={(e) => setLibraryFilters({ camelot: e.target.value.trim().toUpperCase() || undefined })}
+              className="mt-1 w-16 bg-slate-950 border border-slate-700 rounded px-2 py-1 text-slate-200"
+            />
+          </label>
+          <label className="flex items-center gap-2 text-slate-400 pb-1">
+            <input
+              type="checkbox"
+              checked={!!libraryFilters.compatible}
+              onChange={(e) => setLibraryFilters({ compatible: e.target.checked })}
+            />
+            Compatible keys
+          </label>
+          <label className="flex flex-col text-slate-400">
+            Sort
+            <select
+              value={`${libraryFilters.sort}:${libraryFilters.order}`}
+              onChange={(e) => {
+                const [sort, order] = e.target.value.split(':') as [
+                  typeof libraryFilters.sort,
+                  typeof libraryFilters.order,
+                ];
+                setLibraryFilters({ sort, order });
+              }}
+              className="mt-1 bg-slate-950 border border-slate-700 rounded px-2 py-1 text-slate-200"
+            >
+              <option value="created_at:asc">Oldest first</option>
+              <option value="created_at:desc">Newest first</option>
+              <option value="filename:asc">Name</option>
+              <option value="bpm:asc">BPM ascending</option>
+              <option value="bpm:desc">BPM descending</option>
+            </select>
+          </label>
+          <span className="ml-auto text-slate-500 pb-1">
+            {library.length} of {libraryTotal}
+          </span>
+          <span className="flex gap-2 pb-1 text-slate-400">
+            Export
+            <a href={buildBackendUrl(buildLibraryExport(libraryFilters, 'csv'))} className="text-sky-400 hover:underline">CSV</a>
+            <a href={buildBackendUrl(buildLibraryExport(libraryFilters, 'xml'))} className="text-sky-400 hover:underline">Rekordbox XML</a>
+          </span>
+        </div>
+
         <div className="overflow-x-auto">
           <table className="min-w-full divide-y divide-slate-800 text-slate-200">
             <thead className="bg-slate-800/70">
@@ -120,6 +210,9 @@ export const Library = () => {
                         <span className="font-bold text-blue-200">{entry.analysis.key_camelot}</span>
                         <span className="mx-2 text-slate-600">•</span>
                         <span className="font-bold text-purple-200">{entry.analysis.bpm} BPM</span>
+                        {entry.analysis.preview && (
+                          <span className="ml-2 text-xs uppercase tracking-wide text-amber-300">Preview</span>
+                        )}
                       </div>
                     ) : (
                       <span className="text-slate-500 italic">Pending...</span>
@@ -186,6 +279,17 @@ export const Library = () => {
             </tbody>
           </table>
         </div>
+
+        {libraryCursor && (
+          <div className="flex justify-center mt-4">
+            <button
+              onClick={() => loadMoreLibrary()}
+              className="px-4 py-2 bg-slate-800 text-slate-200 hover:bg-slate-700 rounded-md text-sm font-medium"
+            >
+              Load more
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
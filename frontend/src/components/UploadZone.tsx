@@ -35,13 +35,11 @@ export const UploadZone = () => {
   };
 
   const uploadFile = async (file: File, id: string) => {
-    const formData = new FormData();
-    formData.append('file', file);
-
     try {
-      const response = await fetch(buildBackendUrl('/api/upload'), {
-        method: 'POST',
-        body: formData,
+      // Raw body upload: streamed to disk server-side without multipart spooling
+      const response = await fetch(buildBackendUrl(`/api/upload/${encodeURIComponent(file.name)}`), {
+        method: 'PUT',
+        body: file,
       });
 
       if (!response.ok) {
@@ -56,6 +54,32 @@ export const UploadZone = () => {
     }
   };
 
+  const uploadBatch = async (audioFiles: AudioFile[]) => {
+    const formData = new FormData();
+    audioFiles.forEach(audioFile => formData.append('files', audioFile.file));
+
+    try {
+      // One request for the whole drop; analysis is still started from the queue
+      const response = await fetch(buildBackendUrl('/api/upload/batch?analyze=false'), {
+        method: 'POST',
+        body: formData,
+      });
+
+      if (!response.ok) {
+        throw new Error('Upload failed');
+      }
+
+      const result: { rejected: { filename: string }[] } = await response.json();
+      const rejected = new Set(result.rejected.map(r => r.filename));
+      audioFiles.forEach(audioFile => {
+        updateFileStatus(audioFile.id, rejected.has(audioFile.file.name) ? 'error' : 'pending');
+      });
+    } catch (error) {
+      console.error('Upload error:', error);
+      audioFiles.forEach(audioFile => updateFileStatus(audioFile.id, 'error'));
+    }
+  };
+
   const processFiles = (files: File[]) => {
     const validFiles = files.filter(file => 
       file.type.startsWith('audio/') || 
@@ -73,10 +97,12 @@ export const UploadZone = () => {
 
     addAudioFiles(newAudioFiles);
 
-    // Upload files
-    newAudioFiles.forEach(audioFile => {
-      uploadFile(audioFile.file, audioFile.id);
-    });
+    // Upload files (several at once go up as one batch so they don't replace each other)
+    if (newAudioFiles.length === 1) {
+      uploadFile(newAudioFiles[0].file, newAudioFiles[0].id);
+    } else {
+      uploadBatch(newAudioFiles);
+    }
   };
 
   const handleDrop = useCallback(async (e: React.DragEvent) => {
@@ -4,18 +4,66 @@ import RegionsPlugin from 'wavesurfer.js/dist/plugins/regions.esm.js';
 
 interface WaveformPlayerProps {
   audioUrl: string;
+  peaksUrl?: string;  // Precomputed peaks (/api/peaks/...); the audio is then streamed, not decoded
   startTime?: number; // Start of non-silent audio (seconds)
   endTime?: number;   // End of non-silent audio (seconds)
 }
 
-export const WaveformPlayer = ({ audioUrl, startTime, endTime }: WaveformPlayerProps) => {
+interface Peaks {
+  data: Float32Array;
+  duration: number;
+}
+
+// Parses the backend peaks format (see backend/waveform.py) and picks the
+// coarsest zoom level that still has at least `minPeaks` min/max pairs.
+const parsePeaks = (buffer: ArrayBuffer, minPeaks = 2000): Peaks => {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== 'PEAK' || view.getUint8(4) !== 1) throw new Error('Unsupported peaks file');
+  const levelCount = view.getUint8(5);
+  const sampleRate = view.getUint32(8, true);
+  const totalSamples = Number(view.getBigUint64(12, true));
+
+  let offset = 20 + levelCount * 8;
+  let chosen = { offset, count: 0 };
+  for (let level = 0; level < levelCount; level++) {
+    const count = view.getUint32(20 + level * 8 + 4, true);
+    if (level === 0 || count >= minPeaks) chosen = { offset, count };
+    offset += count * 2;
+  }
+
+  const raw = new Int8Array(buffer, chosen.offset, chosen.count * 2);
+  const data = Float32Array.from(raw, (value) => value / 127);
+  return { data, duration: totalSamples / sampleRate };
+};
+
+export const WaveformPlayer = ({ audioUrl, peaksUrl, startTime, endTime }: WaveformPlayerProps) => {
   const containerRef = useRef<HTMLDivElement>(null);
   const wavesurfer = useRef<WaveSurfer | null>(null);
   const [isPlaying, setIsPlaying] = useState(false);
   const [isReady, setIsReady] = useState(false);
 
+  const [peaks, setPeaks] = useState<Peaks | null>(null);
+  const [peaksLoaded, setPeaksLoaded] = useState(!peaksUrl);
+
+  useEffect(() => {
+    setPeaks(null);
+    setPeaksLoaded(!peaksUrl);
+    if (!peaksUrl) return;
+
+    let cancelled = false;
+    fetch(peaksUrl)
+      .then((response) => (response.ok ? response.arrayBuffer() : Promise.reject(response.status)))
+      .then((buffer) => !cancelled && setPeaks(parsePeaks(buffer)))
+      .catch(() => undefined) // Fall back to decoding the audio
+      .finally(() => !cancelled && setPeaksLoaded(true));
+    return () => {
+      cancelled = true;
+    };
+  }, [peaksUrl]);
+
   useEffect(() => {
-    if (!containerRef.current) return;
+    if (!containerRef.current || !peaksLoaded) return;
 
     // Initialize WaveSurfer
     const ws = WaveSurfer.create({
@@ -27,6 +75,8 @@ export const WaveformPlayer = ({ audioUrl, startTime, endTime }: WaveformPlayerP
       barGap: 1,
       height: 100,
       url: audioUrl,
+      // With peaks and duration WaveSurfer skips fetching and decoding the whole file
+      ...(peaks ? { peaks: [peaks.data], duration: peaks.duration } : {}),
     });
 
     // Initialize Regions Plugin
@@ -74,7 +124,7 @@ export const WaveformPlayer = ({ audioUrl, startTime, endTime }: WaveformPlayerP
     return () => {
       ws.destroy();
     };
-  }, [audioUrl, startTime, endTime]);
+  }, [audioUrl, peaks, peaksLoaded, startTime, endTime]);
 
   const togglePlayPause = () => {
     if (wavesurfer.current) {
@@ -1,10 +1,38 @@
 import { create } from 'zustand';
-import { AudioFile, AnalysisResult, LibraryEntry } from '../types';
+import { AudioFile, AnalysisResult, JobEvent, LibraryEntry, LibraryFilters, LibraryPage, ProcessorStatus } from '../types';
 import { buildBackendUrl } from '../config';
 
+const LIBRARY_PAGE_SIZE = 100;
+
+const libraryParams = (filters: LibraryFilters) => {
+  const params = new URLSearchParams({ sort: filters.sort, order: filters.order });
+  if (filters.status) params.set('status', filters.status);
+  if (filters.bpmMin !== undefined) params.set('bpm_min', String(filters.bpmMin));
+  if (filters.bpmMax !== undefined) params.set('bpm_max', String(filters.bpmMax));
+  if (filters.camelot) params.set(filters.compatible ? 'compatible_with' : 'key', filters.camelot);
+  return params;
+};
+
+const buildLibraryQuery = (filters: LibraryFilters, limit: number, cursor?: string | null) => {
+  const params = libraryParams(filters);
+  params.set('limit', String(limit));
+  if (cursor) params.set('cursor', cursor);
+  return `/api/library/page?${params.toString()}`;
+};
+
+// Download link for the current filters (format: csv, parquet or xml)
+export const buildLibraryExport = (filters: LibraryFilters, format: 'csv' | 'parquet' | 'xml') => {
+  const params = libraryParams(filters);
+  params.set('format', format);
+  return `/api/library/export?${params.toString()}`;
+};
+
 interface AppState {
   queue: AudioFile[];
   library: LibraryEntry[];
+  libraryFilters: LibraryFilters;
+  libraryCursor: string | null; // Next page, null once everything matching is loaded
+  libraryTotal: number;
   processing: boolean;
   progress: number;
   activeTab: 'individual' | 'bulk' | 'library';
@@ -17,9 +45,12 @@ interface AppState {
   updateFileStatus: (id: string, status: AudioFile['status']) => void;
   analyzeFile: (id: string) => Promise<void>;
   startBatchProcessing: () => Promise<void>;
-  pollBatchStatus: () => Promise<void>;
-  processOutput: (id: string, pattern: string) => Promise<void>;
+  handleJobEvent: (event: JobEvent) => void;
+  handleStatus: (status: ProcessorStatus) => void;
+  processOutput: (id: string, pattern: string, tags?: boolean) => Promise<void>;
   fetchLibrary: () => Promise<void>;
+  loadMoreLibrary: () => Promise<void>;
+  setLibraryFilters: (filters: Partial<LibraryFilters>) => void;
   deleteInput: (id: string) => Promise<void>;
   deleteOutput: (id: string) => Promise<void>;
   clearLibrary: () => Promise<void>; // New action
@@ -28,6 +59,9 @@ interface AppState {
 export const useAudioStore = create<AppState>((set, get) => ({
   queue: [],
   library: [],
+  libraryFilters: { sort: 'created_at', order: 'asc' },
+  libraryCursor: null,
+  libraryTotal: 0,
   processing: false,
   progress: 0,
   activeTab: 'individual',
@@ -102,59 +136,99 @@ export const useAudioStore = create<AppState>((set, get) => ({
 
     set({ processing: true });
 
+    // Subscribe before queueing so no event is missed; the server pushes progress.
+    // The stream opens with a `status` snapshot, and only then is the work queued:
+    // cached results can complete (and go idle) before a slower connection is up.
+    const events = new EventSource(buildBackendUrl('/api/events'));
+    let queued = false;
+    const eventTypes: JobEvent['event'][] = ['queued', 'started', 'completed', 'retrying', 'failed', 'cancelled', 'idle'];
+    eventTypes.forEach((type) => {
+      events.addEventListener(type, (message) => {
+        const event: JobEvent = JSON.parse((message as MessageEvent).data);
+        get().handleJobEvent(event);
+        if (event.event === 'idle') {
+          events.close();
+        }
+      });
+    });
+    const opened = new Promise<void>((resolve, reject) => {
+      events.addEventListener('status', (message) => {
+        const status: ProcessorStatus = JSON.parse((message as MessageEvent).data);
+        get().handleStatus(status);
+        if (queued && !status.is_processing && status.queue_length === 0) {
+          // Reconnected after the batch finished, so its idle event was missed
+          set({ processing: false });
+          events.close();
+        }
+        resolve();
+      });
+      events.onerror = () => {
+        if (!queued) {
+          reject(new Error('Event stream unavailable'));
+        } else if (!get().processing) {
+          // EventSource reconnects on its own; only give up once processing is over
+          events.close();
+        }
+      };
+    });
+
     try {
+      await opened;
+      queued = true;
       const filenames = pendingFiles.map(f => f.file.name);
       await fetch(buildBackendUrl('/api/queue'), {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ filenames }),
       });
-      
-      // Start polling
-      const pollInterval = setInterval(async () => {
-        await get().pollBatchStatus();
-        const { processing } = get();
-        if (!processing) {
-          clearInterval(pollInterval);
-        }
-      }, 1000);
-
     } catch (error) {
       console.error('Batch start failed', error);
+      events.close();
       set({ processing: false });
     }
   },
 
-  pollBatchStatus: async () => {
-    try {
-      const response = await fetch(buildBackendUrl('/api/status'));
-      const status = await response.json();
-      
-      set((state: AppState) => {
-        // Update queue items with results if available
-        const newQueue = state.queue.map(item => {
-          const result = status.results[item.file.name];
-          if (result) {
-            return { ...item, status: 'completed' as const, result };
-          }
-          if (item.file.name === status.current_file) {
-            return { ...item, status: 'processing' as const };
-          }
-          return item;
-        });
-
-        return {
-          processing: status.is_processing,
-          progress: status.total_count > 0 ? (status.processed_count / status.total_count) * 100 : 0,
-          queue: newQueue
-        };
+  handleJobEvent: (event: JobEvent) => {
+    set((state: AppState) => {
+      const newQueue = state.queue.map(item => {
+        if (item.file.name !== event.filename) return item;
+        if (event.event === 'completed' && event.result) {
+          return { ...item, status: 'completed' as const, result: event.result };
+        }
+        if (event.event === 'started') {
+          return { ...item, status: 'processing' as const };
+        }
+        if (event.event === 'retrying') {
+          // Failed attempt; back in the queue until its backoff expires
+          return { ...item, status: 'pending' as const };
+        }
+        if (event.event === 'failed') {
+          return { ...item, status: 'error' as const };
+        }
+        if (event.event === 'cancelled') {
+          return { ...item, status: item.result ? 'completed' as const : 'pending' as const };
+        }
+        return item;
       });
-    } catch (error) {
-      console.error('Polling failed', error);
-    }
+
+      return {
+        processing: event.event !== 'idle',
+        progress: event.total_count > 0 ? (event.processed_count / event.total_count) * 100 : 0,
+        queue: newQueue
+      };
+    });
+  },
+
+  handleStatus: (status: ProcessorStatus) => {
+    set((state: AppState) => ({
+      progress: status.total_count > 0 ? (status.processed_count / status.total_count) * 100 : 0,
+      queue: state.queue.map(item =>
+        status.in_flight.includes(item.file.name) ? { ...item, status: 'processing' as const } : item
+      )
+    }));
   },
 
-  processOutput: async (id: string, pattern: string) => {
+  processOutput: async (id: string, pattern: string, tags = false) => {
     // This replaces renameFile
     const file = get().queue.find(f => f.id === id);
     if (!file || !file.result) return;
@@ -168,7 +242,8 @@ export const useAudioStore = create<AppState>((set, get) => ({
           pattern,
           bpm: file.result.bpm,
           key: file.result.key_standard,
-          camelot: file.result.key_camelot
+          camelot: file.result.key_camelot,
+          tags
         }),
       });
 
@@ -189,17 +264,21 @@ export const useAudioStore = create<AppState>((set, get) => ({
 
   fetchLibrary: async () => {
     try {
-      const response = await fetch(buildBackendUrl('/api/library'));
+      // Refresh as many rows as are already shown; unchanged libraries come back as a cached 304
+      const limit = Math.min(1000, Math.max(LIBRARY_PAGE_SIZE, get().library.length));
+      const response = await fetch(buildBackendUrl(buildLibraryQuery(get().libraryFilters, limit)));
       if (!response.ok) throw new Error('Failed to fetch library');
-      const newLibrary: LibraryEntry[] = await response.json();
+      const page: LibraryPage = await response.json();
 
       set((state: AppState) => {
         const preservedSelection = state.selectedLibraryEntry
-          ? newLibrary.find((entry) => entry.id === state.selectedLibraryEntry?.id)
+          ? page.entries.find((entry) => entry.id === state.selectedLibraryEntry?.id)
           : null;
 
         return {
-          library: newLibrary,
+          library: page.entries,
+          libraryCursor: page.next_cursor,
+          libraryTotal: page.total,
           selectedLibraryEntry: preservedSelection ?? null,
         };
       });
@@ -208,6 +287,30 @@ export const useAudioStore = create<AppState>((set, get) => ({
     }
   },
 
+  loadMoreLibrary: async () => {
+    const { libraryCursor, libraryFilters } = get();
+    if (!libraryCursor) return;
+    try {
+      const response = await fetch(
+        buildBackendUrl(buildLibraryQuery(libraryFilters, LIBRARY_PAGE_SIZE, libraryCursor))
+      );
+      if (!response.ok) throw new Error('Failed to fetch library');
+      const page: LibraryPage = await response.json();
+      set((state: AppState) => ({
+        library: [...state.library, ...page.entries],
+        libraryCursor: page.next_cursor,
+        libraryTotal: page.total,
+      }));
+    } catch (error) {
+      console.error('Library fetch error', error);
+    }
+  },
+
+  setLibraryFilters: (filters) => {
+    set((state: AppState) => ({ libraryFilters: { ...state.libraryFilters, ...filters }, library: [] }));
+    get().fetchLibrary();
+  },
+
   deleteInput: async (id: string) => {
     try {
       await fetch(buildBackendUrl(`/api/library/${id}/input`), { method: 'DELETE' });
@@ -232,7 +335,7 @@ export const useAudioStore = create<AppState>((set, get) => ({
         method: 'DELETE',
       });
       if (!response.ok) throw new Error('Failed to clear library');
-      set({ library: [], selectedLibraryEntry: null });
+      set({ library: [], libraryCursor: null, libraryTotal: 0, selectedLibraryEntry: null });
     } catch (error) {
       console.error('Failed to clear library', error);
       alert('Failed to clear library');
@@ -5,6 +5,10 @@ export interface AnalysisResult {
   key_camelot: string;
   key_confidence: number;
   duration: number;
+  preview?: boolean; // Fast excerpt-based result, replaced by a later full pass
+  waveform?: string | null; // Peaks id, served at /api/peaks/{waveform}
+  timeline?: string | null; // Beat grid / tempo / key timeline id, served at /api/timeline/{timeline}
+  analyzer_version?: string | null; // Analyzer version that produced it; stale ones are redone by /api/reanalysis
 }
 
 export interface AudioFile {
@@ -24,3 +28,40 @@ export interface LibraryEntry {
   created_at: number;
   status: string;
 }
+
+export interface LibraryPage {
+  entries: LibraryEntry[];
+  next_cursor: string | null;
+  total: number;
+}
+
+export interface LibraryFilters {
+  status?: string;
+  bpmMin?: number;
+  bpmMax?: number;
+  camelot?: string;
+  compatible?: boolean; // Include harmonic neighbours of `camelot`
+  sort: 'created_at' | 'filename' | 'bpm';
+  order: 'asc' | 'desc';
+}
+
+export interface JobEvent {
+  event: 'queued' | 'started' | 'completed' | 'retrying' | 'failed' | 'cancelled' | 'idle';
+  filename: string | null;
+  result?: AnalysisResult;
+  error?: string;
+  processed_count: number;
+  total_count: number;
+  queue_length: number;
+}
+
+// Processor snapshot: GET /api/status, and the first `status` event on /api/events
+export interface ProcessorStatus {
+  queue_length: number;
+  is_processing: boolean;
+  current_file: string | null;
+  in_flight: string[];
+  processed_count: number;
+  failed_count: number;
+  total_count: number;
+}